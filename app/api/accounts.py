@@ -4,6 +4,7 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 from app.database import get_db
 from app.models.account import Account
+from app.services.account_pool import account_pool
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/api/accounts", tags=["账号管理"])
@@ -33,6 +34,11 @@ async def get_accounts(skip: int = 0, limit: int = 100, db: Session = Depends(ge
     accounts = db.query(Account).offset(skip).limit(limit).all()
     return accounts
 
+@router.get("/pool/stats")
+async def get_account_pool_stats():
+    """获取账号池中各账号的租用、请求数和冷却状态"""
+    return {"accounts": account_pool.get_stats()}
+
 @router.get("/{account_id}", response_model=AccountResponse)
 async def get_account(account_id: int, db: Session = Depends(get_db)):
     """获取单个账号信息"""
@@ -4,6 +4,9 @@ from typing import List
 from datetime import datetime
 from app.database import get_db
 from app.models.crawler_param import CrawlerParam
+from app.models.task import Task
+from app.services.http_fetcher import FETCH_MODES
+from app.services.control_broker import control_broker
 
 router = APIRouter(prefix="/api/crawler-params", tags=["小鲸鱼参数"])
 
@@ -26,6 +29,8 @@ async def get_crawler_params(skip: int = 0, limit: int = 20, db: Session = Depen
             "interval_time": param.interval_time,
             "error_count": param.error_count,
             "restart_browser_time": param.restart_browser_time,
+        "fetch_mode": param.fetch_mode,
+            "fetch_mode": param.fetch_mode,
             "created_at": param.created_at.strftime("%Y-%m-%d %H:%M:%S") if param.created_at else None,
             "updated_at": param.updated_at.strftime("%Y-%m-%d %H:%M:%S") if param.updated_at else None
         })
@@ -50,6 +55,7 @@ async def get_crawler_param(param_id: int, db: Session = Depends(get_db)):
         "interval_time": param.interval_time,
         "error_count": param.error_count,
         "restart_browser_time": param.restart_browser_time,
+        "fetch_mode": param.fetch_mode,
         "created_at": param.created_at.strftime("%Y-%m-%d %H:%M:%S") if param.created_at else None,
         "updated_at": param.updated_at.strftime("%Y-%m-%d %H:%M:%S") if param.updated_at else None
     }
@@ -69,6 +75,11 @@ async def create_crawler_param(param_data: dict, db: Session = Depends(get_db)):
         if not (0 <= end_time <= 23):
             raise HTTPException(status_code=400, detail="结束时间必须在0-23之间")
 
+        # 验证抓取模式
+        fetch_mode = param_data.get("fetch_mode", "browser")
+        if fetch_mode not in FETCH_MODES:
+            raise HTTPException(status_code=400, detail=f"抓取模式必须是 {'、'.join(FETCH_MODES)} 之一")
+
         param = CrawlerParam(
             url=param_data["url"],
             api_request=param_data["api_request"],
@@ -77,7 +88,8 @@ async def create_crawler_param(param_data: dict, db: Session = Depends(get_db)):
             end_time=end_time,
             interval_time=param_data.get("interval_time", 1),
             error_count=param_data.get("error_count", 3),
-            restart_browser_time=param_data.get("restart_browser_time", 24)
+            restart_browser_time=param_data.get("restart_browser_time", 24),
+            fetch_mode=fetch_mode
         )
 
         db.add(param)
@@ -121,9 +133,25 @@ async def update_crawler_param(param_id: int, param_data: dict, db: Session = De
             param.error_count = param_data["error_count"]
         if "restart_browser_time" in param_data:
             param.restart_browser_time = param_data["restart_browser_time"]
+        if "fetch_mode" in param_data:
+            if param_data["fetch_mode"] not in FETCH_MODES:
+                raise HTTPException(status_code=400, detail=f"抓取模式必须是 {'、'.join(FETCH_MODES)} 之一")
+            param.fetch_mode = param_data["fetch_mode"]
 
         db.commit()
 
+        # 把新参数推送给使用该参数的运行中/暂停中的任务
+        config = {
+            "interval": param.interval_time * 3600,
+            "restart_interval": param.restart_browser_time * 3600,
+            "time_range": (param.start_time, param.end_time),
+            "max_exception": param.error_count,
+            "fetch_mode": param.fetch_mode
+        }
+        running_tasks = db.query(Task).filter(Task.crawler_param_id == param_id, Task.status.in_([1, 2])).all()
+        for task in running_tasks:
+            control_broker.send_control(task.task_type, task.id, "config", config)
+
         return {"message": "小鲸鱼参数更新成功"}
     except Exception as e:
         db.rollback()
@@ -0,0 +1,17 @@
+from fastapi import APIRouter, HTTPException
+from app.services.dashboard import dashboard_service
+
+router = APIRouter(prefix="/api/dashboard", tags=["仪表盘"])
+
+# 仪表盘汇总
+@router.get("/summary", response_model=dict)
+async def get_dashboard_summary():
+    """
+    仪表盘汇总：账号/代理/任务/原始数据/抽样数据/导出文件计数、QA队列和URL调度队列长度、
+    运行中的爬虫数和近期吞吐量
+    - 数据来自内存快照（age为快照生成至今的秒数），过期后在后台刷新，最多滞后 DASHBOARD_SUMMARY_TTL 秒
+    """
+    try:
+        return await dashboard_service.get_summary()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"生成仪表盘汇总失败: {str(e)}")
@@ -0,0 +1,53 @@
+import asyncio
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from app.services.control_broker import control_broker, TOPIC_TASK_EVENTS, TOPIC_JOB_EVENTS
+from app.utils.helpers import format_sse
+
+router = APIRouter(prefix="/api/events", tags=["事件流"])
+
+# 事件名 -> 控制面主题
+EVENT_TOPICS = {"task": TOPIC_TASK_EVENTS, "job": TOPIC_JOB_EVENTS}
+
+# 全局事件流
+@router.get("")
+async def stream_events(request: Request, topics: Optional[str] = None):
+    """
+    任务和后台作业状态变化事件流（SSE），页面只需订阅一次，不再轮询
+    - task: 任务状态变化（task_id、kind、status、state、error_message）
+    - job: 导出/抽样作业状态变化（job_id、kind=export/sampling、state=running/completed/failed，
+      导出完成带filename，抽样完成带count）
+    - topics: 逗号分隔的事件名，默认全部
+    - 其他进程（crawler-worker）发布的事件经Redis转发，同样会推送
+
+    示例:
+    ```bash
+    curl -N "http://localhost:8000/api/events?topics=job"
+    ```
+    """
+    names = [name.strip() for name in topics.split(",") if name.strip()] if topics else list(EVENT_TOPICS)
+    unknown = [name for name in names if name not in EVENT_TOPICS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"未知的事件类型: {', '.join(unknown)}，可选: {', '.join(EVENT_TOPICS)}")
+    event_names = {EVENT_TOPICS[name]: name for name in names}
+
+    async def stream():
+        queue, unsubscribe = control_broker.subscribe_queue(*event_names)
+        try:
+            yield format_sse("ready", {"topics": names})
+            while not await request.is_disconnected():
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(event_names.get(message.get("topic"), "message"), message)
+        finally:
+            unsubscribe()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
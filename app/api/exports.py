@@ -1,4 +1,5 @@
 
+import uuid
 from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
 from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
@@ -6,9 +7,26 @@ from typing import List
 from app.database import get_db
 from app.services.exporter import get_export_files, export_sample_data_to_excel, export_RawData_data_to_excel
 import os
+from app.utils.metrics import EXPORT_JOB_DURATION
+from app.services.control_broker import control_broker
 
 router = APIRouter(prefix="/api/exports", tags=["导出文件"])
 
+def _timed_export(job_id: str, job: str, func):
+    """执行导出任务并记录耗时，通过控制面发布作业状态事件（/api/events）"""
+    control_broker.publish_job_event(job_id, "export", "running", job=job)
+    try:
+        with EXPORT_JOB_DURATION.labels(job).time():
+            filepath = func()
+    except Exception as e:
+        control_broker.publish_job_event(job_id, "export", "failed", job=job, error=str(e))
+        raise
+    if filepath:
+        control_broker.publish_job_event(job_id, "export", "completed", job=job, filename=os.path.basename(filepath))
+    else:
+        control_broker.publish_job_event(job_id, "export", "failed", job=job, error="没有可导出的数据或导出失败")
+    return filepath
+
 @router.get("/")
 async def get_exports():
     """获取导出文件列表"""
@@ -23,17 +41,19 @@ async def get_exports():
 
 @router.post("/export-sample-data", status_code=status.HTTP_202_ACCEPTED)
 async def export_sample_data(background_tasks: BackgroundTasks):
-    """导出抽样数据"""
+    """导出抽样数据，完成后通过 /api/events 推送 job 事件"""
     # 添加后台任务
-    background_tasks.add_task(export_sample_data_to_excel)
-    return {"message": "导出任务已启动"}
+    job_id = uuid.uuid4().hex
+    background_tasks.add_task(_timed_export, job_id, "sample_data", export_sample_data_to_excel)
+    return {"message": "导出任务已启动", "job_id": job_id}
 
 @router.post("/export-raw-data", status_code=status.HTTP_202_ACCEPTED)
 async def export_raw_data(background_tasks: BackgroundTasks):
-    """导出原始数据"""
+    """导出原始数据，完成后通过 /api/events 推送 job 事件"""
     # 添加后台任务
-    background_tasks.add_task(export_RawData_data_to_excel)
-    return {"message": "导出任务已启动"}
+    job_id = uuid.uuid4().hex
+    background_tasks.add_task(_timed_export, job_id, "raw_data", export_RawData_data_to_excel)
+    return {"message": "导出任务已启动", "job_id": job_id}
 
 @router.get("/download/{filename}")
 async def download_export(filename: str):
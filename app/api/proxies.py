@@ -4,6 +4,7 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 from app.database import get_db
 from app.models.proxy import Proxy
+from app.services.proxy_pool import proxy_pool
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/api/proxies", tags=["代理管理"])
@@ -37,6 +38,16 @@ async def get_proxies(skip: int = 0, limit: int = 100, db: Session = Depends(get
     proxies = db.query(Proxy).offset(skip).limit(limit).all()
     return proxies
 
+@router.get("/pool/stats")
+async def get_proxy_pool_stats():
+    """获取代理池中各代理的健康状态"""
+    stats = proxy_pool.get_stats()
+    return {
+        "total": len(stats),
+        "available": sum(1 for item in stats if not item["quarantined"]),
+        "proxies": stats
+    }
+
 @router.get("/{proxy_id}", response_model=ProxyResponse)
 async def get_proxy(proxy_id: int, db: Session = Depends(get_db)):
     """获取单个代理信息"""
@@ -76,6 +87,7 @@ async def create_proxy(proxy: ProxyCreate, db: Session = Depends(get_db)):
     new_proxy = Proxy(**proxy.model_dump())
     db.add(new_proxy)
     db.commit()
+    proxy_pool.invalidate()
     db.refresh(new_proxy)
     return new_proxy
 
@@ -118,6 +130,7 @@ async def update_proxy(proxy_id: int, proxy_update: ProxyUpdate, db: Session = D
         setattr(db_proxy, key, value)
 
     db.commit()
+    proxy_pool.invalidate()
     db.refresh(db_proxy)
     return db_proxy
 
@@ -133,6 +146,7 @@ async def delete_proxy(proxy_id: int, db: Session = Depends(get_db)):
 
     db.delete(db_proxy)
     db.commit()
+    proxy_pool.invalidate()
     return None
 
 @router.get("/random/available", response_model=ProxyResponse)
@@ -164,5 +178,6 @@ async def delete_proxy(proxy_id: int, db: Session = Depends(get_db)):
 
     db.delete(db_proxy)
     db.commit()
+    proxy_pool.invalidate()
     
     return {"message": "代理删除成功"}
@@ -1,8 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import base64
+import binascii
+import json
+import math
+import zlib
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
+from app.config import settings
 from app.database import get_db
 from app.services.qa_crawler import qa_crawler_service
+from app.services.admission import admission_controller
+from app.services.frontier import url_frontier
+from app.services.spool import local_spool
 from pydantic import BaseModel, HttpUrl
 from datetime import datetime
 
@@ -50,11 +60,13 @@ class QueueStatusResponse(BaseModel):
     """队列状态响应模型"""
     queue_size: int
     url_count: int
+    lanes: Dict[str, int] = {}
 
 class ProcessQueueResponse(BaseModel):
     """处理队列响应模型"""
     processed: int
     failed: int
+    updated: int = 0  # 回答链接已入库、合并到已有记录（重抓）的条数
 
 class SubmitResponse(BaseModel):
     """提交响应模型"""
@@ -62,6 +74,141 @@ class SubmitResponse(BaseModel):
     message: str
     url_exists: bool
 
+class BatchItemStatus(BaseModel):
+    """批量提交中单条数据的结果"""
+    index: int
+    success: bool
+    url_exists: Optional[bool] = None
+    error: Optional[str] = None
+
+class SubmitBatchResponse(BaseModel):
+    """批量提交响应模型"""
+    success: bool
+    accepted: int
+    rejected: int
+    items: List[BatchItemStatus]
+
+async def _admit(request: Request, cost: int = 1):
+    """准入控制：队列积压或客户端超速时返回429"""
+    client_id = request.headers.get("x-client-id") or (request.client.host if request.client else "unknown")
+    retry_after = await admission_controller.admit(client_id, cost)
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=429,
+            detail="数据队列积压或提交过快，请稍后重试",
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
+
+# 提交后加入重抓调度的通道
+_TRACKED_LANES = {lane.strip() for lane in settings.FRONTIER_TRACK_LANES.split(",") if lane.strip()}
+
+def _resolve_lane(lane: Optional[str]) -> str:
+    """校验队列优先级通道，未知通道返回400"""
+    try:
+        return qa_crawler_service.resolve_lane(lane)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def _track_frontier(items: List[Tuple[str, Dict[str, Any]]], lane: str):
+    """回报提交页面的签名，调整这些URL在frontier中的重抓间隔（失败不影响提交结果）
+
+    只有 FRONTIER_TRACK_LANES 中的通道会加入重抓调度，backfill等批量回填默认不跟踪。
+    """
+    if not settings.FRONTIER_TRACK_SUBMISSIONS or not items or lane not in _TRACKED_LANES:
+        return
+    try:
+        await url_frontier.complete_async([(url, url_frontier.signature(data)) for url, data in items])
+    except Exception as e:
+        print(f"更新URL重抓调度失败: {str(e)}")
+
+def _encode_cursor(cursor: int) -> Optional[str]:
+    """SSCAN游标编码为不透明的分页令牌，遍历结束时返回None"""
+    if cursor == 0:
+        return None
+    return base64.urlsafe_b64encode(f"v1:{cursor}".encode("ascii")).decode("ascii").rstrip("=")
+
+def _decode_cursor(token: Optional[str]) -> int:
+    """解析分页令牌，未提供或为"0"时从头开始"""
+    if not token or token == "0":
+        return 0
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode("ascii")
+        version, _, cursor = raw.partition(":")
+        if version != "v1":
+            raise ValueError(raw)
+        return int(cursor)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="无效的cursor")
+
+def _check_page_size(page_size: int):
+    if page_size <= 0 or page_size > settings.QA_URLS_PAGE_MAX:
+        raise HTTPException(status_code=400, detail=f"page_size必须在1到{settings.QA_URLS_PAGE_MAX}之间")
+
+async def _read_body(request: Request) -> bytes:
+    """读取请求体，支持 Content-Encoding: gzip / deflate，并限制解压后的大小"""
+    limit = settings.QA_SUBMIT_BATCH_MAX_BYTES
+    encoding = request.headers.get("content-encoding", "identity").lower()
+    if encoding not in ("identity", "gzip", "deflate"):
+        raise HTTPException(status_code=415, detail=f"不支持的Content-Encoding: {encoding}")
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS if encoding == "gzip" else zlib.MAX_WBITS) \
+        if encoding != "identity" else None
+    chunks = []
+    size = 0
+    try:
+        async for chunk in request.stream():
+            if decompressor:
+                chunk = decompressor.decompress(chunk, limit + 1 - size)
+                if decompressor.unconsumed_tail:
+                    size = limit + 1
+            size += len(chunk)
+            if size > limit:
+                raise HTTPException(status_code=413, detail=f"请求体超过 {limit} 字节")
+            chunks.append(chunk)
+        if decompressor:
+            chunks.append(decompressor.flush())
+    except zlib.error as e:
+        raise HTTPException(status_code=400, detail=f"请求体解压失败: {str(e)}")
+    return b"".join(chunks)
+
+def _parse_batch(body: bytes, content_type: str) -> List[Any]:
+    """解析JSON数组或NDJSON（每行一个JSON对象）"""
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        items = []
+        for line in body.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as e:
+                items.append(ValueError(f"JSON解析失败: {str(e)}"))
+        return items
+    try:
+        items = json.loads(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"JSON解析失败: {str(e)}")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="请求体必须是数据数组或NDJSON")
+    return items
+
+def _normalize_item(item: Any) -> Tuple[str, Dict[str, Any]]:
+    """轻量校验单条数据（代替逐条构造pydantic模型），返回 (url, 数据)"""
+    if isinstance(item, Exception):
+        raise item
+    if not isinstance(item, dict):
+        raise ValueError("数据必须是JSON对象")
+    url = item.get("url")
+    if not isinstance(url, str) or not url.startswith(("http://", "https://")):
+        raise ValueError("url必须是http(s)地址")
+    try:
+        year = int(item.get("year"))
+    except (TypeError, ValueError):
+        raise ValueError("year必须是整数")
+    comments = item.get("comments_structured")
+    if comments is not None and not isinstance(comments, list):
+        raise ValueError("comments_structured必须是数组")
+    return url, dict(item, year=year)
+
 # 初始化问答小鲸鱼缓存（从raw_data加载）
 @router.post("/init", response_model=InitResponse)
 async def init_qa_crawler_cache(db: Session = Depends(get_db)):
@@ -83,37 +230,27 @@ async def check_qa_crawler_cache():
     """
     检查问答小鲸鱼URL缓存是否存在
     """
-    exists = qa_crawler_service.url_exists("dummy") or qa_crawler_service.get_queue_size() > 0
-    # 获取实际URL数量
-    redis_client = qa_crawler_service._get_redis()
-    url_count = redis_client.scard(qa_crawler_service.REDIS_URL_KEY) if redis_client else 0
+    status = await qa_crawler_service.get_status_async()
     return {
-        "exists": exists,
-        "count": url_count
+        "exists": status["url_count"] > 0 or status["queue_size"] > 0,
+        "count": status["url_count"]
     }
 
 # 提交问答小鲸鱼数据
 @router.post("/submit", response_model=SubmitResponse)
-async def submit_qa_crawler_data(data: QACrawlerData):
+async def submit_qa_crawler_data(data: QACrawlerData, request: Request, lane: Optional[str] = None):
     """
     提交问答小鲸鱼数据
     1. 检查URL是否已存在于缓存中
     2. 如果不存在，将URL添加到推荐页URL和问答小鲸鱼Redis缓存
-    3. 将数据添加到生产队列
+    3. 将数据添加到生产队列（URL已入库时作为重抓结果，入库时更新原记录的内容并合并评论）
+    - lane: 队列优先级通道（如 realtime/normal/backfill），默认实时通道
+    队列积压或客户端提交过快时返回429，请按Retry-After重试
     """
+    lane = _resolve_lane(lane)
+    await _admit(request)
     url_str = str(data.url)
 
-    # 检查URL是否已存在
-    url_exists = qa_crawler_service.url_exists(url_str)
-
-    if not url_exists:
-        # 将URL添加到问答小鲸鱼缓存
-        qa_crawler_service.add_url(url_str)
-
-        # 将URL添加到推荐页URL缓存
-        from app.services.recommendation import recommendation_service
-        recommendation_service.add_url(url_str)
-
     # 将数据添加到生产队列
     data_dict = data.dict()
     data_dict['url'] = url_str
@@ -129,7 +266,11 @@ async def submit_qa_crawler_data(data: QACrawlerData):
             comments_list.append(comment_dict)
         data_dict['comments_structured'] = comments_list
 
-    qa_crawler_service.add_to_queue(data_dict)
+    # 检查URL、写入两个URL集合、推入队列在一次Redis往返中完成；Redis不可用时写入本地spool
+    url_exists = await qa_crawler_service.submit_async(url_str, data_dict, lane)
+    if url_exists is None:
+        raise HTTPException(status_code=503, detail="Redis和本地spool均不可用")
+    await _track_frontier([(url_str, data_dict)], lane)
 
     return {
         "success": True,
@@ -137,20 +278,84 @@ async def submit_qa_crawler_data(data: QACrawlerData):
         "url_exists": url_exists
     }
 
+# 批量提交问答小鲸鱼数据
+@router.post("/submit-batch", response_model=SubmitBatchResponse)
+async def submit_qa_crawler_data_batch(request: Request, lane: Optional[str] = None):
+    """
+    批量提交问答小鲸鱼数据
+    - 请求体为数据数组（application/json）或每行一条数据的NDJSON（application/x-ndjson）
+    - 支持 Content-Encoding: gzip
+    - lane: 队列优先级通道，历史数据回填请使用 backfill，只占用实时数据之外的消费能力
+    - 整批URL一次判重，全部数据一次推入队列；返回每条数据的处理结果
+    - 队列积压或客户端提交过快时整批返回429，请按Retry-After重试
+    - Redis不可用时整批写入本地spool（url_exists均为false），恢复后自动回放
+
+    示例:
+    ```bash
+    gzip -c answers.ndjson | curl -X POST "http://localhost:8000/api/qa-crawler/submit-batch?lane=backfill" \\
+      -H "Content-Type: application/x-ndjson" -H "Content-Encoding: gzip" --data-binary @-
+    ```
+    """
+    lane = _resolve_lane(lane)
+    body = await _read_body(request)
+    raw_items = _parse_batch(body, request.headers.get("content-type", ""))
+    if len(raw_items) > settings.QA_SUBMIT_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"单次最多提交 {settings.QA_SUBMIT_BATCH_MAX_ITEMS} 条数据")
+    await _admit(request, len(raw_items))
+
+    statuses: List[Dict[str, Any]] = []
+    valid: List[Tuple[str, Dict[str, Any]]] = []
+    valid_indexes: List[int] = []
+    for index, item in enumerate(raw_items):
+        try:
+            valid.append(_normalize_item(item))
+            valid_indexes.append(index)
+            statuses.append({"index": index, "success": True})
+        except ValueError as e:
+            statuses.append({"index": index, "success": False, "error": str(e)})
+
+    if valid:
+        try:
+            exists = await qa_crawler_service.submit_batch_async(valid, lane)
+        except Exception as e:
+            raise HTTPException(status_code=503, detail=f"写入Redis失败: {str(e)}")
+        if exists is None:
+            raise HTTPException(status_code=503, detail="Redis和本地spool均不可用")
+        for index, url_exists in zip(valid_indexes, exists):
+            statuses[index]["url_exists"] = url_exists
+        await _track_frontier(valid, lane)
+
+    return {
+        "success": True,
+        "accepted": len(valid),
+        "rejected": len(raw_items) - len(valid),
+        "items": statuses
+    }
+
 # 获取队列状态
 @router.get("/queue/status", response_model=QueueStatusResponse)
 async def get_queue_status():
     """
-    获取生产队列状态
+    获取生产队列状态（queue_size为所有通道合计，lanes为各优先级通道的队列长度）
     """
-    queue_size = qa_crawler_service.get_queue_size()
-    redis_client = qa_crawler_service._get_redis()
-    url_count = redis_client.scard(qa_crawler_service.REDIS_URL_KEY) if redis_client else 0
+    return await qa_crawler_service.get_status_async()
 
-    return {
-        "queue_size": queue_size,
-        "url_count": url_count
-    }
+# 获取本地spool状态
+@router.get("/spool", response_model=dict)
+async def get_spool_status():
+    """
+    获取本地spool状态：Redis不可用期间暂存、待回放到Redis的提交条数和回放情况
+    """
+    return local_spool.get_status()
+
+# 获取准入控制状态
+@router.get("/admission", response_model=dict)
+async def get_admission_status():
+    """
+    获取准入控制状态：队列长度、背压（0~1）和水位配置
+    """
+    await admission_controller.refresh()
+    return admission_controller.get_status()
 
 # 处理队列中的数据
 @router.post("/queue/process", response_model=ProcessQueueResponse)
@@ -171,19 +376,59 @@ async def process_queue(
     result = qa_crawler_service.process_queue(db, batch_size)
     return result
 
+# 查看死信队列
+@router.get("/dead", response_model=dict)
+async def get_dead_letters(count: int = 20):
+    """
+    查看入库失败的数据（死信队列头部count条，不删除）
+    每条包含 data（原始数据）、error（失败原因）、attempts（尝试次数）、failed_at；
+    无法解码的队列数据（如本节点未安装msgpack/zstandard）以 raw（base64的原始字节）代替 data
+    """
+    if count <= 0 or count > 1000:
+        raise HTTPException(status_code=400, detail="count必须在1到1000之间")
+    return qa_crawler_service.get_dead_letters(count)
+
+# 重放死信队列
+@router.post("/dead/replay", response_model=dict)
+async def replay_dead_letters(count: int = 100, db: Session = Depends(get_db)):
+    """
+    重新入库死信队列中的数据（修复导致失败的问题后调用）
+    仍然失败的数据会以新的尝试次数放回死信队列
+    """
+    if count <= 0 or count > 1000:
+        raise HTTPException(status_code=400, detail="count必须在1到1000之间")
+    return qa_crawler_service.replay_dead_letters(db, count)
+
+# 清空死信队列
+@router.delete("/dead", response_model=dict)
+async def clear_dead_letters():
+    """
+    清空死信队列
+    """
+    deleted = qa_crawler_service.clear_dead_letters()
+    return {
+        "success": True,
+        "message": f"已删除 {deleted} 条死信数据",
+        "deleted": deleted
+    }
+
 # 获取问答小鲸鱼URL
 @router.get("/urls", response_model=dict)
-async def get_qa_crawler_urls(count: Optional[int] = None):
+async def get_qa_crawler_urls(count: Optional[int] = None, cursor: Optional[str] = None, page_size: int = 1000):
     """
     从Redis缓存中获取问答小鲸鱼URL
     
     参数:
-    - count: 要获取的URL数量，如果为None则获取所有URL
+    - count: 随机获取的URL数量
+    - cursor: 分页令牌，首页传0，之后传上一页返回的next_cursor（基于SSCAN，不阻塞Redis）
+    - page_size: 分页时每页大约的URL数量
+    - 两者都不传时返回所有URL（URL很多时请使用分页或 /urls/stream）
     
     返回:
     - urls: URL列表
     - count: 返回的URL数量
     - total: 缓存中URL总数
+    - next_cursor: 分页时下一页的令牌，为null表示已读完
     
     示例:
     ```bash
@@ -192,21 +437,63 @@ async def get_qa_crawler_urls(count: Optional[int] = None):
     
     # 获取10个随机URL
     curl -X GET "http://localhost:8000/api/qa-crawler/urls?count=10"
+
+    # 分页获取
+    curl -X GET "http://localhost:8000/api/qa-crawler/urls?cursor=0&page_size=5000"
     ```
     """
-    # 获取URL
-    urls = qa_crawler_service.get_urls(count)
-    
-    # 获取URL总数
-    redis_client = qa_crawler_service._get_redis()
-    total = redis_client.scard(qa_crawler_service.REDIS_URL_KEY) if redis_client else 0
-    
+    if cursor is not None:
+        _check_page_size(page_size)
+        page = await qa_crawler_service.scan_urls_async(_decode_cursor(cursor), page_size)
+        if page is None:
+            raise HTTPException(status_code=503, detail="Redis连接失败")
+        next_cursor, urls = page
+        return {
+            "urls": urls,
+            "count": len(urls),
+            "next_cursor": _encode_cursor(next_cursor)
+        }
+
+    # 获取URL和URL总数
+    result = await qa_crawler_service.get_urls_async(count)
+
     return {
-        "urls": urls,
-        "count": len(urls),
-        "total": total
+        "urls": result["urls"],
+        "count": len(result["urls"]),
+        "total": result["total"]
     }
 
+# 流式导出问答小鲸鱼URL
+@router.get("/urls/stream")
+async def stream_qa_crawler_urls(cursor: Optional[str] = None, page_size: int = 1000):
+    """
+    以NDJSON流式导出全部URL，每行一个 {"url": ...}
+    - 服务端按page_size逐页SSCAN并边读边发送，内存占用与集合大小无关
+    - cursor: 从分页接口返回的next_cursor处继续导出
+
+    示例:
+    ```bash
+    curl -N "http://localhost:8000/api/qa-crawler/urls/stream" > urls.ndjson
+    ```
+    """
+    _check_page_size(page_size)
+    # 先读取第一页，Redis不可用时直接返回503而不是空的流
+    first_page = await qa_crawler_service.scan_urls_async(_decode_cursor(cursor), page_size)
+    if first_page is None:
+        raise HTTPException(status_code=503, detail="Redis连接失败")
+
+    async def stream():
+        page = first_page
+        while page is not None:
+            next_cursor, urls = page
+            if urls:
+                yield "".join(json.dumps({"url": url}, ensure_ascii=False) + "\n" for url in urls)
+            if next_cursor == 0:
+                return
+            page = await qa_crawler_service.scan_urls_async(next_cursor, page_size)
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
 # 清空问答小鲸鱼缓存
 @router.delete("/clear", response_model=dict)
 async def clear_qa_crawler_cache():
@@ -9,6 +9,7 @@ from app.models.raw_data import RawData
 from app.models.comment_data import CommentData
 from app.models.task import Task
 from app.utils.raw_data_manager import RawDataManager
+from app.services.qa_crawler import qa_crawler_service
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/api/raw-data", tags=["raw-data"])
@@ -566,19 +567,58 @@ async def get_raw_data_comments(data_id: int, db: Session = Depends(get_db)):
 
     return response_data
 
+async def _enqueue_json_data(json_data: List[Dict[str, Any]], lane: str) -> Dict[str, Any]:
+    """把导入的JSON数据推入QA队列的指定通道"""
+    try:
+        lane = qa_crawler_service.resolve_lane(lane)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    errors = []
+    items = []
+    for idx, item in enumerate(json_data):
+        if not item.get('url'):
+            errors.append(f"第{idx+1}条数据缺少url字段")
+            continue
+        items.append((str(item['url']), item))
+
+    exists = await qa_crawler_service.submit_batch_async(items, lane, skip_existing=True) if items else []
+    if exists is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Redis连接失败")
+    for (url, _), url_exists in zip(items, exists):
+        if url_exists:
+            errors.append(f"URL已存在: {url}")
+
+    queued = len(items) - sum(1 for url_exists in exists if url_exists)
+    return {
+        "message": f"JSON数据已推入 {lane} 通道，入队 {queued} 条，失败 {len(errors)} 条",
+        "success_count": queued,
+        "error_count": len(errors),
+        "errors": errors,
+        "lane": lane
+    }
+
 # 新增导入JSON数据的API端点
 @router.post("/import-json", status_code=status.HTTP_201_CREATED)
 async def import_json_data(
     db: Session = Depends(get_db),
-    json_data: List[Dict[str, Any]] = Body(...)
+    json_data: List[Dict[str, Any]] = Body(...),
+    lane: Optional[str] = Query(None, description="指定时数据推入QA队列的该优先级通道（如backfill）异步入库，不直接写库")
 ):
-    """导入JSON格式的原始数据"""    
+    """导入JSON格式的原始数据
+
+    大批量历史数据建议指定 lane=backfill：数据进入回填通道，由队列消费者在实时数据之外的
+    空闲能力中入库，不会阻塞实时数据。此时按Redis中的URL集合判重，已存在的URL不入队。
+    """    
     if not json_data:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="没有提供JSON数据"
         )
 
+    if lane is not None:
+        return await _enqueue_json_data(json_data, lane)
+
     try:
         success_count = 0
         error_count = 0
@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 from app.database import get_db
 from app.services.recommendation import recommendation_service
+from app.services.frontier import url_frontier
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/api/recommendations", tags=["推荐页URL"])
@@ -21,6 +22,10 @@ class RecommendationURLsResponse(BaseModel):
     urls: List[str]
     count: int
 
+class CrawlResult(BaseModel):
+    url: str
+    signature: str
+
 # 初始化推荐页URL缓存（从raw_data加载）
 @router.post("/init", response_model=RecommendationInitResponse)
 async def init_recommendation_cache(db: Session = Depends(get_db)):
@@ -42,10 +47,9 @@ async def check_recommendation_cache():
     """
     检查推荐页URL缓存是否存在
     """
-    exists = recommendation_service.cache_exists()
-    count = recommendation_service.get_url_count()
+    count = await recommendation_service.get_url_count_async()
     return {
-        "exists": exists,
+        "exists": count > 0,
         "count": count
     }
 
@@ -62,7 +66,7 @@ async def get_recommendation_urls(count: Optional[int] = 10):
     if count > 100:
         raise HTTPException(status_code=400, detail="count不能超过100")
 
-    urls = recommendation_service.get_random_urls(count)
+    urls = await recommendation_service.get_random_urls_async(count)
 
     if not urls:
         raise HTTPException(status_code=404, detail="缓存中没有URL数据，请先初始化")
@@ -86,29 +90,22 @@ async def clear_recommendation_cache():
 
 # 检查URL并添加到队列
 @router.post("/queue/add", response_model=dict)
-async def add_url_to_queue(url: str):
+async def add_url_to_queue(url: str, priority: int = 0):
     """
-    检查URL是否在推荐页URL缓存中，不存在则添加到队列
+    检查URL是否在推荐页URL缓存中，不存在则加入URL调度队列（frontier）
+    - priority: 优先级，每级相当于提前 FRONTIER_PRIORITY_SECONDS 秒抓取
     """
-    from app.utils.redis import get_redis
-    from app.config import settings
-    
-    redis_client = get_redis()
-    if not redis_client:
+    flags = await url_frontier.add_async([url], priority)
+    if flags is None:
         raise HTTPException(status_code=500, detail="Redis连接失败")
-    
-    # 检查URL是否已存在
-    exists = redis_client.sismember(settings.REDIS_RECOMMENDATION_URLS_KEY, url)
-    
-    if not exists:
-        # 添加到队列
-        redis_client.rpush(settings.REDIS_RECOMMENDATION_QUEUE_KEY, url)
+
+    if not flags[0]:
         return {
             "success": True,
             "message": "URL已添加到队列",
             "exists": False
         }
-    
+
     return {
         "success": True,
         "message": "URL已存在于缓存中",
@@ -119,35 +116,63 @@ async def add_url_to_queue(url: str):
 @router.post("/queue/process", response_model=dict)
 async def process_queue(batch_size: int = 1):
     """
-    处理队列中的URL
+    取出到期待抓取的URL
+    - 按优先级和下次抓取时间排序，在各主机之间平均分配
+    - 取出的URL按其重抓间隔安排下一次抓取；抓取后通过 /queue/complete（或提交QA数据）回报页面签名，
+      页面有变化的URL会更频繁地重抓
     """
-    from app.utils.redis import get_redis
-    from app.config import settings
-    
     if batch_size <= 0:
         raise HTTPException(status_code=400, detail="batch_size必须大于0")
     
     if batch_size > 100:
         raise HTTPException(status_code=400, detail="batch_size不能超过100")
     
-    redis_client = get_redis()
-    if not redis_client:
+    urls = await url_frontier.lease_async(batch_size)
+    if urls is None:
         raise HTTPException(status_code=500, detail="Redis连接失败")
-    
-    # 从队列中获取URL
-    urls = redis_client.lrange(settings.REDIS_RECOMMENDATION_QUEUE_KEY, 0, batch_size - 1)
-    
-    if urls:
-        # 删除已获取的URL
-        redis_client.ltrim(settings.REDIS_RECOMMENDATION_QUEUE_KEY, batch_size, -1)
-        return {
-            "success": True,
-            "processed": len(urls),
-            "urls": [url.decode() if isinstance(url, bytes) else url for url in urls]
-        }
-    
+
+    return {
+        "success": True,
+        "processed": len(urls),
+        "urls": urls
+    }
+
+# 回报抓取结果
+@router.post("/queue/complete", response_model=dict)
+async def complete_queue_urls(results: List[CrawlResult]):
+    """
+    回报URL的抓取结果，signature为页面内容签名（如回答内容哈希+评论数）
+    签名与上次不同时缩短该URL的重抓间隔，相同时放大
+    """
+    changed = await url_frontier.complete_async([(item.url, item.signature) for item in results])
+    return {
+        "success": True,
+        "completed": len(results),
+        "changed": changed
+    }
+
+# 获取队列状态
+@router.get("/queue/status", response_model=dict)
+async def get_queue_status(url: Optional[str] = None):
+    """
+    获取URL调度队列统计（主机数、URL数、到期数）；指定url时返回该URL的调度信息
+    """
+    if url:
+        info = await url_frontier.get_url_info_async(url)
+        if info is None:
+            raise HTTPException(status_code=404, detail="URL不在调度队列中")
+        return info
+    return await url_frontier.get_status_async()
+
+# 清空队列
+@router.delete("/queue", response_model=dict)
+async def clear_queue():
+    """
+    清空URL调度队列（不影响推荐页URL缓存）
+    """
+    deleted = await url_frontier.clear_async()
     return {
         "success": True,
-        "processed": 0,
-        "urls": []
+        "message": "队列已清空",
+        "deleted": deleted
     }
@@ -6,8 +6,10 @@ from app.database import get_db
 from app.models.sample_data import SampleData
 from app.models.raw_data import RawData
 from app.models.year_quota import YearQuota
+from app.services.control_broker import control_broker
 from pydantic import BaseModel
 import random
+import uuid
 
 router = APIRouter(prefix="/api/sample-data", tags=["抽样数据"])
 
@@ -154,7 +156,7 @@ async def delete_sample_data(data_id: int, db: Session = Depends(get_db)):
 
 @router.post("/sample", status_code=status.HTTP_202_ACCEPTED)
 async def sample_data(background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
-    """按配额抽样数据"""
+    """按配额抽样数据，完成后通过 /api/events 推送 job 事件"""
     # 检查是否已有抽样数据
     existing_sample_data = db.query(SampleData).first()
     if existing_sample_data:
@@ -164,9 +166,10 @@ async def sample_data(background_tasks: BackgroundTasks, db: Session = Depends(g
         )
 
     # 添加后台任务
-    background_tasks.add_task(sample_data_task, db)
+    job_id = uuid.uuid4().hex
+    background_tasks.add_task(_run_sampling, job_id, db)
 
-    return {"message": "抽样任务已启动"}
+    return {"message": "抽样任务已启动", "job_id": job_id}
 
 @router.get("/clear")
 async def clear_sample_data(db: Session = Depends(get_db)):
@@ -220,6 +223,17 @@ async def get_sample_data_stats_by_task(db: Session = Depends(get_db)):
 
     return {str(task_id): {"task_name": task_name, "count": count} for task_id, task_name, count in stats}
 
+def _run_sampling(job_id: str, db: Session):
+    """执行抽样任务，通过控制面发布作业状态事件"""
+    control_broker.publish_job_event(job_id, "sampling", "running")
+    try:
+        sample_data_task(db)
+    except Exception as e:
+        db.rollback()
+        control_broker.publish_job_event(job_id, "sampling", "failed", error=str(e))
+        raise
+    control_broker.publish_job_event(job_id, "sampling", "completed", count=db.query(SampleData).count())
+
 # 抽样任务
 def sample_data_task(db: Session):
     """按配额抽样数据的后台任务"""
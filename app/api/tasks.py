@@ -1,5 +1,7 @@
 
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
@@ -7,6 +9,12 @@ from app.database import get_db
 from app.models.task import Task
 from app.models.account import Account
 from app.models.crawler_param import CrawlerParam
+from app.config import settings
+from app.services.task_dispatcher import task_dispatcher
+from app.services.proxy_pool import proxy_pool
+from app.services.control_broker import control_broker, TOPIC_TASK_EVENTS
+from app.services.task_metrics import task_metrics
+from app.utils.helpers import format_sse
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/api/tasks", tags=["任务管理"])
@@ -42,6 +50,46 @@ class TaskResponse(TaskBase):
     class Config:
         from_attributes = True
 
+def _launch_task(background_tasks: BackgroundTasks, task_type: str, task_id: int, params: dict,
+                 db: Optional[Session] = None, previous_status: Optional[int] = None):
+    """按调度模式启动任务：本地运行时或投递给crawler-worker
+
+    投递失败时把任务状态恢复为previous_status，否则任务一直显示运行中，之后无法再启动。
+    """
+    if settings.CRAWLER_DISPATCH_MODE == "redis":
+        if not task_dispatcher.enqueue(task_type, task_id, params):
+            if db is not None and previous_status is not None:
+                db_task = db.query(Task).filter(Task.id == task_id).first()
+                if db_task:
+                    db_task.status = previous_status
+                    db.commit()
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="任务投递失败，Redis不可用"
+            )
+        return
+
+    if task_type == "crawler":
+        from app.services.crawler import run_crawler_task
+        background_tasks.add_task(run_crawler_task, task_id, **params)
+    elif task_type == "export":
+        from app.services.exporter import run_export_task
+        background_tasks.add_task(run_export_task, task_id, **params)
+
+def _halt_task(task_type: str, task_id: int):
+    """停止任务：通过控制面通知实例所在的进程"""
+    if settings.CRAWLER_DISPATCH_MODE == "redis":
+        # 停止标记持久保存在Redis中，worker心跳时也会检查
+        task_dispatcher.request_stop(task_type, task_id)
+    control_broker.send_control(task_type, task_id, "stop")
+
+def _is_live(task_type: str, task_id: int) -> bool:
+    """任务实例是否仍在运行时中（本地或任一worker）"""
+    from app.services.crawler_runtime import crawler_runtime
+    if crawler_runtime.is_running(task_type, task_id):
+        return True
+    return settings.CRAWLER_DISPATCH_MODE == "redis" and task_dispatcher.is_running(task_type, task_id)
+
 # API路由
 @router.get("/", response_model=List[TaskResponse])
 async def get_tasks(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
@@ -49,6 +97,26 @@ async def get_tasks(skip: int = 0, limit: int = 100, db: Session = Depends(get_d
     tasks = db.query(Task).offset(skip).limit(limit).all()
     return tasks
 
+@router.get("/registry")
+async def get_task_registry():
+    """获取运行中任务的注册表（本地运行时 + Redis中所有worker）"""
+    from app.services.crawler_runtime import crawler_runtime
+    return {
+        "dispatch_mode": settings.CRAWLER_DISPATCH_MODE,
+        "local_running": crawler_runtime.count(),
+        "workers": task_dispatcher.get_registry()
+    }
+
+@router.get("/metrics")
+async def get_running_task_metrics(db: Session = Depends(get_db)):
+    """获取所有运行中/暂停中任务的运行指标"""
+    tasks = db.query(Task).filter(Task.status.in_([1, 2])).all()
+    return [
+        {"task_id": task.id, "task_name": task.task_name, "status": task.status,
+         "metrics": task_metrics.get_metrics(task.id)}
+        for task in tasks
+    ]
+
 @router.get("/{task_id}", response_model=TaskResponse)
 async def get_task(task_id: int, db: Session = Depends(get_db)):
     """获取单个任务信息"""
@@ -175,13 +243,13 @@ async def start_task(task_id: int, background_tasks: BackgroundTasks, db: Sessio
         )
 
     # 更新任务状态为运行中
+    previous_status = db_task.status
     db_task.status = 1
     db_task.start_time = datetime.now()
     db.commit()
 
     # 添加后台任务
     if db_task.task_type == "crawler":
-        from app.services.crawler import run_crawler_task
         # 获取爬虫参数
         crawler_params = {}
         if db_task.crawler_param_id:
@@ -196,7 +264,8 @@ async def start_task(task_id: int, background_tasks: BackgroundTasks, db: Sessio
                     'interval': crawler_param.interval_time * 3600,  # 将小时转换为秒
                     'restart_interval': crawler_param.restart_browser_time * 3600,  # 将小时转换为秒
                     'time_range': (crawler_param.start_time, crawler_param.end_time),
-                    'max_exception': crawler_param.error_count
+                    'max_exception': crawler_param.error_count,
+                    'fetch_mode': crawler_param.fetch_mode
                 }
 
                 
@@ -206,15 +275,10 @@ async def start_task(task_id: int, background_tasks: BackgroundTasks, db: Sessio
                     print(f"  账号ID: {account.id}")
                     print(f"  Cookie: {account.account_name[:20] if account.account_name else None}...")
 
-                # 获取代理信息
-                from app.models.proxy import Proxy
-                proxy_obj = db.query(Proxy).filter(Proxy.status == 1).first()
-                if proxy_obj:
-                    proxy = f"{proxy_obj.proxy_type}://{proxy_obj.proxy_addr}"
-                    print(f"  代理: {proxy}")  
-                background_tasks.add_task(run_crawler_task, task_id, **crawler_params)                  
+                # 代理由任务运行时从代理池中选择
+                print(f"  可用代理数: {proxy_pool.available_count()}")
+                _launch_task(background_tasks, "crawler", task_id, crawler_params, db, previous_status)
     elif db_task.task_type == "export":
-        from app.services.exporter import run_export_task
         # 获取导出参数
         export_params = {}
         if db_task.crawler_param_id:
@@ -229,7 +293,8 @@ async def start_task(task_id: int, background_tasks: BackgroundTasks, db: Sessio
                     'interval': crawler_param.interval_time * 3600,  # 将小时转换为秒
                     'restart_interval': crawler_param.restart_browser_time * 3600,  # 将小时转换为秒
                     'time_range': (crawler_param.start_time, crawler_param.end_time),
-                    'max_exception': crawler_param.error_count
+                    'max_exception': crawler_param.error_count,
+                    'fetch_mode': crawler_param.fetch_mode
                 }
 
                 # 获取账号cookie
@@ -238,13 +303,9 @@ async def start_task(task_id: int, background_tasks: BackgroundTasks, db: Sessio
                     print(f"  账号ID: {account.id}")
                     print(f"  Cookie: {account.account_name[:20] if account.account_name else None}...")
 
-                # 获取代理信息
-                from app.models.proxy import Proxy
-                proxy_obj = db.query(Proxy).filter(Proxy.status == 1).first()
-                if proxy_obj:
-                    proxy = f"{proxy_obj.proxy_type}://{proxy_obj.proxy_addr}"
-                    print(f"  代理: {proxy}")
-                background_tasks.add_task(run_export_task, task_id, **export_params)
+                # 代理由任务运行时从代理池中选择
+                print(f"  可用代理数: {proxy_pool.available_count()}")
+                _launch_task(background_tasks, "export", task_id, export_params, db, previous_status)
 
     db.refresh(db_task)
     return db_task
@@ -265,19 +326,14 @@ async def pause_task(task_id: int, db: Session = Depends(get_db)):
             detail="只能暂停运行中的任务"
         )
 
-    # 如果是爬虫任务，调用 stop_crawler_task
-    if db_task.task_type == "crawler":
-        from app.services.crawler import stop_crawler_task
-        stop_crawler_task(task_id)
-    # 如果是导出任务，调用 stop_export_task
-    elif db_task.task_type == "export":
-        from app.services.exporter import stop_export_task
-        stop_export_task(task_id)
+    # 实例保持运行，只暂停抓取，恢复时无需重新启动浏览器
+    control_broker.send_control(db_task.task_type, task_id, "pause")
 
     # 更新任务状态为暂停
     db_task.status = 2
     db.commit()
     db.refresh(db_task)
+    control_broker.publish_task_event(task_id, db_task.task_type, db_task.status)
     return db_task
 
 
@@ -291,20 +347,14 @@ async def stop_task(task_id: int, db: Session = Depends(get_db)):
             detail=f"任务ID {task_id} 不存在"
         )
 
-    # 如果是爬虫任务，调用 stop_crawler_task
-    if db_task.task_type == "crawler":
-        from app.services.crawler import stop_crawler_task
-        stop_crawler_task(task_id)
-    # 如果是导出任务，调用 stop_export_task
-    elif db_task.task_type == "export":
-        from app.services.exporter import stop_export_task
-        stop_export_task(task_id)
+    _halt_task(db_task.task_type, task_id)
 
     # 更新任务状态为暂停
     db_task.status = 2
     db_task.end_time = datetime.now()
     db.commit()
     db.refresh(db_task)
+    control_broker.publish_task_event(task_id, db_task.task_type, db_task.status, message="stopped")
     return db_task
 
 @router.delete("/{task_id}")
@@ -345,15 +395,21 @@ async def resume_task(task_id: int, background_tasks: BackgroundTasks, db: Sessi
         )
 
     # 更新任务状态为运行中
+    previous_status = db_task.status
     db_task.status = 1
     db.commit()
+
+    # 实例仍在运行（被暂停）时直接恢复
+    if _is_live(db_task.task_type, task_id):
+        control_broker.send_control(db_task.task_type, task_id, "resume")
+        db.refresh(db_task)
+        control_broker.publish_task_event(task_id, db_task.task_type, db_task.status)
+        return db_task
     
     # 添加后台任务
     if db_task.task_type == "crawler":        
-        from app.services.crawler import run_crawler_task
-        background_tasks.add_task(run_crawler_task, task_id)
+        _launch_task(background_tasks, "crawler", task_id, {}, db, previous_status)
     elif db_task.task_type == "export":
-        from app.services.exporter import run_export_task
         # 获取导出参数
         export_params = {}
         if db_task.crawler_param_id:
@@ -368,7 +424,8 @@ async def resume_task(task_id: int, background_tasks: BackgroundTasks, db: Sessi
                     'interval': crawler_param.interval_time * 3600,  # 将小时转换为秒
                     'restart_interval': crawler_param.restart_browser_time * 3600,  # 将小时转换为秒
                     'time_range': (crawler_param.start_time, crawler_param.end_time),
-                    'max_exception': crawler_param.error_count
+                    'max_exception': crawler_param.error_count,
+                    'fetch_mode': crawler_param.fetch_mode
                 }
 
                 # 获取账号cookie
@@ -377,13 +434,64 @@ async def resume_task(task_id: int, background_tasks: BackgroundTasks, db: Sessi
                     print(f"  账号ID: {account.id}")
                     print(f"  Cookie: {account.account_name[:20] if account.account_name else None}...")
 
-                # 获取代理信息
-                from app.models.proxy import Proxy
-                proxy_obj = db.query(Proxy).filter(Proxy.status == 1).first()
-                if proxy_obj:
-                    proxy = f"{proxy_obj.proxy_type}://{proxy_obj.proxy_addr}"
-                    print(f"  代理: {proxy}")
-                background_tasks.add_task(run_export_task, task_id, **export_params)
+                # 代理由任务运行时从代理池中选择
+                print(f"  可用代理数: {proxy_pool.available_count()}")
+                _launch_task(background_tasks, "export", task_id, export_params, db, previous_status)
 
     db.refresh(db_task)
     return db_task
+
+
+@router.get("/{task_id}/events")
+async def task_events(task_id: int, request: Request, db: Session = Depends(get_db)):
+    """任务状态变化事件流（SSE），连接时先推送当前状态"""
+    db_task = db.query(Task).filter(Task.id == task_id).first()
+    if not db_task:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"任务ID {task_id} 不存在"
+        )
+    snapshot = {
+        "task_id": task_id,
+        "kind": db_task.task_type,
+        "status": db_task.status,
+        "progress": db_task.progress,
+        "error_message": db_task.error_message
+    }
+
+    async def stream():
+        queue, unsubscribe = control_broker.subscribe_queue(TOPIC_TASK_EVENTS)
+        try:
+            yield format_sse("state", snapshot)
+            while not await request.is_disconnected():
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if message.get("task_id") == task_id:
+                    yield format_sse("state", message)
+        finally:
+            unsubscribe()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/{task_id}/metrics")
+async def get_task_metrics(task_id: int, db: Session = Depends(get_db)):
+    """获取任务运行指标：抓取页数、提交条数、字节数、错误分类、延迟p50/p95和当前速率"""
+    db_task = db.query(Task).filter(Task.id == task_id).first()
+    if not db_task:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"任务ID {task_id} 不存在"
+        )
+    return {
+        "task_id": task_id,
+        "status": db_task.status,
+        "interval_time": db_task.crawler_param.interval_time if db_task.crawler_param else None,
+        "metrics": task_metrics.get_metrics(task_id)
+    }
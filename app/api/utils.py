@@ -1,6 +1,8 @@
 
 from fastapi import APIRouter
+from pydantic import BaseModel
 from app.utils.redis import reload_redis
+from app.utils.sql_profiler import sql_profiler
 
 router = APIRouter(prefix="/api/utils", tags=["工具"])
 
@@ -20,3 +22,27 @@ async def reload_redis_config():
             return {"success": False, "message": "Redis配置重新加载失败"}
     except Exception as e:
         return {"success": False, "message": f"Redis配置重新加载失败: {str(e)}"}
+
+class ProfileToggle(BaseModel):
+    enabled: bool
+
+@router.get("/profile")
+async def get_sql_profile(limit: int = 20, order_by: str = "total"):
+    """获取SQL语句聚合统计（按 total / count / max 排序的前N条）"""
+    return {
+        "enabled": sql_profiler.enabled,
+        "slow_query_ms": sql_profiler.slow_threshold * 1000,
+        "statements": sql_profiler.top_statements(limit, order_by)
+    }
+
+@router.post("/profile")
+async def toggle_sql_profile(toggle: ProfileToggle):
+    """开启或关闭SQL性能分析"""
+    sql_profiler.enabled = toggle.enabled
+    return {"success": True, "enabled": sql_profiler.enabled}
+
+@router.delete("/profile")
+async def reset_sql_profile():
+    """清空SQL语句聚合统计"""
+    sql_profiler.reset()
+    return {"success": True, "message": "SQL统计已清空"}
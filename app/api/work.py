@@ -0,0 +1,107 @@
+import time
+import uuid
+from fastapi import APIRouter, HTTPException, Request
+from typing import List, Optional
+from app.config import settings
+from app.services.frontier import url_frontier
+from pydantic import BaseModel
+
+router = APIRouter(prefix="/api/work", tags=["抓取任务租约"])
+
+# Pydantic模型
+class LeasedURL(BaseModel):
+    url: str
+    lease_id: str
+
+class LeaseResponse(BaseModel):
+    lease_id: str
+    worker: str
+    expires_at: float
+    count: int
+    items: List[LeasedURL]
+
+class AckItem(BaseModel):
+    url: str
+    lease_id: str
+    signature: Optional[str] = None  # 页面签名，未提交QA数据时用于调整重抓间隔
+
+class NackItem(BaseModel):
+    url: str
+    lease_id: str
+
+class NackRequest(BaseModel):
+    items: List[NackItem]
+    delay: Optional[float] = None  # 重新到期前的延迟(秒)，默认 FRONTIER_NACK_DELAY
+
+def _worker_id(request: Request, worker: Optional[str]) -> str:
+    """worker标识：参数 > X-Worker-Id 请求头 > 客户端地址"""
+    return worker or request.headers.get("x-worker-id") or (request.client.host if request.client else "unknown")
+
+# 租用URL
+@router.post("/lease", response_model=LeaseResponse)
+async def lease_urls(request: Request, n: int = 10, worker: Optional[str] = None,
+                     visibility: Optional[int] = None):
+    """
+    租用最多n条到期待抓取的URL
+    - 抓取完成后调用 /ack 确认，放弃时调用 /nack；超过可见性超时（默认 FRONTIER_VISIBILITY_TIMEOUT 秒）
+      未确认的URL会自动重新分配给其他worker，worker崩溃不会丢失URL
+    - worker: worker标识（也可用 X-Worker-Id 请求头），用于统计
+
+    示例:
+    ```bash
+    curl -X POST "http://localhost:8000/api/work/lease?n=20" -H "X-Worker-Id: crawler-01"
+    ```
+    """
+    if n <= 0 or n > settings.WORK_LEASE_MAX:
+        raise HTTPException(status_code=400, detail=f"n必须在1到{settings.WORK_LEASE_MAX}之间")
+    visibility = visibility or url_frontier.visibility_timeout
+    if visibility <= 0:
+        raise HTTPException(status_code=400, detail="visibility必须大于0")
+
+    worker = _worker_id(request, worker)
+    lease_id = uuid.uuid4().hex
+    urls = await url_frontier.lease_async(n, worker, lease_id, visibility)
+    if urls is None:
+        raise HTTPException(status_code=503, detail="Redis连接失败")
+    return {
+        "lease_id": lease_id,
+        "worker": worker,
+        "expires_at": time.time() + visibility,
+        "count": len(urls),
+        "items": [{"url": url, "lease_id": lease_id} for url in urls]
+    }
+
+# 确认租约
+@router.post("/ack", response_model=dict)
+async def ack_urls(items: List[AckItem], request: Request, worker: Optional[str] = None):
+    """
+    确认已完成抓取的URL，按抓取结果安排下一次抓取
+    - 已通过 /api/qa-crawler/submit 提交数据的URL可以不带signature
+    - 租约已过期并被重新分配的确认计入stale，不生效
+    """
+    return await url_frontier.ack_async(
+        _worker_id(request, worker), [(item.url, item.lease_id, item.signature) for item in items]
+    )
+
+# 放弃租约
+@router.post("/nack", response_model=dict)
+async def nack_urls(body: NackRequest, request: Request, worker: Optional[str] = None):
+    """
+    放弃租用的URL（抓取失败），URL在delay秒后重新分配
+    """
+    if body.delay is not None and body.delay < 0:
+        raise HTTPException(status_code=400, detail="delay不能小于0")
+    return await url_frontier.nack_async(
+        _worker_id(request, worker), [(item.url, item.lease_id) for item in body.items], body.delay
+    )
+
+# 租约统计
+@router.get("/stats", response_model=dict)
+async def get_work_stats():
+    """
+    各worker的租约统计（leased/acked/nacked/expired/stale/in_flight/last_seen）和URL调度队列统计
+    """
+    return {
+        "workers": await url_frontier.get_worker_stats_async(),
+        "frontier": await url_frontier.get_status_async()
+    }
@@ -7,7 +7,7 @@ class Settings:
     APP_NAME: str = "小鲸鱼管理系统"
     VERSION: str = "1.0.0"
     DEBUG: bool = True
-    PORT: int = 5432
+    PORT: int = 8000
 
     # 数据库配置
     DATABASE_URL: str = "sqlite:///./crawler_management.db"
@@ -30,6 +30,87 @@ class Settings:
     MAX_RETRIES: int = 3        # 最大重试次数
     TIMEOUT: int = 30           # 请求超时时间(秒)
     HEADLESS: bool = False      # 浏览器是否无头模式
+    HTTP_FETCH_MAX_CONNECTIONS: int = 100  # HTTP抓取模式连接池大小
+    HTTP_FETCH_PER_HOST_LIMIT: int = 8  # HTTP抓取模式单个主机最大并发请求数
+    PAGE_PARSER_BACKEND: str = "auto"  # 页面解析后端：auto/selectolax/lxml/bs4
+    PAGE_PARSER_PROCESSES: int = 0  # 页面解析进程池大小，0表示在事件循环中直接解析
+    RATE_LIMIT_ENABLED: bool = True  # 是否启用按主机限速
+    RATE_LIMIT_SHARED: bool = True  # 是否通过Redis在多个节点间共享限速预算
+    RATE_LIMIT_DEFAULT_RATE: float = 1.0  # 每个主机初始速率(请求/秒)
+    RATE_LIMIT_MIN_RATE: float = 0.05  # 每个主机最低速率(请求/秒)
+    RATE_LIMIT_MAX_RATE: float = 5.0  # 每个主机最高速率(请求/秒)
+    RATE_LIMIT_BURST: int = 5  # 令牌桶容量（允许的突发请求数）
+    RATE_LIMIT_INCREASE: float = 0.05  # 请求成功时速率的加性增量
+    RATE_LIMIT_DECREASE: float = 0.5  # 请求被限流/出错时速率的乘性因子
+    RATE_LIMIT_LATENCY_TARGET: float = 5.0  # 超过该延迟(秒)视为过载，触发降速
+    RATE_LIMIT_REDIS_BACKOFF: int = 30  # Redis不可用时改用本地限速的时长(秒)，之后再尝试Redis
+    PROXY_EWMA_ALPHA: float = 0.2  # 代理健康分EWMA平滑系数
+    PROXY_FAILURE_THRESHOLD: int = 3  # 代理连续失败多少次后隔离
+    PROXY_QUARANTINE_SECONDS: int = 60  # 代理首次隔离时长(秒)，再次隔离时翻倍
+    PROXY_POOL_REFRESH_INTERVAL: int = 30  # 代理池从数据库重新加载代理的间隔(秒)
+    PROXY_PROBE_INTERVAL: int = 60  # 代理后台探活间隔(秒)
+    PROXY_PROBE_TIMEOUT: int = 5  # 代理探活超时(秒)
+    PROXY_PROBE_URL: str = ""  # 代理探活地址，须为经代理可访问的外部地址（如 http://www.gstatic.com/generate_204），为空时不探活，隔离到期后自动启用
+    ACCOUNT_LEASE_TTL: int = 60  # 账号租约有效期(秒)，持有期间自动续期
+    ACCOUNT_COOLDOWN_SECONDS: int = 600  # 账号被限制后的冷却时长(秒)，连续被限制时翻倍
+    ACCOUNT_COOKIE_DOMAIN: str = ".zhihu.com"  # "a=1; b=2"形式的账号cookie使用的域名
+    TASK_METRICS_FLUSH_INTERVAL: int = 30  # 任务运行指标落库间隔(秒)
+    TASK_METRICS_LATENCY_SAMPLES: int = 500  # 计算延迟分位数保留的最近样本数
+    TASK_METRICS_RATE_WINDOW: int = 300  # 计算当前抓取速率的时间窗口(秒)
+    SQL_PROFILING_ENABLED: bool = False  # 是否开启SQL性能分析（每个请求的查询统计、慢查询日志）
+    SQL_SLOW_QUERY_MS: int = 100  # 慢查询阈值(毫秒)
+    SQL_PROFILING_MAX_STATEMENTS: int = 500  # 聚合统计最多保留的不同语句数
+    HEALTH_CHECK_TTL: int = 5  # 健康检查结果缓存时间(秒)
+    HEALTH_CONSUMER_MAX_LAG: int = 60  # QA消费循环超过该时间(秒)未完成视为未就绪
+    HEARTBEAT_ENABLED: bool = False  # 是否随应用启动外部看门狗
+    HEARTBEAT_URL: str = ""  # 看门狗探测地址，为空时使用 http://127.0.0.1:{PORT}/healthz
+    HEARTBEAT_INTERVAL: int = 30  # 看门狗探测间隔(秒)
+    QA_CONSUMER_BATCH_SIZE: int = 100  # QA队列消费者每批入库条数
+    QA_QUEUE_LANES: str = "realtime:10,normal:3,backfill:1"  # QA队列优先级通道及出队权重（名称:权重，第一个通道使用原队列键）
+    QA_QUEUE_DEFAULT_LANE: str = "realtime"  # 提交时未指定通道使用的通道
+    QA_SUBMIT_BATCH_MAX_ITEMS: int = 5000  # 批量提交接口单次最多条数
+    QA_SUBMIT_BATCH_MAX_BYTES: int = 50 * 1024 * 1024  # 批量提交请求体（解压后）最大字节数
+    QA_URLS_PAGE_MAX: int = 10000  # URL分页/流式接口每页最大条数
+    QA_DEAD_LETTER_MAX: int = 100000  # 死信队列最多保留条数，超过后丢弃最早的
+    DEDUP_CACHE_SIZE: int = 200000  # 进程内URL去重缓存条目上限，0表示不启用
+    DEDUP_CACHE_TTL: int = 300  # 去重缓存条目有效期(秒)
+    SPOOL_PATH: str = "spool/qa_spool.db"  # Redis不可用时QA提交数据的本地spool文件
+    SPOOL_MAX_ITEMS: int = 1000000  # 本地spool最多条数，超过后拒绝提交
+    SPOOL_REDIS_TIMEOUT: float = 2.0  # 提交写入Redis超过该时间(秒，每1000条)转写本地spool，0表示不限制
+    SPOOL_REPLAY_BATCH: int = 500  # spool每批回放条数
+    SPOOL_REPLAY_INTERVAL: int = 5  # spool回放检查间隔(秒)
+    DASHBOARD_SUMMARY_TTL: int = 5  # 仪表盘汇总快照缓存时间(秒)
+    QUEUE_CODEC: str = "msgpack"  # 队列数据序列化方式：json/msgpack（msgpack未安装时回退json）
+    QUEUE_COMPRESSION: str = "zstd"  # 队列数据压缩方式：none/zlib/zstd/lz4（未安装时回退zlib）
+    QUEUE_COMPRESS_MIN_BYTES: int = 1024  # 序列化后超过该大小(字节)才压缩
+    QUEUE_BLOB_THRESHOLD: int = 0  # 编码后超过该大小(字节)的数据存入本地blob目录，0表示不启用
+    QUEUE_BLOB_DIR: str = "queue_blobs"  # 队列大数据blob目录
+    ADMISSION_ENABLED: bool = True  # 是否对QA数据提交做准入控制
+    ADMISSION_LOW_WATER: int = 50000  # 队列长度低水位，超过后按比例拒绝提交
+    ADMISSION_HIGH_WATER: int = 200000  # 队列长度高水位，超过后拒绝全部提交
+    ADMISSION_MAX_LAG: int = 120  # 消费循环超过该时间(秒)未完成视为停滞，队列到低水位即拒绝提交
+    ADMISSION_RETRY_AFTER: int = 10  # 拒绝提交时建议的重试等待(秒)
+    ADMISSION_CLIENT_RATE: float = 0  # 每个客户端每秒允许提交的条数，0表示不限制
+    ADMISSION_CLIENT_BURST: int = 1000  # 每个客户端令牌桶容量
+    ADMISSION_REFRESH_INTERVAL: float = 1.0  # 读取队列长度刷新背压的最小间隔(秒)
+    ADMISSION_SIGNAL_TTL: int = 15  # Redis中背压信号的有效期(秒)
+    BACKPRESSURE_MAX_SLOWDOWN: float = 10.0  # 背压为1时爬虫抓取间隔放大的倍数
+    FRONTIER_PRIORITY_SECONDS: int = 3600  # URL调度中每级优先级相当于提前的秒数
+    FRONTIER_HOST_DELAY: float = 0  # 同一主机两次取URL的最小间隔(秒)
+    FRONTIER_DEFAULT_INTERVAL: int = 24 * 3600  # 默认重抓间隔(秒)
+    FRONTIER_MIN_INTERVAL: int = 3600  # 最小重抓间隔(秒)
+    FRONTIER_MAX_INTERVAL: int = 30 * 24 * 3600  # 最大重抓间隔(秒)
+    FRONTIER_BACKOFF: float = 2.0  # 页面未变化时重抓间隔放大的倍数（变化时按该倍数缩短）
+    FRONTIER_TRACK_SUBMISSIONS: bool = True  # 提交QA数据时回报页面签名，调整该URL的重抓间隔
+    FRONTIER_TRACK_LANES: str = "realtime,normal"  # 提交后加入重抓调度的QA队列通道（逗号分隔，backfill默认不跟踪）
+    FRONTIER_VISIBILITY_TIMEOUT: int = 300  # 租约可见性超时(秒)，超时未确认的URL重新分配
+    FRONTIER_NACK_DELAY: int = 60  # 放弃租约后URL重新到期前的延迟(秒)
+    WORK_LEASE_MAX: int = 500  # 单次租约最多URL数
+    CRAWLER_RUNTIME_LOOPS: int = 1  # 爬虫运行时事件循环数量，0表示每个CPU核心一个
+    CRAWLER_DISPATCH_MODE: str = "local"  # 任务调度模式：local-API进程内运行，redis-投递给独立的crawler-worker
+    CRAWLER_WORKER_CONCURRENCY: int = 10  # 每个crawler-worker同时运行的任务数
+    CRAWLER_LEASE_TTL: int = 30  # 任务租约有效期(秒)
+    CRAWLER_HEARTBEAT_INTERVAL: int = 10  # worker心跳间隔(秒)
 
     # 抽样配置
     TOTAL_SAMPLE_NUM: int = 10000  # 总抽样条数
@@ -42,6 +123,23 @@ class Settings:
     REDIS_RECOMMENDATION_URLS_KEY: str = "recommendation:urls"  # 推荐页URL集合
     REDIS_QA_CRAWLER_URLS_KEY: str = "qa_crawler:urls"  # 问答小鲸鱼URL集合
     REDIS_QA_CRAWLER_QUEUE_KEY: str = "qa_crawler:queue"  # 问答小鲸鱼数据队列
+    REDIS_QA_CRAWLER_DEAD_KEY: str = "qa_crawler:dead"  # 问答小鲸鱼入库失败数据（死信队列）
     REDIS_RECOMMENDATION_QUEUE_KEY: str = "recommendation:queue"  # 推荐页数据队列
+    REDIS_CRAWLER_JOBS_KEY: str = "crawler:jobs"  # 爬虫任务调度队列
+    REDIS_CRAWLER_REGISTRY_KEY: str = "crawler:registry"  # 爬虫任务注册表
+    REDIS_CRAWLER_LEASE_PREFIX: str = "crawler:lease:"  # 爬虫任务租约键前缀
+    REDIS_CRAWLER_STOP_PREFIX: str = "crawler:stop:"  # 爬虫任务停止请求键前缀
+    REDIS_RATE_LIMIT_PREFIX: str = "ratelimit:"  # 按主机限速令牌桶键前缀
+    REDIS_PROXY_CURSOR_KEY: str = "proxy:cursor"  # 代理轮询游标
+    REDIS_ACCOUNT_LEASE_PREFIX: str = "account:lease:"  # 账号租约键前缀
+    REDIS_ACCOUNT_COOLDOWN_PREFIX: str = "account:cooldown:"  # 账号冷却键前缀
+    REDIS_CONTROL_CHANNEL_PREFIX: str = "control:"  # 控制面发布订阅频道前缀
+    REDIS_TASK_METRICS_PREFIX: str = "task:metrics:"  # 任务运行指标快照键前缀
+    REDIS_QA_BACKPRESSURE_KEY: str = "qa_crawler:backpressure"  # 问答数据队列背压信号
+    REDIS_FRONTIER_HOSTS_KEY: str = "frontier:hosts"  # URL调度：各主机最早可抓取时间
+    REDIS_FRONTIER_READY_KEY: str = "frontier:host_ready"  # URL调度：各主机冷却截止时间
+    REDIS_FRONTIER_HOST_PREFIX: str = "frontier:host:"  # URL调度：主机待抓取URL有序集合键前缀
+    REDIS_FRONTIER_META_PREFIX: str = "frontier:meta:"  # URL调度：URL重抓元数据键前缀
+    REDIS_FRONTIER_WORKERS_KEY: str = "frontier:workers"  # URL调度：各worker租约统计
 
 settings = Settings()
@@ -1,8 +1,11 @@
 
-from sqlalchemy import create_engine
+import time
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
+from app.utils.metrics import DB_QUERY_DURATION
+from app.utils.sql_profiler import sql_profiler
 
 # 创建数据库引擎
 engine = create_engine(
@@ -10,6 +13,22 @@ engine = create_engine(
     connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
 )
 
+# SQL执行耗时统计（按语句类型预先绑定标签）
+_QUERY_TIMERS = {verb: DB_QUERY_DURATION.labels(verb) for verb in ("SELECT", "INSERT", "UPDATE", "DELETE", "OTHER")}
+
+@event.listens_for(engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+@event.listens_for(engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_start"].pop()
+    verb = statement.lstrip()[:6].upper()
+    _QUERY_TIMERS.get(verb, _QUERY_TIMERS["OTHER"]).observe(time.perf_counter() - started)
+
+# SQL性能分析（按需开启）
+sql_profiler.attach(engine)
+
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -24,6 +43,36 @@ def get_db():
     finally:
         db.close()
 
+# 新增字段迁移：create_all 不会给已存在的表加列，这里按需补齐
+# 格式: {表名: [(列名, 列定义SQL)]}
+COLUMN_MIGRATIONS = {
+    "crawler_param": [
+        ("fetch_mode", "VARCHAR(20) NOT NULL DEFAULT 'browser'"),
+    ],
+    "task": [
+        ("metrics", "TEXT"),
+    ],
+}
+
+def _add_missing_columns(inspector):
+    """为已存在的表补齐新增字段"""
+    from sqlalchemy import text
+    table_names = inspector.get_table_names()
+    for table, columns in COLUMN_MIGRATIONS.items():
+        if table not in table_names:
+            continue
+        existing = {col["name"] for col in inspector.get_columns(table)}
+        for name, ddl in columns:
+            if name in existing:
+                continue
+            with engine.connect() as conn:
+                try:
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+                    conn.commit()
+                    print(f"已为表 {table} 添加字段: {name}")
+                except Exception as e:
+                    print(f"为表 {table} 添加字段 {name} 失败: {e}")
+
 # 初始化数据库
 def init_db():
     try:
@@ -40,6 +89,9 @@ def init_db():
     from sqlalchemy import inspect, text
     inspector = inspect(engine)
 
+    # 补齐新增字段
+    _add_missing_columns(inspector)
+
     # 检查account表是否存在
     if 'account' in inspector.get_table_names():
         # 获取account表的索引
@@ -0,0 +1,83 @@
+"""
+页面解析后端基准测试
+
+对保存的页面语料逐个后端解析，输出每个后端的吞吐量（docs/sec）。
+
+用法:
+    python -m app.examples.parser_benchmark <语料目录> [--rounds 3] [--url https://www.zhihu.com/]
+
+语料目录中的 *.html / *.htm 文件都会被读取；未指定目录时使用内置的示例页面。
+"""
+import argparse
+import os
+import sys
+import time
+
+# 添加项目根目录到Python路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.services.page_parser import available_backends, get_backend, extract
+
+SAMPLE_PAGE = """
+<html><body>
+<h1 class="QuestionHeader-title">如何学习Python</h1>
+<div class="AuthorInfo">
+  <a class="UserLink-link" href="/people/example">示例作者</a>
+  <div class="AuthorInfo-badgeText">编程话题优秀答主</div>
+  <div class="AuthorInfo-headline">软件工程师</div>
+  <div class="NumberBoard-itemValue">1.2万</div>
+</div>
+<div class="RichContent-inner">%s</div>
+<span class="ContentItem-time">发布于 2023-05-15 10:30</span>
+</body></html>
+""" % ("<p>Python是一门非常流行的编程语言。</p>" * 200)
+
+
+def load_corpus(directory):
+    """读取语料目录中的HTML文件"""
+    pages = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith((".html", ".htm")):
+            with open(os.path.join(directory, name), "r", encoding="utf-8", errors="ignore") as f:
+                pages.append(f.read())
+    return pages
+
+
+def run_benchmark(pages, url, rounds):
+    """对每个可用后端解析全部语料，返回 {后端: docs/sec}"""
+    results = {}
+    for name in available_backends():
+        backend = get_backend(name)
+        # 预热（编译选择器等）
+        extract(pages[0], url, backend=backend)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for html in pages:
+                extract(html, url, backend=backend)
+        elapsed = time.perf_counter() - start
+        results[name] = len(pages) * rounds / elapsed if elapsed > 0 else float("inf")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="页面解析后端基准测试")
+    parser.add_argument("corpus", nargs="?", help="保存的页面语料目录")
+    parser.add_argument("--rounds", type=int, default=3, help="每个后端解析语料的轮数")
+    parser.add_argument("--url", default="https://www.zhihu.com/", help="用于匹配站点规则的URL")
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus) if args.corpus else [SAMPLE_PAGE] * 100
+    if not pages:
+        print("语料目录中没有HTML文件")
+        return
+
+    print(f"语料: {len(pages)} 个页面, 轮数: {args.rounds}")
+    results = run_benchmark(pages, args.url, args.rounds)
+    baseline = results.get("bs4")
+    for name, docs_per_sec in sorted(results.items(), key=lambda item: item[1], reverse=True):
+        speedup = f" ({docs_per_sec / baseline:.1f}x bs4)" if baseline else ""
+        print(f"  {name:<12} {docs_per_sec:10.1f} docs/sec{speedup}")
+
+
+if __name__ == "__main__":
+    main()
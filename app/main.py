@@ -2,15 +2,26 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response
+from starlette.concurrency import run_in_threadpool
+import time
 from contextlib import asynccontextmanager
-from app.api import accounts, tasks, proxies, quotas, raw_data, sample_data, exports, redis_configs, utils, crawler_params, recommendations, qa_crawler
+from app.api import accounts, tasks, proxies, quotas, raw_data, sample_data, exports, redis_configs, utils, crawler_params, recommendations, qa_crawler, work, dashboard, events
 from app.models.crawler_param import CrawlerParam
 from app.config import settings
 from app.database import init_db
-from app.utils.redis import init_redis
+from app.utils.redis import init_redis, close_async_redis
 from app.services.heartbeat import heartbeat_service
+from app.services.health import health_service
 from app.workers.qa_crawler_consumer import qa_crawler_consumer
+from app.services.spool import local_spool
+from app.services.crawler_runtime import crawler_runtime
+from app.services.page_parser import shutdown_process_pool
+from app.services.proxy_pool import proxy_pool
+from app.services.control_broker import control_broker
+from app.services.task_metrics import task_metrics
+from app.utils.metrics import registry, HTTP_REQUEST_DURATION
+from app.utils.sql_profiler import sql_profiler
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -27,9 +38,15 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         print(f"启动QA小鲸鱼消费者失败: {str(e)}")
 
-    # 初始化并启动心跳服务
-    heartbeat_service.init_app(app)
-    heartbeat_service.start()
+    # 启动本地spool回放（Redis不可用期间暂存的提交）
+    await local_spool.start()
+
+    # 可选的外部看门狗
+    if settings.HEARTBEAT_ENABLED:
+        heartbeat_service.start()
+
+    # 启动代理池后台探活
+    proxy_pool.start_health_checks()
 
     yield
 
@@ -38,6 +55,17 @@ async def lifespan(app: FastAPI):
         await qa_crawler_consumer.stop()
     except Exception as e:
         print(f"停止QA小鲸鱼消费者失败: {str(e)}")
+    await local_spool.stop()
+
+    proxy_pool.stop_health_checks()
+    heartbeat_service.stop()
+
+    # 停止爬虫运行时中的所有实例
+    crawler_runtime.shutdown()
+    shutdown_process_pool()
+    task_metrics.shutdown()
+    control_broker.close()
+    await close_async_redis()
     print("应用关闭")
 
 def create_app():
@@ -60,6 +88,40 @@ def create_app():
         allow_headers=["*"],
     )
 
+    # 接口耗时统计：按路由模板（而不是实际路径）分组，避免标签数量膨胀
+    # (方法, 路由模板, 状态码) -> 耗时子指标，每个请求不必再调用labels()
+    request_durations = {}
+
+    @app.middleware("http")
+    async def record_request_duration(request, call_next):
+        started = time.perf_counter()
+        status_code = 500
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            return response
+        finally:
+            route = request.scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            key = (request.method, route_path, status_code)
+            duration = request_durations.get(key)
+            if duration is None:
+                duration = request_durations[key] = HTTP_REQUEST_DURATION.labels(*key)
+            duration.observe(time.perf_counter() - started)
+
+    # SQL性能分析：开启时统计每个请求的查询次数和耗时，通过Server-Timing响应头返回
+    @app.middleware("http")
+    async def profile_sql(request, call_next):
+        if not sql_profiler.enabled:
+            return await call_next(request)
+        profile = sql_profiler.start_request()
+        try:
+            response = await call_next(request)
+        finally:
+            sql_profiler.end_request()
+        response.headers["Server-Timing"] = profile.server_timing()
+        return response
+
     # 注册API路由
     app.include_router(accounts.router)
     app.include_router(tasks.router)
@@ -73,6 +135,26 @@ def create_app():
     app.include_router(crawler_params.router)
     app.include_router(recommendations.router)
     app.include_router(qa_crawler.router)
+    app.include_router(work.router)
+    app.include_router(dashboard.router)
+    app.include_router(events.router)
+
+    # Prometheus指标
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return Response(content=registry.render(), media_type=registry.CONTENT_TYPE)
+
+    # 存活检查：只检查进程内部状态
+    @app.get("/healthz", include_in_schema=False)
+    async def healthz():
+        result = await run_in_threadpool(health_service.liveness)
+        return JSONResponse(result, status_code=200 if result["status"] == "ok" else 503)
+
+    # 就绪检查：数据库、Redis、队列消费延迟、爬虫运行时
+    @app.get("/readyz", include_in_schema=False)
+    async def readyz():
+        result = await run_in_threadpool(health_service.readiness)
+        return JSONResponse(result, status_code=200 if result["status"] == "ok" else 503)
 
     # 挂载静态文件
     app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -15,6 +15,7 @@ class CrawlerParam(Base):
     interval_time = Column(Integer, nullable=False, default=1, comment="间隔时间(小时)")
     error_count = Column(Integer, nullable=False, default=3, comment="异常次数")
     restart_browser_time = Column(Integer, nullable=False, default=24, comment="重启浏览器时间(小时)")
+    fetch_mode = Column(String(20), nullable=False, default="browser", server_default="browser", comment="抓取模式：browser-浏览器，http-HTTP客户端，auto-优先HTTP失败回退浏览器")
     created_at = Column(DateTime, default=datetime.now, comment="创建时间")
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now, comment="更新时间")
 
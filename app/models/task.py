@@ -19,6 +19,7 @@ class Task(Base):
     error_message = Column(Text, nullable=True, comment="错误信息")
     retry_count = Column(Integer, default=0, comment="重试次数")
     progress = Column(Integer, default=0, comment="进度百分比")
+    metrics = Column(Text, nullable=True, comment="运行指标快照(JSON)")
 
     # 关联账号
     account = relationship("Account", backref="tasks")
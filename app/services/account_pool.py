@@ -0,0 +1,285 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Union
+from app.database import SessionLocal
+from app.models.account import Account
+from app.utils.redis import get_redis
+from app.config import settings
+
+
+# 被目标站点限制的响应状态码
+BLOCK_STATUS_CODES = (401, 403, 429)
+
+
+def parse_cookies(cookie: Optional[str]) -> List[Dict]:
+    """将账号cookie解析为Playwright cookie列表
+
+    支持单个cookie对象、cookie对象数组、storage_state（含cookies字段）的JSON，
+    以及 "a=1; b=2" 形式的cookie字符串（域名取ACCOUNT_COOKIE_DOMAIN）。
+    """
+    if not cookie:
+        return []
+    try:
+        data = json.loads(cookie)
+    except (ValueError, TypeError):
+        pairs = [item.split("=", 1) for item in cookie.split(";") if "=" in item]
+        return [
+            {"name": k.strip(), "value": v.strip(), "domain": settings.ACCOUNT_COOKIE_DOMAIN, "path": "/"}
+            for k, v in pairs
+        ]
+    if isinstance(data, dict) and isinstance(data.get("cookies"), list):
+        data = data["cookies"]
+    cookies = []
+    for item in data if isinstance(data, list) else [data]:
+        if not isinstance(item, dict) or "name" not in item or "value" not in item:
+            continue
+        item = dict(item)
+        # 确保expires字段是浮点数类型
+        if isinstance(item.get("expires"), str):
+            try:
+                item["expires"] = float(item["expires"])
+            except (ValueError, TypeError):
+                item.pop("expires", None)
+        if "url" not in item and "domain" not in item:
+            item["domain"] = settings.ACCOUNT_COOKIE_DOMAIN
+            item.setdefault("path", "/")
+        cookies.append(item)
+    return cookies
+
+
+class _AccountState:
+    """单个账号的使用状态"""
+
+    __slots__ = ("requests", "blocks", "consecutive_blocks", "cooldown_until", "last_used")
+
+    def __init__(self):
+        self.requests = 0
+        self.blocks = 0
+        self.consecutive_blocks = 0
+        self.cooldown_until = 0.0
+        self.last_used = 0.0
+
+
+class AccountPool:
+    """账号池服务
+
+    把账号租给任务，同一账号同一时间只会被一个爬虫使用（Redis可用时租约跨进程共享），
+    并跨运行保留每个账号的Playwright storage_state。记录每个账号的请求数和被限制信号，
+    被限制的账号进入冷却期，租用时优先选择最久未使用、请求最少的账号以分摊负载。
+    """
+
+    REDIS_LEASE_PREFIX = settings.REDIS_ACCOUNT_LEASE_PREFIX
+    REDIS_COOLDOWN_PREFIX = settings.REDIS_ACCOUNT_COOLDOWN_PREFIX
+
+    # 仅当租约仍属于自己时续期/释放
+    _RENEW_SCRIPT = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('EXPIRE', KEYS[1], ARGV[2])
+    end
+    return 0
+    """
+    _RELEASE_SCRIPT = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('DEL', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, storage_root: str = "cookiedata"):
+        self.storage_root = storage_root
+        self.lease_ttl = settings.ACCOUNT_LEASE_TTL
+        self.cooldown_seconds = settings.ACCOUNT_COOLDOWN_SECONDS
+        self._lock = threading.RLock()
+        self._leases: Dict[int, str] = {}  # 账号ID -> 租用者
+        self._states: Dict[int, _AccountState] = {}
+        self._renew_thread = None
+        self._stop_event = threading.Event()
+
+    def storage_dir(self, account_id: int) -> str:
+        """账号的浏览器状态目录（跨运行保留）"""
+        path = os.path.join(self.storage_root, f"cookie{account_id}")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def state_file(self, account_id: int) -> str:
+        return os.path.join(self.storage_dir(account_id), "state.json")
+
+    def storage_state(self, account_id: Optional[int], cookie: Optional[str]) -> Optional[Union[str, Dict]]:
+        """浏览器上下文的storage_state：优先复用上次保存的状态，否则用账号cookie初始化"""
+        if account_id is not None:
+            state_file = self.state_file(account_id)
+            if os.path.exists(state_file) and os.path.getsize(state_file) > 0:
+                return state_file
+        cookies = parse_cookies(cookie)
+        return {"cookies": cookies} if cookies else None
+
+    def cookie_dict(self, account_id: Optional[int], cookie: Optional[str]) -> Optional[Dict[str, str]]:
+        """HTTP客户端使用的 {name: value} cookie，优先取上次保存的浏览器状态"""
+        state = self.storage_state(account_id, cookie)
+        if isinstance(state, str):
+            try:
+                with open(state, "r", encoding="utf-8") as f:
+                    cookies = json.load(f).get("cookies", [])
+            except (OSError, ValueError):
+                cookies = parse_cookies(cookie)
+        else:
+            cookies = state["cookies"] if state else []
+        return {c["name"]: c["value"] for c in cookies} or None
+
+    def _state(self, account_id: int) -> _AccountState:
+        state = self._states.get(account_id)
+        if state is None:
+            state = self._states[account_id] = _AccountState()
+        return state
+
+    def _lease_key(self, account_id: int) -> str:
+        return f"{self.REDIS_LEASE_PREFIX}{account_id}"
+
+    def _is_cooling(self, account_id: int, now: float) -> bool:
+        if now < self._state(account_id).cooldown_until:
+            return True
+        redis_client = get_redis()
+        if redis_client:
+            try:
+                return bool(redis_client.exists(f"{self.REDIS_COOLDOWN_PREFIX}{account_id}"))
+            except Exception:
+                pass
+        return False
+
+    def _try_lease(self, account_id: int, owner: str) -> bool:
+        """尝试租用账号"""
+        if account_id in self._leases:
+            return self._leases[account_id] == owner
+        redis_client = get_redis()
+        if redis_client:
+            try:
+                if not redis_client.set(self._lease_key(account_id), owner, nx=True, ex=self.lease_ttl):
+                    return False
+            except Exception as e:
+                print(f"Redis账号租约失败，使用本地租约: {str(e)}")
+        self._leases[account_id] = owner
+        self._ensure_renewer()
+        return True
+
+    def acquire(self, owner: str, preferred_id: Optional[int] = None) -> Optional[Account]:
+        """为租用者租一个账号
+
+        优先租用指定账号；其被占用或在冷却中时，轮换到最久未使用、请求最少的可用账号。
+        没有可用账号时返回None。
+        """
+        db = SessionLocal()
+        try:
+            accounts = db.query(Account).filter(Account.status == 1).all()
+            db.expunge_all()
+        finally:
+            db.close()
+        now = time.time()
+        with self._lock:
+            candidates = [a for a in accounts if not self._is_cooling(a.id, now)]
+            candidates.sort(key=lambda a: (a.id != preferred_id, self._state(a.id).last_used, self._state(a.id).requests))
+            for account in candidates:
+                if self._try_lease(account.id, owner):
+                    self._state(account.id).last_used = now
+                    if preferred_id is not None and account.id != preferred_id:
+                        print(f"账号 {preferred_id} 不可用，{owner} 轮换到账号 {account.id}")
+                    return account
+        return None
+
+    def release(self, account_id: Optional[int], owner: str):
+        """释放账号租约"""
+        if account_id is None:
+            return
+        with self._lock:
+            if self._leases.get(account_id) != owner:
+                return
+            self._leases.pop(account_id, None)
+        redis_client = get_redis()
+        if redis_client:
+            try:
+                redis_client.eval(self._RELEASE_SCRIPT, 1, self._lease_key(account_id), owner)
+            except Exception as e:
+                print(f"释放账号租约失败: {str(e)}")
+
+    def release_owner(self, owner: str):
+        """释放租用者持有的所有账号"""
+        with self._lock:
+            account_ids = [account_id for account_id, holder in self._leases.items() if holder == owner]
+        for account_id in account_ids:
+            self.release(account_id, owner)
+
+    def record(self, account_id: Optional[int], status_code: Optional[int] = None) -> bool:
+        """记录一次请求，返回该请求是否是被限制信号"""
+        if account_id is None:
+            return False
+        blocked = status_code in BLOCK_STATUS_CODES
+        with self._lock:
+            state = self._state(account_id)
+            state.requests += 1
+            state.last_used = time.time()
+            if status_code is not None and not blocked:
+                state.consecutive_blocks = 0
+        if blocked:
+            self.cooldown(account_id)
+        return blocked
+
+    def cooldown(self, account_id: int, seconds: Optional[int] = None):
+        """账号被限制后进入冷却期，连续被限制时冷却时间翻倍"""
+        now = time.time()
+        with self._lock:
+            state = self._state(account_id)
+            state.blocks += 1
+            state.consecutive_blocks += 1
+            duration = seconds or min(self.cooldown_seconds * 2 ** min(state.consecutive_blocks - 1, 6), 24 * 3600)
+            state.cooldown_until = now + duration
+        redis_client = get_redis()
+        if redis_client:
+            try:
+                redis_client.set(f"{self.REDIS_COOLDOWN_PREFIX}{account_id}", "1", ex=int(duration))
+            except Exception:
+                pass
+        print(f"账号 {account_id} 被限制，冷却 {int(duration)} 秒")
+
+    def _renew_loop(self):
+        interval = max(1, self.lease_ttl // 3)
+        while not self._stop_event.wait(interval):
+            with self._lock:
+                leases = list(self._leases.items())
+            if not leases:
+                continue
+            redis_client = get_redis()
+            if not redis_client:
+                continue
+            for account_id, owner in leases:
+                try:
+                    redis_client.eval(self._RENEW_SCRIPT, 1, self._lease_key(account_id), owner, self.lease_ttl)
+                except Exception as e:
+                    print(f"续期账号租约失败: {str(e)}")
+
+    def _ensure_renewer(self):
+        if self._renew_thread and self._renew_thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._renew_thread = threading.Thread(target=self._renew_loop, name="account-lease", daemon=True)
+        self._renew_thread.start()
+
+    def get_stats(self) -> List[Dict]:
+        """获取账号使用状态"""
+        now = time.time()
+        with self._lock:
+            return [
+                {
+                    "account_id": account_id,
+                    "leased_by": self._leases.get(account_id),
+                    "requests": state.requests,
+                    "blocks": state.blocks,
+                    "cooling_down": now < state.cooldown_until,
+                    "cooldown_for": max(0, int(state.cooldown_until - now)),
+                }
+                for account_id, state in sorted(self._states.items())
+            ]
+
+
+# 创建账号池实例（所有爬虫共享）
+account_pool = AccountPool()
@@ -0,0 +1,160 @@
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from app.utils.redis import get_redis, get_async_redis
+from app.utils.metrics import ADMISSION_REJECTED, QA_BACKPRESSURE
+from app.services.qa_crawler import qa_crawler_service
+from app.config import settings
+
+
+class AdmissionController:
+    """QA数据提交的准入控制
+
+    根据队列长度和消费延迟计算背压值（0~1）：队列低于低水位时为0，在低水位和高水位之间线性上升，
+    超过高水位（或消费循环停滞且队列超过低水位）时为1。背压在0~1之间时按概率拒绝部分请求，
+    为1时全部拒绝；另外可按客户端限制提交速率（令牌桶）。被拒绝的请求返回429和Retry-After。
+
+    背压值同时写入Redis，爬虫实例（包括其他进程中的crawler-worker）据此放慢抓取。
+    """
+
+    REDIS_BACKPRESSURE_KEY = settings.REDIS_QA_BACKPRESSURE_KEY
+
+    def __init__(self):
+        self.enabled = settings.ADMISSION_ENABLED
+        self.low_water = settings.ADMISSION_LOW_WATER
+        self.high_water = settings.ADMISSION_HIGH_WATER
+        self.max_lag = settings.ADMISSION_MAX_LAG
+        self.retry_after = settings.ADMISSION_RETRY_AFTER
+        self.client_rate = settings.ADMISSION_CLIENT_RATE
+        self.client_burst = settings.ADMISSION_CLIENT_BURST
+        self.refresh_interval = settings.ADMISSION_REFRESH_INTERVAL
+        self.signal_ttl = settings.ADMISSION_SIGNAL_TTL
+        self.pressure = 0.0
+        self.depth = 0
+        self._refreshed_at = 0.0
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, List[float]] = {}  # 客户端 -> [令牌数, 上次补充时间]
+        self._signal = (0.0, 0.0)  # 从Redis读取的背压值缓存: (背压, 读取时间)
+
+    def _consumer_lag(self) -> Optional[float]:
+        from app.workers.qa_crawler_consumer import qa_crawler_consumer
+        if qa_crawler_consumer.last_cycle is None:
+            return None
+        return time.time() - qa_crawler_consumer.last_cycle
+
+    def _evaluate(self, depth: int) -> float:
+        """根据队列长度和消费延迟计算背压"""
+        if depth >= self.high_water:
+            pressure = 1.0
+        elif depth <= self.low_water:
+            pressure = 0.0
+        else:
+            pressure = (depth - self.low_water) / max(self.high_water - self.low_water, 1)
+        lag = self._consumer_lag()
+        if lag is not None and lag > self.max_lag and depth >= self.low_water:
+            pressure = 1.0  # 消费停滞时队列不会下降，到低水位即停止接收
+        self.depth = depth
+        self.pressure = round(pressure, 3)
+        self._refreshed_at = time.time()
+        QA_BACKPRESSURE.set(self.pressure)
+        return self.pressure
+
+    async def refresh(self) -> float:
+        """在async接口中刷新背压（最多每 ADMISSION_REFRESH_INTERVAL 秒读取一次队列长度）"""
+        if time.time() - self._refreshed_at < self.refresh_interval:
+            return self.pressure
+        self._refreshed_at = time.time()
+        redis_client = await get_async_redis()
+        if not redis_client:
+            return self.pressure
+        try:
+            # 队列长度按所有优先级通道合计
+            depth = sum((await qa_crawler_service.get_lane_sizes_async()).values())
+            pressure = self._evaluate(depth)
+            await redis_client.set(self.REDIS_BACKPRESSURE_KEY, pressure, ex=self.signal_ttl)
+        except Exception as e:
+            print(f"刷新队列背压失败: {str(e)}")
+        return self.pressure
+
+    def refresh_sync(self) -> float:
+        """在同步代码（队列消费者）中刷新背压并发布信号"""
+        redis_client = get_redis()
+        if not redis_client:
+            return self.pressure
+        try:
+            pressure = self._evaluate(qa_crawler_service.get_queue_size())
+            redis_client.set(self.REDIS_BACKPRESSURE_KEY, pressure, ex=self.signal_ttl)
+        except Exception as e:
+            print(f"刷新队列背压失败: {str(e)}")
+        return self.pressure
+
+    def backpressure(self) -> float:
+        """当前背压（供爬虫放慢抓取），优先使用本进程计算的值，否则读取Redis中的信号"""
+        now = time.time()
+        if now - self._refreshed_at < self.signal_ttl:
+            return self.pressure
+        value, read_at = self._signal
+        if now - read_at < self.refresh_interval * 5:
+            return value
+        value = 0.0
+        redis_client = get_redis()
+        if redis_client:
+            try:
+                value = float(redis_client.get(self.REDIS_BACKPRESSURE_KEY) or 0)
+            except Exception:
+                pass
+        self._signal = (value, now)
+        return value
+
+    def _take_client_tokens(self, client_id: str, cost: int) -> Optional[float]:
+        """客户端令牌桶，允许透支（大批量提交），令牌为负时拒绝；返回需等待的秒数"""
+        now = time.time()
+        with self._lock:
+            bucket = self._buckets.get(client_id)
+            if bucket is None:
+                if len(self._buckets) >= 10000:
+                    # 清理已回满的桶，避免客户端数量无限增长
+                    full = [k for k, (tokens, last) in self._buckets.items()
+                            if tokens + (now - last) * self.client_rate >= self.client_burst]
+                    for key in full:
+                        del self._buckets[key]
+                bucket = self._buckets[client_id] = [float(self.client_burst), now]
+            bucket[0] = min(self.client_burst, bucket[0] + (now - bucket[1]) * self.client_rate)
+            bucket[1] = now
+            if bucket[0] <= 0:
+                return (1 - bucket[0]) / self.client_rate
+            bucket[0] -= cost
+        return None
+
+    async def admit(self, client_id: str, cost: int = 1) -> Optional[float]:
+        """判断是否接收本次提交，接收时返回None，否则返回建议的重试等待秒数"""
+        if not self.enabled:
+            return None
+        pressure = await self.refresh()
+        if pressure >= 1:
+            ADMISSION_REJECTED.labels("overload").inc()
+            return self.retry_after
+        if pressure > 0 and random.random() < pressure:
+            ADMISSION_REJECTED.labels("shed").inc()
+            return max(1.0, self.retry_after * pressure)
+        if self.client_rate > 0:
+            wait = self._take_client_tokens(client_id, cost)
+            if wait is not None:
+                ADMISSION_REJECTED.labels("client_rate").inc()
+                return wait
+        return None
+
+    def get_status(self) -> Dict[str, Any]:
+        """准入控制状态"""
+        return {
+            "enabled": self.enabled,
+            "queue_depth": self.depth,
+            "pressure": self.pressure,
+            "low_water": self.low_water,
+            "high_water": self.high_water,
+        }
+
+
+# 创建准入控制实例
+admission_controller = AdmissionController()
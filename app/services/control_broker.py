@@ -0,0 +1,156 @@
+import asyncio
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.utils.redis import get_redis
+from app.config import settings
+
+
+# 控制面主题
+TOPIC_TASK_CONTROL = "task.control"  # 任务控制指令：stop / pause / resume / config
+TOPIC_TASK_EVENTS = "task.events"    # 任务状态变化事件
+TOPIC_JOB_EVENTS = "job.events"      # 后台作业（导出、抽样）状态变化事件
+
+# 任务状态码对应的状态名
+TASK_STATES = {0: "pending", 1: "running", 2: "paused", 3: "failed", 4: "completed"}
+
+
+class ControlBroker:
+    """控制面消息代理
+
+    进程内按主题分发消息；Redis可用时同时发布到Redis频道，由监听线程把其他进程
+    （API进程、crawler-worker）发布的消息转给本进程的订阅者，实现跨进程的毫秒级控制，
+    不再依赖轮询数据库。订阅回调在发布线程或监听线程中执行，需要切回事件循环的
+    订阅者应使用 call_soon_threadsafe（subscribe_queue 已封装）。
+    """
+
+    REDIS_CHANNEL_PREFIX = settings.REDIS_CONTROL_CHANNEL_PREFIX
+
+    def __init__(self):
+        self.node_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._lock = threading.Lock()
+        self._subscribers: Dict[str, List[Callable[[Dict[str, Any]], None]]] = {}
+        self._listener = None
+        self._stop_event = threading.Event()
+
+    def subscribe(self, topic: str, callback: Callable[[Dict[str, Any]], None]) -> Callable[[], None]:
+        """订阅主题，返回取消订阅函数"""
+        with self._lock:
+            self._subscribers.setdefault(topic, []).append(callback)
+        self._ensure_listener()
+
+        def unsubscribe():
+            with self._lock:
+                callbacks = self._subscribers.get(topic, [])
+                if callback in callbacks:
+                    callbacks.remove(callback)
+        return unsubscribe
+
+    def subscribe_queue(self, *topics: str, maxsize: int = 1000) -> Tuple[asyncio.Queue, Callable[[], None]]:
+        """在当前事件循环中订阅一个或多个主题，消息放入返回的队列（队列满时丢弃）"""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+
+        def put(message):
+            if not queue.full():
+                queue.put_nowait(message)
+
+        def callback(message):
+            try:
+                loop.call_soon_threadsafe(put, message)
+            except RuntimeError:
+                pass  # 事件循环已关闭
+        unsubscribers = [self.subscribe(topic, callback) for topic in topics]
+
+        def unsubscribe():
+            for unsubscribe_topic in unsubscribers:
+                unsubscribe_topic()
+        return queue, unsubscribe
+
+    def publish(self, topic: str, message: Dict[str, Any]) -> Dict[str, Any]:
+        """发布消息：先投递给本进程订阅者，再广播到Redis"""
+        message = dict(message, topic=topic, ts=time.time(), origin=self.node_id)
+        self._deliver(topic, message)
+        redis_client = get_redis()
+        if redis_client:
+            try:
+                redis_client.publish(self.REDIS_CHANNEL_PREFIX + topic, json.dumps(message, ensure_ascii=False, default=str))
+            except Exception as e:
+                print(f"发布控制消息到Redis失败: {str(e)}")
+        return message
+
+    def _deliver(self, topic: str, message: Dict[str, Any]):
+        with self._lock:
+            callbacks = list(self._subscribers.get(topic, []))
+        for callback in callbacks:
+            try:
+                callback(message)
+            except Exception as e:
+                print(f"处理控制消息失败: {str(e)}")
+
+    def _listen(self):
+        """监听Redis频道，把其他进程发布的消息转给本进程订阅者"""
+        while not self._stop_event.is_set():
+            redis_client = get_redis()
+            if not redis_client:
+                self._stop_event.wait(5)
+                continue
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.psubscribe(self.REDIS_CHANNEL_PREFIX + "*")
+                while not self._stop_event.is_set():
+                    item = pubsub.get_message(timeout=1.0)
+                    if not item:
+                        continue
+                    try:
+                        message = json.loads(item["data"])
+                    except (TypeError, ValueError):
+                        continue
+                    if message.get("origin") == self.node_id:
+                        continue
+                    self._deliver(message.get("topic", item["channel"][len(self.REDIS_CHANNEL_PREFIX):]), message)
+            except Exception as e:
+                print(f"控制面监听异常: {str(e)}")
+                self._stop_event.wait(1)
+            finally:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+
+    def _ensure_listener(self):
+        if self._listener and self._listener.is_alive():
+            return
+        self._stop_event.clear()
+        self._listener = threading.Thread(target=self._listen, name="control-broker", daemon=True)
+        self._listener.start()
+
+    def close(self):
+        """停止监听线程"""
+        self._stop_event.set()
+        if self._listener and self._listener.is_alive():
+            self._listener.join(timeout=2)
+
+    def send_control(self, kind: str, task_id: int, command: str, config: Optional[Dict[str, Any]] = None):
+        """向运行中的任务实例（无论在哪个进程）发送控制指令"""
+        return self.publish(TOPIC_TASK_CONTROL, {
+            "kind": kind, "task_id": task_id, "command": command, "config": config or {}
+        })
+
+    def publish_task_event(self, task_id: int, kind: str, status: int, **extra):
+        """发布任务状态变化事件"""
+        return self.publish(TOPIC_TASK_EVENTS, dict(
+            extra, task_id=task_id, kind=kind, status=status, state=TASK_STATES.get(status, str(status))
+        ))
+
+    def publish_job_event(self, job_id: str, kind: str, state: str, **extra):
+        """发布后台作业状态变化事件（kind: export / sampling，state: running / completed / failed）"""
+        return self.publish(TOPIC_JOB_EVENTS, dict(extra, job_id=job_id, kind=kind, state=state))
+
+
+# 创建控制面实例
+control_broker = ControlBroker()
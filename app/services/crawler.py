@@ -1,6 +1,5 @@
 
 import time
-import random
 import requests
 from datetime import datetime
 from typing import Dict, List, Optional
@@ -8,21 +7,23 @@ from app.database import SessionLocal
 from app.models.task import Task
 from app.models.raw_data import RawData
 from app.models.proxy import Proxy
+from app.services.proxy_pool import proxy_pool
+from app.services.account_pool import account_pool
+from app.services.control_broker import control_broker
+from app.services.task_metrics import task_metrics
 from app.models.account import Account
 from app.utils.redis import get_redis
 from app.config import settings
 import json
 import re
-from bs4 import BeautifulSoup
+from app.services.page_parser import parse_page
 from app.services.crawler_task import ControlledSpider
-
-# 全局爬虫实例管理器
-crawler_instances = {}
+from app.services.crawler_runtime import crawler_runtime
 
 def run_crawler_task(task_id: int, url: str = None, api_request: str = None, task_type: str = "crawler",
                      interval: int = 5, 
                      restart_interval: int = 3600, time_range: tuple = (0, 24),
-                     max_exception: int = 3):
+                     max_exception: int = 3, fetch_mode: str = None):
     """运行小鲸鱼任务，使用 ControlledSpider"""
     db = SessionLocal()
 
@@ -42,6 +43,17 @@ def run_crawler_task(task_id: int, url: str = None, api_request: str = None, tas
             task.end_time = datetime.now()
             db.commit()
             return
+
+        # 从账号池租用账号，任务账号被占用或在冷却中时轮换到其他账号
+        lease_owner = f"crawler:{task_id}"
+        account = account_pool.acquire(lease_owner, preferred_id=task.account_id)
+        if not account:
+            print(f"任务 {task_id} 没有可用账号")
+            task.status = 3  # 失败
+            task.error_message = "没有可用账号（账号均被占用或在冷却中）"
+            task.end_time = datetime.now()
+            db.commit()
+            return
         
         # 获取爬虫参数
         crawler_param = None
@@ -57,15 +69,13 @@ def run_crawler_task(task_id: int, url: str = None, api_request: str = None, tas
         crawl_restart_interval = restart_interval or (crawler_param.restart_browser_time * 3600 if crawler_param else 24 * 3600)  # 转换为秒
         crawl_time_range = time_range or ((crawler_param.start_time, crawler_param.end_time) if crawler_param else (0, 24))
         crawl_max_exception = max_exception or (crawler_param.error_count if crawler_param else 3)
+        crawl_fetch_mode = fetch_mode or (crawler_param.fetch_mode if crawler_param else "browser")
 
         # 获取账号cookie
         account_cookie = account.account_name if account else None
 
         # 获取代理信息
-        proxy = None
-        proxy_obj = db.query(Proxy).filter(Proxy.status == 1).first()
-        if proxy_obj:
-            proxy = f"{proxy_obj.proxy_type}://{proxy_obj.proxy_addr}"
+        proxy = proxy_pool.select()
 
         # 创建 ControlledSpider 实例
         spider = ControlledSpider(
@@ -79,6 +89,9 @@ def run_crawler_task(task_id: int, url: str = None, api_request: str = None, tas
             proxy=proxy,
             cookie=account_cookie,
             account_id=account.id,
+            fetch_mode=crawl_fetch_mode,
+            lease_owner=lease_owner,
+            task_id=task_id,
         )
         
         # 打印中文参数信息
@@ -90,62 +103,20 @@ def run_crawler_task(task_id: int, url: str = None, api_request: str = None, tas
         print(f"  重启浏览器时间: {crawl_restart_interval // 3600} 小时")
         print(f"  时间范围: {crawl_time_range[0]}:00 - {crawl_time_range[1]}:00")
         print(f"  最大异常次数: {crawl_max_exception}")
+        print(f"  抓取模式: {crawl_fetch_mode}")
         print(f"  cookie路径: {spider.storage_state_path}")
         print(f"  代理: {spider.proxy}")
         print(f"  cookie: {account_cookie}")
-        # 保存到全局管理器
-        crawler_instances[task_id] = spider
-
-        # 启动爬虫（在后台线程中运行异步任务）
-        import asyncio
-        import threading
-        
-        # 存储事件循环以便后续清理
-        spider_loop = None
-        
-        def run_spider():
-            nonlocal spider_loop
-            spider_loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(spider_loop)
-            try:
-                spider_loop.run_until_complete(spider.start(crawl_url))
-            except asyncio.CancelledError:
-                print(f"任务 {task_id} 的爬虫被取消")
-            finally:
-                # 等待所有待处理的任务完成
-                pending = asyncio.all_tasks(spider_loop)
-                if pending:
-                    spider_loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
-                spider_loop.close()
-        
-        thread = threading.Thread(target=run_spider, daemon=True)
-        thread.start()
-        print(f"任务 {task_id} 的爬虫已启动")
-
-        # 更新任务状态为运行中
+        # 更新任务状态为运行中（先于提交，避免实例过早结束时状态被覆盖）
         task.status = 1
         task.start_time = datetime.now()
         db.commit()
+        control_broker.publish_task_event(task_id, "crawler", task.status)
+        task_metrics.start_task(task_id, "crawler")
 
-        # 监控任务状态
-        while spider.is_running():
-            db.refresh(task)
-            if task.status != 1:  # 任务被停止
-                # 使用同步停止方法
-                spider.stop_sync()
-                print(f"任务 {task_id} 已停止")
-                # 等待线程完成，确保事件循环正确关闭
-                if thread.is_alive():
-                    thread.join(timeout=5)
-                break
-            time.sleep(1)
-
-        # 任务结束
-        if task.status == 1:  # 如果是爬虫自己停止的
-            task.status = 4  # 完成
-            task.end_time = datetime.now()
-            task.progress = 100
-            db.commit()
+        # 提交到爬虫运行时（共享事件循环，不再为每个任务创建线程）
+        crawler_runtime.submit("crawler", task_id, spider, crawl_url, on_done=lambda error: _on_crawler_done(task_id, error))
+        print(f"任务 {task_id} 的爬虫已启动")
 
     except Exception as e:
         print(f"小鲸鱼任务异常: {str(e)}")
@@ -154,126 +125,42 @@ def run_crawler_task(task_id: int, url: str = None, api_request: str = None, tas
         task.end_time = datetime.now()
         task.retry_count += 1
         db.commit()
+        control_broker.publish_task_event(task_id, "crawler", task.status, error_message=task.error_message)
+        account_pool.release_owner(f"crawler:{task_id}")
 
     finally:
-        # 确保爬虫已停止
-        if spider.is_running():
-            try:
-                # 使用同步停止方法
-                spider.stop_sync()
-            except Exception as e:
-                print(f"停止爬虫时出错: {str(e)}")
-        
-        # 等待线程完成
-        if thread.is_alive():
-            thread.join(timeout=5)
-        
-        # 从全局管理器中移除
-        if task_id in crawler_instances:
-            del crawler_instances[task_id]
         db.close()
 
-
-
-def select_proxy(proxies: List[Proxy]) -> Optional[Proxy]:
-    """选择代理"""
-    if not proxies:
-        return None
-
-    # 过滤可用代理
-    available_proxies = [p for p in proxies if p.status == 1]
-    if not available_proxies:
-        return None
-
-    # 根据策略选择代理
-    strategy = available_proxies[0].strategy  # 使用第一个代理的策略
-
-    if strategy == "轮询":
-        # 简单轮询，每次选择第一个
-        return available_proxies[0]
-    elif strategy == "随机":
-        return random.choice(available_proxies)
-    elif strategy == "失败切换":
-        # 选择最近未失败的代理
-        return available_proxies[0]
-
-    return available_proxies[0]
-
-def parse_page(html: str, url: str) -> Optional[Dict]:
-    """解析页面内容"""
+def _on_crawler_done(task_id: int, error: Optional[BaseException] = None):
+    """爬虫实例结束后的回调，更新任务状态并释放账号"""
+    db = SessionLocal()
+    account_pool.release_owner(f"crawler:{task_id}")
+    task_metrics.finish_task(task_id)
     try:
-        soup = BeautifulSoup(html, "html.parser")
-
-        # 提取标题
-        title_elem = soup.find("h1", class_="QuestionHeader-title")
-        title = title_elem.text.strip() if title_elem else ""
-
-        # 提取内容
-        content_elem = soup.find("div", class_="RichContent-inner")
-        content = content_elem.text.strip() if content_elem else ""
-
-        # 提取发布时间
-        time_elem = soup.find("span", class_="ContentItem-time")
-        publish_time = ""
-        if time_elem:
-            time_text = time_elem.text.strip()
-            # 尝试提取日期
-            match = re.search(r"(\d{4}-\d{2}-\d{2})", time_text)
-            if match:
-                publish_time = match.group(1)
-
-        # 提取作者信息
-        author_elem = soup.find("div", class_="AuthorInfo")
-        author = ""
-        author_url = ""
-        author_field = ""
-        author_cert = ""
-        author_fans = 0
-
-        if author_elem:
-            # 作者名
-            name_elem = author_elem.find("a", class_="UserLink-link")
-            if name_elem:
-                author = name_elem.text.strip()
-                author_url = "https://www.zhihu.com" + name_elem.get("href", "")
-
-            # 作者领域
-            field_elem = author_elem.find("div", class_="AuthorInfo-badgeText")
-            if field_elem:
-                author_field = field_elem.text.strip()
-
-            # 作者认证
-            cert_elem = author_elem.find("div", class_="AuthorInfo-headline")
-            if cert_elem:
-                author_cert = cert_elem.text.strip()
+        task = db.query(Task).filter(Task.id == task_id).first()
+        if not task:
+            return
+        if error is not None:
+            task.status = 3  # 失败
+            task.error_message = str(error)
+            task.end_time = datetime.now()
+            task.retry_count += 1
+        elif task.status == 1:  # 如果是爬虫自己停止的
+            task.status = 4  # 完成
+            task.end_time = datetime.now()
+            task.progress = 100
+        db.commit()
+        control_broker.publish_task_event(task_id, "crawler", task.status, error_message=task.error_message)
+    finally:
+        db.close()
 
-            # 作者粉丝数
-            fans_elem = author_elem.find("div", class_="NumberBoard-itemValue")
-            if fans_elem:
-                try:
-                    fans_text = fans_elem.text.strip()
-                    # 处理粉丝数中的"万"等单位
-                    if "万" in fans_text:
-                        author_fans = int(float(fans_text.replace("万", "")) * 10000)
-                    else:
-                        author_fans = int(fans_text)
-                except:
-                    author_fans = 0
 
-        return {
-            "title": title,
-            "content": content,
-            "publish_time": publish_time,
-            "author": author,
-            "author_url": author_url,
-            "author_field": author_field,
-            "author_cert": author_cert,
-            "author_fans": author_fans,
-        }
 
-    except Exception as e:
-        print(f"解析页面异常: {str(e)}, URL: {url}")
+def select_proxy(proxies: List[Proxy]) -> Optional[Proxy]:
+    """选择代理（按代理策略和健康分）"""
+    if not proxies:
         return None
+    return proxy_pool.select_from(proxies)
 
 def extract_year(publish_time: str) -> int:
     """从发布时间中提取年份"""
@@ -295,15 +182,11 @@ def extract_year(publish_time: str) -> int:
 
 def stop_crawler_task(task_id: int):
     """停止指定任务的爬虫"""
-    if task_id in crawler_instances:
-        spider = crawler_instances[task_id]
-        spider.stop_sync()
+    if crawler_runtime.send("crawler", task_id, "stop"):
         print(f"任务 {task_id} 的爬虫已停止")
         return True
     return False
 
 def is_crawler_running(task_id: int) -> bool:
     """检查指定任务的爬虫是否在运行"""
-    if task_id in crawler_instances:
-        return crawler_instances[task_id].is_running()
-    return False
+    return crawler_runtime.is_running("crawler", task_id)
@@ -0,0 +1,179 @@
+import asyncio
+import os
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+from app.config import settings
+from app.services.control_broker import control_broker, TOPIC_TASK_CONTROL
+from app.utils.metrics import ACTIVE_INSTANCES
+
+
+class CrawlerRuntime:
+    """爬虫运行时
+
+    在少量常驻事件循环线程中托管所有 ControlledSpider / ControlledExporter 实例，
+    每个实例只是事件循环里的一个协程任务，不再为每个任务单独创建线程和事件循环。
+    控制指令通过 call_soon_threadsafe 投递到实例所在的事件循环，无需轮询数据库；
+    运行时订阅控制面的 task.control 主题，其他进程发出的指令同样能送达。
+    """
+
+    def __init__(self, loop_count: Optional[int] = None):
+        self.loop_count = loop_count if loop_count is not None else settings.CRAWLER_RUNTIME_LOOPS
+        self._loops = []  # [(loop, thread)]
+        self._lock = threading.Lock()
+        self._instances: Dict[Tuple[str, int], Dict[str, Any]] = {}
+        self._unsubscribe = None
+
+    def _ensure_started(self):
+        """按需启动事件循环线程"""
+        if self._loops:
+            return
+        count = self.loop_count or os.cpu_count() or 1
+        for index in range(count):
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=self._run_loop,
+                args=(loop,),
+                name=f"crawler-runtime-{index}",
+                daemon=True
+            )
+            thread.start()
+            self._loops.append((loop, thread))
+        self._unsubscribe = control_broker.subscribe(TOPIC_TASK_CONTROL, self._on_control)
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 爬虫运行时已启动，事件循环数: {count}")
+
+    @staticmethod
+    def _run_loop(loop: asyncio.AbstractEventLoop):
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_forever()
+        finally:
+            pending = asyncio.all_tasks(loop)
+            if pending:
+                loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            loop.close()
+
+    def _pick_loop(self) -> asyncio.AbstractEventLoop:
+        """选择托管实例最少的事件循环"""
+        load = {id(loop): 0 for loop, _ in self._loops}
+        for entry in self._instances.values():
+            load[id(entry["loop"])] = load.get(id(entry["loop"]), 0) + 1
+        loop, _ = min(self._loops, key=lambda item: load[id(item[0])])
+        return loop
+
+    def submit(self, kind: str, task_id: int, instance, url: str,
+               on_done: Optional[Callable[[Optional[BaseException]], None]] = None) -> bool:
+        """提交实例到运行时
+
+        Args:
+            kind: 实例类型，crawler 或 export
+            task_id: 任务ID
+            instance: ControlledSpider 或 ControlledExporter 实例
+            url: 启动URL
+            on_done: 实例结束后的回调，参数为异常（正常结束为None），在线程池中执行
+        """
+        key = (kind, task_id)
+        with self._lock:
+            if key in self._instances:
+                print(f"任务 {task_id} 已在运行时中，忽略重复提交")
+                return False
+            self._ensure_started()
+            loop = self._pick_loop()
+            self._instances[key] = {"instance": instance, "loop": loop}
+        asyncio.run_coroutine_threadsafe(self._host(key, instance, url, on_done), loop)
+        return True
+
+    async def _host(self, key, instance, url: str, on_done):
+        """在事件循环中托管实例的完整生命周期"""
+        error = None
+        try:
+            await instance.start(url)
+            if instance.task is not None:
+                await instance.task
+        except asyncio.CancelledError:
+            print(f"任务 {key[1]} 的{key[0]}实例被取消")
+        except Exception as e:
+            error = e
+            print(f"任务 {key[1]} 的{key[0]}实例异常: {str(e)}")
+        finally:
+            with self._lock:
+                self._instances.pop(key, None)
+            if on_done:
+                loop = asyncio.get_running_loop()
+                try:
+                    await loop.run_in_executor(None, on_done, error)
+                except Exception as e:
+                    print(f"任务 {key[1]} 结束回调失败: {str(e)}")
+
+    def _on_control(self, message: Dict[str, Any]):
+        """控制面消息回调：只处理本运行时托管的实例"""
+        try:
+            self.send(message["kind"], int(message["task_id"]), message["command"], message.get("config"))
+        except (KeyError, TypeError, ValueError):
+            print(f"无效的控制消息: {message}")
+
+    def send(self, kind: str, task_id: int, command: str, payload: Optional[Dict[str, Any]] = None) -> bool:
+        """向实例发送控制指令（线程安全）"""
+        with self._lock:
+            entry = self._instances.get((kind, task_id))
+        if not entry:
+            return False
+        entry["loop"].call_soon_threadsafe(self._dispatch, entry["instance"], command, payload)
+        return True
+
+    @staticmethod
+    def _dispatch(instance, command: str, payload: Optional[Dict[str, Any]] = None):
+        """在实例所在的事件循环中执行控制指令"""
+        if command == "stop":
+            instance.stop_event.set()
+            asyncio.ensure_future(instance.stop())
+        elif command in ("pause", "resume") and hasattr(instance, command):
+            getattr(instance, command)()
+        elif command == "config" and hasattr(instance, "apply_config"):
+            instance.apply_config(payload or {})
+        else:
+            print(f"实例不支持的控制指令: {command}")
+
+    def get_instance(self, kind: str, task_id: int):
+        """获取托管中的实例"""
+        with self._lock:
+            entry = self._instances.get((kind, task_id))
+        return entry["instance"] if entry else None
+
+    def is_running(self, kind: str, task_id: int) -> bool:
+        """检查实例是否仍在运行"""
+        return self.get_instance(kind, task_id) is not None
+
+    def count(self, kind: Optional[str] = None) -> int:
+        """统计托管中的实例数量"""
+        with self._lock:
+            return sum(1 for k in self._instances if kind is None or k[0] == kind)
+
+    def get_status(self) -> Dict[str, Any]:
+        """运行时状态：事件循环线程存活情况和托管实例数"""
+        with self._lock:
+            loops = list(self._loops)
+            instances = len(self._instances)
+        alive = sum(1 for loop, thread in loops if thread.is_alive() and loop.is_running())
+        return {"loops": len(loops), "alive_loops": alive, "instances": instances}
+
+    def shutdown(self, timeout: float = 5):
+        """停止所有实例并关闭事件循环"""
+        with self._lock:
+            keys = list(self._instances.keys())
+        for kind, task_id in keys:
+            self.send(kind, task_id, "stop")
+        for loop, thread in self._loops:
+            loop.call_soon_threadsafe(loop.stop)
+        for loop, thread in self._loops:
+            thread.join(timeout=timeout)
+        self._loops = []
+        if self._unsubscribe:
+            self._unsubscribe()
+            self._unsubscribe = None
+
+
+# 创建运行时实例
+crawler_runtime = CrawlerRuntime()
+ACTIVE_INSTANCES.labels("crawler").set_function(lambda: crawler_runtime.count("crawler"))
+ACTIVE_INSTANCES.labels("export").set_function(lambda: crawler_runtime.count("export"))
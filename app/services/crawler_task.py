@@ -1,9 +1,23 @@
 import asyncio
 import os
-import shutil
+import time
 from datetime import datetime
 from playwright.async_api import async_playwright
 from app.config import settings
+from app.services.http_fetcher import http_fetcher, FETCH_MODE_BROWSER, FETCH_MODE_HTTP, FETCH_MODE_AUTO
+from app.services.rate_limiter import host_rate_limiter, window_scheduler
+from app.services.proxy_pool import proxy_pool
+from app.services.account_pool import account_pool
+from app.services.task_metrics import task_metrics
+from app.services.admission import admission_controller
+
+class HttpStatusError(RuntimeError):
+    """HTTP抓取返回错误状态码"""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP状态码 {status_code}")
+        self.status_code = status_code
+
 
 class ControlledSpider:
     def __init__(
@@ -20,6 +34,9 @@ class ControlledSpider:
         task_type: str = "crawler",
         cookie: str = None,
         account_id: int = None,
+        fetch_mode: str = FETCH_MODE_BROWSER,
+        lease_owner: str = None,  # 账号租用者，设置后账号被限制时自动轮换账号
+        task_id: int = None,  # 任务ID，用于记录运行指标
     ):
         self.interval = interval
         self.restart_interval = restart_interval
@@ -33,44 +50,41 @@ class ControlledSpider:
         self.task_type = task_type
         self.cookie = cookie
         self.account_id = account_id
+        self.lease_owner = lease_owner
+        self.task_id = task_id
+        self.fetch_mode = fetch_mode or FETCH_MODE_BROWSER
+        if self.fetch_mode != FETCH_MODE_BROWSER and not http_fetcher.is_available():
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 未安装httpx，抓取模式回退为浏览器")
+            self.fetch_mode = FETCH_MODE_BROWSER
+        self.last_result = None  # 最近一次解析结果
         self.stop_event = asyncio.Event()
+        self.pause_event = asyncio.Event()  # 设置表示运行，清除表示暂停
+        self.pause_event.set()
         self.browser = None
         self.context = None
         self.page = None
         self.playwright = None
+        self.browser_proxy = None  # 当前浏览器实例使用的代理
         self.start_time = None
         self.exception_count = 0  # 异常计数器
         self.task = None  # 存储异步任务
+        self._loop = None  # 爬虫所在的事件循环
 
         # 管理存储目录
         self._manage_storage_directory()
 
     def _manage_storage_directory(self):
-        """管理存储目录，创建父目录和子目录"""
-        if self.storage_state_path:
-            # 父目录
-            parent_dir = "cookiedata"
-            # 子目录
-            child_dir = os.path.join(parent_dir, self.storage_state_path)
-
-            # 创建父目录（如果不存在）
-            if not os.path.exists(parent_dir):
-                os.makedirs(parent_dir)
-                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 创建父目录: {parent_dir}")
-
-            # 清空子目录（如果存在）
-            if os.path.exists(child_dir):
-                shutil.rmtree(child_dir)
-                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 清空子目录: {child_dir}")
-
-            # 创建子目录
-            os.makedirs(child_dir)
-            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 创建子目录: {child_dir}")
-
-            # 更新 storage_state_path 为完整路径
+        """管理存储目录：账号的浏览器状态跨运行保留，不再清空"""
+        if self.account_id is not None:
+            self.storage_state_path = account_pool.storage_dir(self.account_id)
+        elif self.storage_state_path:
+            child_dir = os.path.join("cookiedata", self.storage_state_path)
+            os.makedirs(child_dir, exist_ok=True)
             self.storage_state_path = child_dir
 
     async def _init_browser(self):        
+        # 重启时先关闭（并保存）旧的浏览器实例
+        await self._close_browser()
         try:
             print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 开始初始化浏览器...")
             # 启动新的浏览器实例
@@ -83,40 +97,22 @@ class ControlledSpider:
                 'slow_mo': 50
             }
             
-            if self.proxy:
-                browser_args['proxy'] = {'server': self.proxy}
-                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 使用代理: {self.proxy}")
+            # 每次创建浏览器时从代理池按策略和健康分选择代理，代理池为空时使用任务配置的代理
+            self.browser_proxy = proxy_pool.select() or self.proxy
+            if self.browser_proxy:
+                browser_args['proxy'] = {'server': self.browser_proxy}
+                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 使用代理: {self.browser_proxy}")
             
-            # 如果设置了浏览器路径，使用该路径
-            if self.storage_state_path:
-                browser_args['executable_path'] = self.storage_state_path
-
             self.browser = await self.playwright.chromium.launch(**browser_args)
             print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 浏览器已启动")
             
-            # 创建浏览器上下文
+            # 创建浏览器上下文：优先复用该账号上次保存的状态，否则用账号cookie初始化
             context_args = {}
-            if self.cookie:
-                # 使用cookie和account_id
-                try:
-                    # 解析cookie字符串为字典
-                    import json
-                    cookie_dict = json.loads(self.cookie)
-                    # 确保expires字段是浮点数类型
-                    if 'expires' in cookie_dict and isinstance(cookie_dict['expires'], str):
-                        try:
-                            cookie_dict['expires'] = float(cookie_dict['expires'])
-                        except (ValueError, TypeError):
-                            # 如果转换失败，删除expires字段或设置为默认值
-                            cookie_dict.pop('expires', None)
-                    storage_state = {
-                        "cookies": [cookie_dict]
-                    }
-                    context_args['storage_state'] = storage_state
-                    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 使用Cookie (账号ID: {self.account_id}): {self.cookie[:50]}...")
-                except json.JSONDecodeError:                  
-                    
-                    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 使用Cookie (账号ID: {self.account_id}): {self.cookie[:20]}...")
+            storage_state = account_pool.storage_state(self.account_id, self.cookie)
+            if storage_state:
+                context_args['storage_state'] = storage_state
+                source = storage_state if isinstance(storage_state, str) else "账号Cookie"
+                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 使用浏览器状态 (账号ID: {self.account_id}): {source}")
             
             self.context = await self.browser.new_context(**context_args)
             print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 浏览器上下文已创建")
@@ -136,7 +132,18 @@ class ControlledSpider:
             print(f"浏览器初始化失败: {e}")
             await self.stop()  # 初始化失败直接停止
 
+    async def _save_storage_state(self):
+        """保存浏览器状态，下次运行时复用会话"""
+        if self.context and self.account_id is not None:
+            state_file = account_pool.state_file(self.account_id)
+            try:
+                await self.context.storage_state(path=state_file)
+                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 浏览器状态已保存到: {state_file}")
+            except Exception as e:
+                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 保存浏览器状态失败: {e}")
+
     async def _close_browser(self):
+        await self._save_storage_state()
         if self.page:
             await self.page.close()
             self.page = None
@@ -151,16 +158,76 @@ class ControlledSpider:
             self.playwright = None
 
     def _is_in_time_range(self):
-        current_hour = datetime.now().hour
-        return self.time_range[0] <= current_hour < self.time_range[1]
+        return window_scheduler.in_window(self.time_range)
+
+    async def _sleep(self, seconds: float):
+        """可被停止事件打断的等待"""
+        if seconds <= 0:
+            return
+        try:
+            await asyncio.wait_for(self.stop_event.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _wait_next_run(self):
+        """按间隔等待下一次运行，下一次会落到时间窗口外时直接等到下一个窗口开始
+
+        数据队列有背压时按背压放大抓取间隔，避免产出无法及时入库的数据。
+        """
+        pressure = admission_controller.backpressure()
+        if pressure > 0:
+            await self._sleep(self.interval * pressure * (settings.BACKPRESSURE_MAX_SLOWDOWN - 1))
+        await self._sleep(window_scheduler.next_delay(self.interval, self.time_range))
+
+    @staticmethod
+    def _error_type(error: Exception) -> str:
+        """错误分类，用于按类型统计错误数"""
+        if isinstance(error, HttpStatusError):
+            return f"http_{error.status_code}"
+        return type(error).__name__
+
+    @staticmethod
+    def _retry_after(headers) -> float:
+        """解析Retry-After响应头（秒数形式）"""
+        value = (headers or {}).get("retry-after") or (headers or {}).get("Retry-After")
+        try:
+            return float(value) if value else None
+        except (TypeError, ValueError):
+            return None
 
     async def crawl(self, url: str):
         if self.stop_event.is_set():
             return
         if not self._is_in_time_range():
-            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 当前时间不在运行时间范围内，跳过本次爬取")
-            await asyncio.sleep(self.interval)
+            wait = window_scheduler.seconds_until_window(self.time_range)
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 当前时间不在运行时间范围内，{int(wait)}秒后进入运行窗口")
+            await self._sleep(wait)
+            return
+        # 按主机限速，等待令牌
+        if not await host_rate_limiter.acquire(url, self.stop_event):
             return
+        # HTTP抓取模式：不需要JS渲染的页面直接用HTTP客户端抓取
+        if self.fetch_mode in (FETCH_MODE_HTTP, FETCH_MODE_AUTO):
+            try:
+                if await self._crawl_http(url):
+                    await self._wait_next_run()
+                    return
+                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] HTTP抓取未解析到内容，回退到浏览器")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] HTTP抓取失败: {str(e)}")
+                task_metrics.record_error(self.task_id, self._error_type(e))
+                if self.fetch_mode == FETCH_MODE_HTTP:
+                    self.exception_count += 1
+                    if self.exception_count >= self.max_exception:
+                        print(f"异常次数达到上限 {self.max_exception}，自动停止爬虫")
+                        await self.stop()
+                        return
+            if self.fetch_mode == FETCH_MODE_HTTP:
+                await self._wait_next_run()
+                return
+
         # 检查浏览器是否需要初始化
         if self.page is None:
             print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 浏览器未初始化，开始初始化...")
@@ -171,53 +238,140 @@ class ControlledSpider:
             print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 达到重启间隔，重启浏览器...")
             await self._init_browser()
         
-        # 使用已初始化的浏览器实例
+        # 使用已初始化的浏览器实例（复用账号会话）
         try:
-            async with async_playwright() as p:
-                browser = await p.chromium.launch(
-                    headless=self.headless,
-                    slow_mo=50
-                   
-                )
-                self.page = await browser.new_page()
-                if self.user_agent:
-                    await self.page.set_extra_http_headers({"User-Agent": self.user_agent})
-                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 开始爬取链接: {url}")
-                await self.page.goto(url, timeout=60000)
-                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 页面加载成功")
-                
-                # 获取页面标题
-                # title = await self.page.title()
-                # print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 页面标题: {title}")
-                # await asyncio.sleep(10000000)
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 开始爬取链接: {url}")
+            started = time.monotonic()
+            response = await self.page.goto(url, timeout=60000)
+            if response is not None:
+                latency = time.monotonic() - started
+                await host_rate_limiter.record(url, response.status, latency, self._retry_after(response.headers))
+                task_metrics.record_page(self.task_id, latency, int(response.headers.get("content-length") or 0))
+                proxy_pool.report(self.browser_proxy, response.status != 407, latency)
+                if response.status >= 400:
+                    task_metrics.record_error(self.task_id, f"http_{response.status}")
+                if account_pool.record(self.account_id, response.status):
+                    await self._rotate_account()
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 页面加载成功")
         except asyncio.CancelledError:
             print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 爬取任务被取消")
             raise  # 重新抛出CancelledError以便上层处理
         except Exception as e:
             self.exception_count += 1
+            await host_rate_limiter.record(url)
+            proxy_pool.report(self.browser_proxy, False)
+            task_metrics.record_error(self.task_id, self._error_type(e))
             print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 爬取失败: {str(e)} | 异常次数: {self.exception_count}/{self.max_exception}")
             # 异常次数超过阈值，停止任务
             if self.exception_count >= self.max_exception:
                 print(f"异常次数达到上限 {self.max_exception}，自动停止爬虫")
                 await self.stop()
                 return
-       
-        await asyncio.sleep(self.interval)
+
+        # 当前代理被代理池隔离后关闭浏览器，下一轮重新初始化时换一个代理
+        if self.page is not None and proxy_pool.is_quarantined(self.browser_proxy):
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 代理 {self.browser_proxy} 已被隔离，下一轮更换代理重建浏览器")
+            await self._close_browser()
+
+        await self._wait_next_run()
+
+    def _http_cookies(self):
+        """将账号会话转换为HTTP客户端可用的 {name: value} 字典"""
+        return account_pool.cookie_dict(self.account_id, self.cookie)
+
+    async def _rotate_account(self):
+        """当前账号被限制时换一个可用账号，下一轮使用新账号的会话"""
+        if not self.lease_owner:
+            return
+        account = account_pool.acquire(self.lease_owner)
+        if account is None or account.id == self.account_id:
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 账号 {self.account_id} 被限制，暂无其他可用账号")
+            return
+        await self._close_browser()
+        account_pool.release(self.account_id, self.lease_owner)
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 账号 {self.account_id} 被限制，切换到账号 {account.id}")
+        self.account_id = account.id
+        self.cookie = account.account_name
+        self.storage_state_path = account_pool.storage_dir(account.id)
+
+    async def _crawl_http(self, url: str) -> bool:
+        """使用HTTP客户端抓取并解析页面，解析到内容时返回True"""
+        from app.services.page_parser import parse_page_async
+        headers = {"User-Agent": self.user_agent} if self.user_agent else None
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 开始HTTP抓取链接: {url}")
+        # 每次请求都从代理池按策略和健康分选择代理
+        proxy = proxy_pool.select() or self.proxy
+        started = time.monotonic()
+        try:
+            status_code, html, response_headers = await http_fetcher.fetch(
+                url, headers=headers, cookies=self._http_cookies(), proxy=proxy
+            )
+        except Exception:
+            await host_rate_limiter.record(url)
+            proxy_pool.report(proxy, False)
+            raise
+        latency = time.monotonic() - started
+        await host_rate_limiter.record(url, status_code, latency, self._retry_after(response_headers))
+        task_metrics.record_page(self.task_id, latency, len(html.encode("utf-8")))
+        proxy_pool.report(proxy, status_code != 407, latency)
+        if account_pool.record(self.account_id, status_code):
+            await self._rotate_account()
+        if status_code >= 400:
+            raise HttpStatusError(status_code)
+        result = await parse_page_async(html, url)
+        if not result or not (result.get("title") or result.get("content")):
+            return False
+        self.last_result = result
+        task_metrics.record_items(self.task_id)
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] HTTP抓取成功: {result.get('title', '')[:30]}")
+        return True
 
     async def start(self, url: str):
-        await self._init_browser()
+        self._loop = asyncio.get_running_loop()
+        # 纯HTTP模式不需要启动浏览器
+        if self.fetch_mode != FETCH_MODE_HTTP:
+            await self._init_browser()
         self.task = asyncio.create_task(self._run(url))
 
     async def _run(self, url: str):
         try:
             while not self.stop_event.is_set():
+                # 暂停时在此等待恢复（停止时也会唤醒）
+                await self.pause_event.wait()
+                if self.stop_event.is_set():
+                    break
                 await self.crawl(url)
         except asyncio.CancelledError:
             print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 爬虫任务被取消")
             raise
 
+    def pause(self):
+        """暂停爬虫，当前这一轮结束后不再开始新的抓取"""
+        self.pause_event.clear()
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 爬虫已暂停")
+
+    def resume(self):
+        """恢复暂停的爬虫"""
+        self.pause_event.set()
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 爬虫已恢复")
+
+    def apply_config(self, config: dict):
+        """运行中更新爬虫参数，下一轮抓取生效"""
+        if config.get("interval") is not None:
+            self.interval = config["interval"]
+        if config.get("restart_interval") is not None:
+            self.restart_interval = config["restart_interval"]
+        if config.get("time_range") is not None:
+            self.time_range = tuple(config["time_range"])
+        if config.get("max_exception") is not None:
+            self.max_exception = config["max_exception"]
+        if config.get("fetch_mode") in (FETCH_MODE_BROWSER, FETCH_MODE_HTTP, FETCH_MODE_AUTO):
+            self.fetch_mode = config["fetch_mode"]
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 爬虫参数已更新: {config}")
+
     async def stop(self):
         self.stop_event.set()
+        self.pause_event.set()
         await self._close_browser()
         if self.task:
             self.task.cancel()
@@ -230,8 +384,12 @@ class ControlledSpider:
         print("爬虫已停止运行")
     
     def stop_sync(self):
-        """同步停止方法，用于在非异步上下文中停止爬虫"""
-        self.stop_event.set()
+        """同步停止方法，用于在其他线程中停止爬虫（投递到爬虫所在的事件循环执行）"""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self.stop_event.set)
+            self._loop.call_soon_threadsafe(self.pause_event.set)
+        else:
+            self.stop_event.set()
 
     def is_running(self):
         """判断爬虫是否正在运行"""
@@ -0,0 +1,141 @@
+import asyncio
+import os
+import time
+from typing import Any, Dict, Optional
+from sqlalchemy import func
+from starlette.concurrency import run_in_threadpool
+from app.database import SessionLocal
+from app.models.account import Account
+from app.models.proxy import Proxy
+from app.models.raw_data import RawData
+from app.models.sample_data import SampleData
+from app.models.task import Task
+from app.services.crawler_runtime import crawler_runtime
+from app.services.frontier import url_frontier
+from app.services.qa_crawler import qa_crawler_service
+from app.services.spool import local_spool
+from app.services.task_metrics import task_metrics
+from app.utils.metrics import QA_QUEUE_ITEMS
+from app.config import settings
+
+_PROCESSED = QA_QUEUE_ITEMS.labels("processed")
+
+
+class DashboardSummaryService:
+    """仪表盘汇总快照
+
+    各表计数、队列长度、运行中的爬虫数和近期吞吐量合并成一份内存快照，缓存
+    DASHBOARD_SUMMARY_TTL 秒。快照过期后第一次请求仍返回旧快照，同时在后台刷新
+    （同一时间只有一个刷新），仪表盘加载只是一次读内存，不随表的大小变慢。
+    吞吐量由相邻两次快照的计数差值换算为每分钟条数，第一次快照时为null。
+    """
+
+    def __init__(self):
+        self.ttl = settings.DASHBOARD_SUMMARY_TTL
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._refreshed_at = 0.0
+        self._previous: Optional[Dict[str, float]] = None  # 上次快照的累计计数，用于计算吞吐量
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _query_counts() -> Dict[str, Any]:
+        """数据库计数（每张表一次聚合查询）"""
+        db = SessionLocal()
+        try:
+            accounts = dict(db.query(Account.status, func.count(Account.id)).group_by(Account.status).all())
+            proxies = dict(db.query(Proxy.status, func.count(Proxy.id)).group_by(Proxy.status).all())
+            tasks = dict(db.query(Task.status, func.count(Task.id)).group_by(Task.status).all())
+            raw_by_year = db.query(RawData.year, func.count(RawData.id)).group_by(RawData.year).all()
+            sample_by_year = db.query(SampleData.year, func.count(SampleData.id)).group_by(SampleData.year).all()
+        finally:
+            db.close()
+        raw_by_year = {str(year): count for year, count in raw_by_year}
+        sample_by_year = {str(year): count for year, count in sample_by_year}
+        return {
+            "accounts": {"total": sum(accounts.values()), "active": accounts.get(1, 0)},
+            "proxies": {"total": sum(proxies.values()), "available": proxies.get(1, 0)},
+            "tasks": {"total": sum(tasks.values()), "by_status": {str(s): c for s, c in tasks.items()}},
+            "raw_data": {"total": sum(raw_by_year.values()), "by_year": raw_by_year},
+            "sample_data": {"total": sum(sample_by_year.values()), "by_year": sample_by_year},
+        }
+
+    @staticmethod
+    def _count_exports() -> int:
+        export_dir = os.path.join(os.getcwd(), "exports")
+        if not os.path.exists(export_dir):
+            return 0
+        return sum(1 for filename in os.listdir(export_dir) if filename.endswith(".xlsx"))
+
+    async def _queues(self) -> Dict[str, Any]:
+        """Redis队列状态，Redis不可用时对应项为null"""
+        try:
+            qa = await qa_crawler_service.get_status_async()
+        except Exception as e:
+            print(f"获取QA队列状态失败: {str(e)}")
+            qa = None
+        try:
+            frontier = await url_frontier.get_status_async()
+        except Exception as e:
+            print(f"获取URL调度队列状态失败: {str(e)}")
+            frontier = None
+        return {"qa": qa, "frontier": frontier, "spool": await run_in_threadpool(local_spool.size)}
+
+    def _throughput(self, now: float, raw_total: int) -> Dict[str, Any]:
+        """近期吞吐量（每分钟）"""
+        current = {"at": now, "raw_data": raw_total, "qa_processed": _PROCESSED.value}
+        previous, self._previous = self._previous, current
+        running = task_metrics.list_running().values()
+        result = {
+            "crawl_pages_per_min": round(sum(m["rate_per_min"] for m in running), 3),
+            "raw_data_per_min": None,
+            "qa_processed_per_min": None,
+        }
+        elapsed = now - previous["at"] if previous else 0
+        if elapsed > 0:
+            for key in ("raw_data", "qa_processed"):
+                result[f"{key}_per_min"] = round(max(current[key] - previous[key], 0) * 60 / elapsed, 3)
+        return result
+
+    async def refresh(self) -> Dict[str, Any]:
+        """重新生成快照"""
+        started = time.perf_counter()
+        counts = await run_in_threadpool(self._query_counts)
+        counts["exports"] = await run_in_threadpool(self._count_exports)
+        now = time.time()
+        snapshot = {
+            "counts": counts,
+            "queues": await self._queues(),
+            "spiders": {
+                "running_tasks": counts["tasks"]["by_status"].get("1", 0),
+                "local_instances": crawler_runtime.count(),
+                "local_crawlers": crawler_runtime.count("crawler"),
+                "local_exports": crawler_runtime.count("export"),
+            },
+            "throughput": self._throughput(now, counts["raw_data"]["total"]),
+            "generated_at": now,
+            "build_ms": round((time.perf_counter() - started) * 1000, 2),
+        }
+        self._snapshot = snapshot
+        self._refreshed_at = time.monotonic()
+        return snapshot
+
+    async def _refresh_quietly(self):
+        try:
+            await self.refresh()
+        except Exception as e:
+            print(f"刷新仪表盘快照失败: {str(e)}")
+
+    async def get_summary(self) -> Dict[str, Any]:
+        """获取汇总快照，过期时后台刷新并先返回旧快照"""
+        if self._snapshot is None:
+            if self._refresh_task is None or self._refresh_task.done():
+                self._refresh_task = asyncio.create_task(self.refresh())
+            await asyncio.shield(self._refresh_task)
+        elif time.monotonic() - self._refreshed_at > self.ttl:
+            if self._refresh_task is None or self._refresh_task.done():
+                self._refresh_task = asyncio.create_task(self._refresh_quietly())
+        return dict(self._snapshot, age=round(time.time() - self._snapshot["generated_at"], 3))
+
+
+# 创建仪表盘汇总服务实例
+dashboard_service = DashboardSummaryService()
@@ -12,22 +12,25 @@ from app.models.raw_data import RawData
 from app.models.year_quota import YearQuota
 from app.models.task import Task
 from app.models.proxy import Proxy
+from app.services.proxy_pool import proxy_pool
+from app.services.account_pool import account_pool
+from app.services.control_broker import control_broker
+from app.services.task_metrics import task_metrics
+from app.utils.metrics import EXPORT_JOB_DURATION
 from app.models.account import Account
 from app.utils.redis import get_redis
 from app.config import settings
 import json
 import re
-from bs4 import BeautifulSoup
+from app.services.page_parser import parse_page
 from app.services.exporter_task import ControlledExporter
-
-# 全局导出实例管理器
-exporter_instances = {}
+from app.services.crawler_runtime import crawler_runtime
 
 def run_export_task(task_id: int, url: str = None, api_request: str = None, task_type: str = "export",
                      interval: int = 5,
                      restart_interval: int = 3600, time_range: tuple = (0, 24),
-                     max_exception: int = 3):
-    """运行导出任务，使用 ControlledExporter"""
+                     max_exception: int = 3, fetch_mode: str = None):
+    """运行导出任务，使用 ControlledExporter（导出始终使用浏览器，忽略fetch_mode）"""
     db = SessionLocal()
 
     try:
@@ -47,6 +50,17 @@ def run_export_task(task_id: int, url: str = None, api_request: str = None, task
             db.commit()
             return
 
+        # 从账号池租用账号，任务账号被占用或在冷却中时轮换到其他账号
+        lease_owner = f"export:{task_id}"
+        account = account_pool.acquire(lease_owner, preferred_id=task.account_id)
+        if not account:
+            print(f"任务 {task_id} 没有可用账号")
+            task.status = 3  # 失败
+            task.error_message = "没有可用账号（账号均被占用或在冷却中）"
+            task.end_time = datetime.now()
+            db.commit()
+            return
+
         # 获取导出参数
         export_param = None
         if task.crawler_param_id:
@@ -66,10 +80,7 @@ def run_export_task(task_id: int, url: str = None, api_request: str = None, task
         account_cookie = account.account_name if account else None
 
         # 获取代理信息
-        proxy = None
-        proxy_obj = db.query(Proxy).filter(Proxy.status == 1).first()
-        if proxy_obj:
-            proxy = f"{proxy_obj.proxy_type}://{proxy_obj.proxy_addr}"
+        proxy = proxy_pool.select()
 
         # 创建 ControlledExporter 实例
         exporter = ControlledExporter(
@@ -83,6 +94,7 @@ def run_export_task(task_id: int, url: str = None, api_request: str = None, task
             proxy=proxy,
             cookie=account_cookie,
             account_id=account.id,
+            task_id=task_id,
         )
 
         # 打印中文参数信息
@@ -97,59 +109,16 @@ def run_export_task(task_id: int, url: str = None, api_request: str = None, task
         print(f"  cookie路径: {exporter.storage_state_path}")
         print(f"  代理: {exporter.proxy}")
         print(f"  cookie: {account_cookie}")
-        # 保存到全局管理器
-        exporter_instances[task_id] = exporter
-
-        # 启动导出（在后台线程中运行异步任务）
-        import asyncio
-        import threading
-
-        # 存储事件循环以便后续清理
-        exporter_loop = None
-
-        def run_exporter():
-            nonlocal exporter_loop
-            exporter_loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(exporter_loop)
-            try:
-                exporter_loop.run_until_complete(exporter.start(export_url))
-            except asyncio.CancelledError:
-                print(f"任务 {task_id} 的导出被取消")
-            finally:
-                # 等待所有待处理的任务完成
-                pending = asyncio.all_tasks(exporter_loop)
-                if pending:
-                    exporter_loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
-                exporter_loop.close()
-
-        thread = threading.Thread(target=run_exporter, daemon=True)
-        thread.start()
-        print(f"任务 {task_id} 的导出已启动")
-
-        # 更新任务状态为运行中
+        # 更新任务状态为运行中（先于提交，避免实例过早结束时状态被覆盖）
         task.status = 1
         task.start_time = datetime.now()
         db.commit()
+        control_broker.publish_task_event(task_id, "export", task.status)
+        task_metrics.start_task(task_id, "export")
 
-        # 监控任务状态
-        while exporter.is_running():
-            db.refresh(task)
-            if task.status != 1:  # 任务被停止
-                # 使用同步停止方法
-                exporter.stop_sync()
-                print(f"任务 {task_id} 已停止")
-                # 等待线程完成，确保事件循环正确关闭
-                if thread.is_alive():
-                    thread.join(timeout=5)
-                break
-            time.sleep(1)
-
-        # 任务结束
-        if task.status == 1:  # 如果是导出自己停止的
-            task.status = 4  # 完成
-            task.end_time = datetime.now()
-            task.progress = 100
-            db.commit()
+        # 提交到爬虫运行时（共享事件循环，不再为每个任务创建线程）
+        crawler_runtime.submit("export", task_id, exporter, export_url, on_done=lambda error: _on_export_done(task_id, error))
+        print(f"任务 {task_id} 的导出已启动")
 
     except Exception as e:
         print(f"导出任务异常: {str(e)}")
@@ -158,23 +127,35 @@ def run_export_task(task_id: int, url: str = None, api_request: str = None, task
         task.end_time = datetime.now()
         task.retry_count += 1
         db.commit()
+        control_broker.publish_task_event(task_id, "export", task.status, error_message=task.error_message)
+        account_pool.release_owner(f"export:{task_id}")
 
     finally:
-        # 确保导出已停止
-        if exporter.is_running():
-            try:
-                # 使用同步停止方法
-                exporter.stop_sync()
-            except Exception as e:
-                print(f"停止导出时出错: {str(e)}")
-
-        # 等待线程完成
-        if thread.is_alive():
-            thread.join(timeout=5)
-
-        # 从全局管理器中移除
-        if task_id in exporter_instances:
-            del exporter_instances[task_id]
+        db.close()
+
+def _on_export_done(task_id: int, error: Optional[BaseException] = None):
+    """导出实例结束后的回调，更新任务状态并释放账号"""
+    db = SessionLocal()
+    account_pool.release_owner(f"export:{task_id}")
+    task_metrics.finish_task(task_id)
+    try:
+        task = db.query(Task).filter(Task.id == task_id).first()
+        if not task:
+            return
+        if error is not None:
+            task.status = 3  # 失败
+            task.error_message = str(error)
+            task.end_time = datetime.now()
+            task.retry_count += 1
+        elif task.status == 1:  # 如果是导出自己停止的
+            task.status = 4  # 完成
+            task.end_time = datetime.now()
+            task.progress = 100
+        db.commit()
+        if task.start_time:
+            EXPORT_JOB_DURATION.labels("task").observe((datetime.now() - task.start_time).total_seconds())
+        control_broker.publish_task_event(task_id, "export", task.status, error_message=task.error_message)
+    finally:
         db.close()
 
 def run_export_task_to_excel(task_id: int) -> bool:
@@ -689,104 +670,10 @@ def get_export_files() -> List[Dict]:
     files.sort(key=lambda x: x["created_time"], reverse=True)
 
 def select_proxy(proxies: List[Proxy]) -> Optional[Proxy]:
-    """选择代理"""
+    """选择代理（按代理策略和健康分）"""
     if not proxies:
         return None
-
-    # 过滤可用代理
-    available_proxies = [p for p in proxies if p.status == 1]
-    if not available_proxies:
-        return None
-
-    # 根据策略选择代理
-    strategy = available_proxies[0].strategy  # 使用第一个代理的策略
-
-    if strategy == "轮询":
-        # 简单轮询，每次选择第一个
-        return available_proxies[0]
-    elif strategy == "随机":
-        return random.choice(available_proxies)
-    elif strategy == "失败切换":
-        # 选择最近未失败的代理
-        return available_proxies[0]
-
-    return available_proxies[0]
-
-def parse_page(html: str, url: str) -> Optional[Dict]:
-    """解析页面内容"""
-    try:
-        soup = BeautifulSoup(html, "html.parser")
-
-        # 提取标题
-        title_elem = soup.find("h1", class_="QuestionHeader-title")
-        title = title_elem.text.strip() if title_elem else ""
-
-        # 提取内容
-        content_elem = soup.find("div", class_="RichContent-inner")
-        content = content_elem.text.strip() if content_elem else ""
-
-        # 提取发布时间
-        time_elem = soup.find("span", class_="ContentItem-time")
-        publish_time = ""
-        if time_elem:
-            time_text = time_elem.text.strip()
-            # 尝试提取日期
-            match = re.search(r"(\d{4}-\d{2}-\d{2})", time_text)
-            if match:
-                publish_time = match.group(1)
-
-        # 提取作者信息
-        author_elem = soup.find("div", class_="AuthorInfo")
-        author = ""
-        author_url = ""
-        author_field = ""
-        author_cert = ""
-        author_fans = 0
-
-        if author_elem:
-            # 作者名
-            name_elem = author_elem.find("a", class_="UserLink-link")
-            if name_elem:
-                author = name_elem.text.strip()
-                author_url = "https://www.zhihu.com" + name_elem.get("href", "")
-
-            # 作者领域
-            field_elem = author_elem.find("div", class_="AuthorInfo-badgeText")
-            if field_elem:
-                author_field = field_elem.text.strip()
-
-            # 作者认证
-            cert_elem = author_elem.find("div", class_="AuthorInfo-headline")
-            if cert_elem:
-                author_cert = cert_elem.text.strip()
-
-            # 作者粉丝数
-            fans_elem = author_elem.find("div", class_="NumberBoard-itemValue")
-            if fans_elem:
-                try:
-                    fans_text = fans_elem.text.strip()
-                    # 处理粉丝数中的"万"等单位
-                    if "万" in fans_text:
-                        author_fans = int(float(fans_text.replace("万", "")) * 10000)
-                    else:
-                        author_fans = int(fans_text)
-                except:
-                    author_fans = 0
-
-        return {
-            "title": title,
-            "content": content,
-            "publish_time": publish_time,
-            "author": author,
-            "author_url": author_url,
-            "author_field": author_field,
-            "author_cert": author_cert,
-            "author_fans": author_fans,
-        }
-
-    except Exception as e:
-        print(f"解析页面异常: {str(e)}, URL: {url}")
-        return None
+    return proxy_pool.select_from(proxies)
 
 def extract_year(publish_time: str) -> int:
     """从发布时间中提取年份"""
@@ -808,15 +695,11 @@ def extract_year(publish_time: str) -> int:
 
 def stop_export_task(task_id: int):
     """停止指定任务的导出"""
-    if task_id in exporter_instances:
-        exporter = exporter_instances[task_id]
-        exporter.stop_sync()
+    if crawler_runtime.send("export", task_id, "stop"):
         print(f"任务 {task_id} 的导出已停止")
         return True
     return False
 
 def is_export_running(task_id: int) -> bool:
     """检查指定任务的导出是否在运行"""
-    if task_id in exporter_instances:
-        return exporter_instances[task_id].is_running()
-    return False
+    return crawler_runtime.is_running("export", task_id)
@@ -1,10 +1,12 @@
 
 import asyncio
 import os
-import shutil
+import time
 from datetime import datetime
 from playwright.async_api import async_playwright
 from app.config import settings
+from app.services.account_pool import account_pool
+from app.services.task_metrics import task_metrics
 
 class ControlledExporter:
     def __init__(
@@ -21,6 +23,7 @@ class ControlledExporter:
         task_type: str = "export",
         cookie: str = None,
         account_id: int = None,
+        task_id: int = None,  # 任务ID，用于记录运行指标
     ):
         self.interval = interval
         self.restart_interval = restart_interval
@@ -34,7 +37,10 @@ class ControlledExporter:
         self.task_type = task_type
         self.cookie = cookie
         self.account_id = account_id
+        self.task_id = task_id
         self.stop_event = asyncio.Event()
+        self.pause_event = asyncio.Event()  # 设置表示运行，清除表示暂停
+        self.pause_event.set()
         self.browser = None
         self.context = None
         self.page = None
@@ -42,33 +48,18 @@ class ControlledExporter:
         self.start_time = None
         self.exception_count = 0  # 异常计数器
         self.task = None  # 存储异步任务
+        self._loop = None  # 导出所在的事件循环
 
         # 管理存储目录
         self._manage_storage_directory()
 
     def _manage_storage_directory(self):
-        """管理存储目录，创建父目录和子目录"""
-        if self.storage_state_path:
-            # 父目录
-            parent_dir = "cookiedata"
-            # 子目录
-            child_dir = os.path.join(parent_dir, self.storage_state_path)
-
-            # 创建父目录（如果不存在）
-            if not os.path.exists(parent_dir):
-                os.makedirs(parent_dir)
-                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 创建父目录: {parent_dir}")
-
-            # 清空子目录（如果存在）
-            if os.path.exists(child_dir):
-                shutil.rmtree(child_dir)
-                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 清空子目录: {child_dir}")
-
-            # 创建子目录
-            os.makedirs(child_dir)
-            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 创建子目录: {child_dir}")
-
-            # 更新 storage_state_path 为完整路径
+        """管理存储目录：账号的浏览器状态跨运行保留，不再清空"""
+        if self.account_id is not None:
+            self.storage_state_path = account_pool.storage_dir(self.account_id)
+        elif self.storage_state_path:
+            child_dir = os.path.join("cookiedata", self.storage_state_path)
+            os.makedirs(child_dir, exist_ok=True)
             self.storage_state_path = child_dir
 
     async def _init_browser(self):
@@ -88,36 +79,16 @@ class ControlledExporter:
                 browser_args['proxy'] = {'server': self.proxy}
                 print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 使用代理: {self.proxy}")
 
-            # 如果设置了浏览器路径，使用该路径
-            if self.storage_state_path:
-                browser_args['executable_path'] = self.storage_state_path
-
             self.browser = await self.playwright.chromium.launch(**browser_args)
             print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 浏览器已启动")
 
-            # 创建浏览器上下文
+            # 创建浏览器上下文：优先复用该账号上次保存的状态，否则用账号cookie初始化
             context_args = {}
-            if self.cookie:
-                # 使用cookie和account_id
-                try:
-                    # 解析cookie字符串为字典
-                    import json
-                    cookie_dict = json.loads(self.cookie)
-                    # 确保expires字段是浮点数类型
-                    if 'expires' in cookie_dict and isinstance(cookie_dict['expires'], str):
-                        try:
-                            cookie_dict['expires'] = float(cookie_dict['expires'])
-                        except (ValueError, TypeError):
-                            # 如果转换失败，删除expires字段或设置为默认值
-                            cookie_dict.pop('expires', None)
-                    storage_state = {
-                        "cookies": [cookie_dict]
-                    }
-                    context_args['storage_state'] = storage_state
-                    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 使用Cookie (账号ID: {self.account_id}): {self.cookie[:50]}...")
-                except json.JSONDecodeError:
-
-                    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 使用Cookie (账号ID: {self.account_id}): {self.cookie[:20]}...")
+            storage_state = account_pool.storage_state(self.account_id, self.cookie)
+            if storage_state:
+                context_args['storage_state'] = storage_state
+                source = storage_state if isinstance(storage_state, str) else "账号Cookie"
+                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 使用浏览器状态 (账号ID: {self.account_id}): {source}")
 
             self.context = await self.browser.new_context(**context_args)
             print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 浏览器上下文已创建")
@@ -193,7 +164,11 @@ class ControlledExporter:
                 if self.user_agent:
                     await self.page.set_extra_http_headers({"User-Agent": self.user_agent})
                 print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 开始导出链接: {url}")
-                await self.page.goto(url, timeout=60000)
+                started = time.monotonic()
+                response = await self.page.goto(url, timeout=60000)
+                if response is not None:
+                    task_metrics.record_page(self.task_id, time.monotonic() - started,
+                                             int(response.headers.get("content-length") or 0), kind="export")
                 print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 页面加载成功")
 
                 # 获取页面标题
@@ -205,6 +180,7 @@ class ControlledExporter:
             raise  # 重新抛出CancelledError以便上层处理
         except Exception as e:
             self.exception_count += 1
+            task_metrics.record_error(self.task_id, type(e).__name__, kind="export")
             print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 导出失败: {str(e)} | 异常次数: {self.exception_count}/{self.max_exception}")
             # 异常次数超过阈值，停止任务
             if self.exception_count >= self.max_exception:
@@ -215,19 +191,35 @@ class ControlledExporter:
         await asyncio.sleep(self.interval)
 
     async def start(self, url: str):
+        self._loop = asyncio.get_running_loop()
         await self._init_browser()
         self.task = asyncio.create_task(self._run(url))
 
     async def _run(self, url: str):
         try:
             while not self.stop_event.is_set():
+                # 暂停时在此等待恢复（停止时也会唤醒）
+                await self.pause_event.wait()
+                if self.stop_event.is_set():
+                    break
                 await self.export(url)
         except asyncio.CancelledError:
             print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 导出任务被取消")
             raise
 
+    def pause(self):
+        """暂停导出，当前这一轮结束后不再开始新的导出"""
+        self.pause_event.clear()
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 导出已暂停")
+
+    def resume(self):
+        """恢复暂停的导出"""
+        self.pause_event.set()
+        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] 导出已恢复")
+
     async def stop(self):
         self.stop_event.set()
+        self.pause_event.set()
         await self._close_browser()
         if self.task:
             self.task.cancel()
@@ -240,8 +232,12 @@ class ControlledExporter:
         print("导出已停止运行")
 
     def stop_sync(self):
-        """同步停止方法，用于在非异步上下文中停止导出"""
-        self.stop_event.set()
+        """同步停止方法，用于在其他线程中停止导出（投递到导出所在的事件循环执行）"""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self.stop_event.set)
+            self._loop.call_soon_threadsafe(self.pause_event.set)
+        else:
+            self.stop_event.set()
 
     def is_running(self):
         """判断导出是否正在运行"""
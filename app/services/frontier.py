@@ -0,0 +1,428 @@
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+from app.utils.redis import get_async_redis
+from app.utils.dedup_cache import dedup_cache
+from app.config import settings
+
+
+class URLFrontier:
+    """推荐页→问答页链路的URL调度（frontier）
+
+    每个主机一个有序集合保存待抓取URL，分数为 下次抓取时间 - 优先级 * FRONTIER_PRIORITY_SECONDS，
+    分数越小越先抓取；重新安排抓取时分数不早于 当前时间 + FRONTIER_MIN_INTERVAL，优先级只决定到期URL
+    之间的先后，不会让URL立即再次到期；所有主机的有序集合保存各主机最早可抓取的时间。取URL时在到期的主机之间
+    平均分配本次数量，同一主机两次取URL至少间隔 FRONTIER_HOST_DELAY 秒。
+
+    URL被取出后不会离开frontier，而是按其重抓间隔安排下一次抓取。抓取结果回报页面签名
+    （回答内容和评论数），签名变化说明页面仍在更新，重抓间隔缩短为 1/FRONTIER_BACKOFF，
+    未变化则放大 FRONTIER_BACKOFF 倍，限制在 [FRONTIER_MIN_INTERVAL, FRONTIER_MAX_INTERVAL]，
+    抓取资源因此集中在最可能产生新回答和新评论的页面上。新URL通过推荐页URL集合去重。
+    """
+
+    REDIS_URL_KEY = settings.REDIS_RECOMMENDATION_URLS_KEY  # 去重使用的推荐页URL集合
+    REDIS_LEGACY_QUEUE_KEY = settings.REDIS_RECOMMENDATION_QUEUE_KEY  # 旧的推荐页FIFO队列
+    REDIS_HOSTS_KEY = settings.REDIS_FRONTIER_HOSTS_KEY
+    REDIS_READY_KEY = settings.REDIS_FRONTIER_READY_KEY
+    REDIS_HOST_PREFIX = settings.REDIS_FRONTIER_HOST_PREFIX
+    REDIS_META_PREFIX = settings.REDIS_FRONTIER_META_PREFIX
+    REDIS_WORKERS_KEY = settings.REDIS_FRONTIER_WORKERS_KEY  # 各worker的租约统计
+
+    # 更新主机的调度分数：max(主机最早URL的分数, 主机冷却截止时间)，主机队列为空时移除
+    _RESCHEDULE_HOST = """
+    local function reschedule_host(hosts_key, ready_key, host_key, host)
+        local head = redis.call('ZRANGE', host_key, 0, 0, 'WITHSCORES')
+        if #head == 0 then
+            redis.call('ZREM', hosts_key, host)
+            redis.call('HDEL', ready_key, host)
+            return
+        end
+        local ready = tonumber(redis.call('HGET', ready_key, host)) or 0
+        redis.call('ZADD', hosts_key, math.max(tonumber(head[2]), ready), host)
+    end
+    """
+
+    # 按抓取结果安排URL的下一次抓取：签名变化时缩短重抓间隔，未变化时放大；签名为空时只按当前间隔安排
+    # 返回页面是否有变化
+    _COMPLETE_URL = """
+    local function complete_url(host_key, meta_key, url, signature, now, boost, default_interval,
+                                min_interval, max_interval, backoff)
+        local meta = redis.call('HMGET', meta_key, 'priority', 'interval', 'signature')
+        local priority = tonumber(meta[1]) or 0
+        local interval = tonumber(meta[2]) or default_interval
+        local changed = 0
+        if signature ~= '' then
+            if meta[3] then
+                if meta[3] ~= signature then
+                    interval = math.max(min_interval, interval / backoff)
+                    redis.call('HINCRBY', meta_key, 'changes', 1)
+                    changed = 1
+                else
+                    interval = math.min(max_interval, interval * backoff)
+                end
+            end
+            redis.call('HSET', meta_key, 'signature', signature)
+        end
+        redis.call('HSET', meta_key, 'priority', priority, 'interval', tostring(interval), 'crawled_at', tostring(now))
+        redis.call('HINCRBY', meta_key, 'checks', 1)
+        redis.call('ZADD', host_key, math.max(now + min_interval, now + interval - priority * boost), url)
+        return changed
+    end
+    """
+
+    # 添加新URL：ARGV = 当前时间, 优先级秒数, 默认重抓间隔, 主机键前缀, 元数据键前缀, 然后每条URL三个参数(url, host, priority)
+    # 返回每条URL此前是否已存在
+    _ADD_SCRIPT = _RESCHEDULE_HOST + """
+    local now = tonumber(ARGV[1])
+    local boost = tonumber(ARGV[2])
+    local result = {}
+    for i = 6, #ARGV, 3 do
+        local url, host, priority = ARGV[i], ARGV[i + 1], tonumber(ARGV[i + 2])
+        if redis.call('SADD', KEYS[1], url) == 1 then
+            redis.call('ZADD', ARGV[4] .. host, now - priority * boost, url)
+            redis.call('HSET', ARGV[5] .. url, 'priority', priority, 'interval', ARGV[3])
+            reschedule_host(KEYS[2], KEYS[3], ARGV[4] .. host, host)
+            table.insert(result, 0)
+        else
+            table.insert(result, 1)
+        end
+    end
+    return result
+    """
+
+    # 取到期URL：ARGV = 当前时间, 数量, 主机冷却秒数, 优先级秒数, 默认重抓间隔, 主机键前缀, 元数据键前缀,
+    # 可见性超时, 租约ID, worker, 最小重抓间隔；主机队列键由主机名拼出，只适用于单实例Redis
+    # 可见性超时为0时取出即按重抓间隔安排下一次抓取，否则URL在超时后重新到期，除非期间被确认；
+    # 同一次调用中每条URL最多返回一次
+    _LEASE_SCRIPT = _RESCHEDULE_HOST + """
+    local now = tonumber(ARGV[1])
+    local remaining = tonumber(ARGV[2])
+    local boost = tonumber(ARGV[4])
+    local visibility = tonumber(ARGV[8])
+    local min_interval = tonumber(ARGV[11])
+    local result = {}
+    local leased = {}
+    -- 按轮次在到期主机之间平均分配，某主机到期URL不足时剩余数量在下一轮分给其他主机
+    while remaining > 0 do
+        local hosts = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', now, 'LIMIT', 0, remaining)
+        local taken = 0
+        for index, host in ipairs(hosts) do
+            local host_key = ARGV[6] .. host
+            local quota = math.ceil((remaining - taken) / (#hosts - index + 1))
+            local urls = redis.call('ZRANGEBYSCORE', host_key, '-inf', now, 'LIMIT', 0, quota)
+            local fresh = {}
+            for _, url in ipairs(urls) do
+                if not leased[url] then
+                    leased[url] = true
+                    table.insert(fresh, url)
+                end
+            end
+            urls = fresh
+            for _, url in ipairs(urls) do
+                local meta_key = ARGV[7] .. url
+                local meta = redis.call('HMGET', meta_key, 'priority', 'interval', 'lease_id', 'worker')
+                if meta[3] then
+                    -- 上一个租约到期仍未确认，记到原worker名下
+                    redis.call('HINCRBY', KEYS[3], (meta[4] or '') .. ':expired', 1)
+                end
+                if visibility > 0 then
+                    redis.call('ZADD', host_key, now + visibility, url)
+                    redis.call('HSET', meta_key, 'leased_at', tostring(now), 'lease_id', ARGV[9], 'worker', ARGV[10])
+                else
+                    -- 取出后按重抓间隔安排下一次抓取，抓取结果回报后再按页面是否变化调整
+                    local priority = tonumber(meta[1]) or 0
+                    local interval = tonumber(meta[2]) or tonumber(ARGV[5])
+                    redis.call('ZADD', host_key, math.max(now + min_interval, now + interval - priority * boost), url)
+                    redis.call('HSET', meta_key, 'leased_at', tostring(now))
+                    redis.call('HDEL', meta_key, 'lease_id', 'worker')
+                end
+                table.insert(result, url)
+            end
+            taken = taken + #urls
+            if #urls > 0 and tonumber(ARGV[3]) > 0 then
+                redis.call('HSET', KEYS[2], host, tostring(now + tonumber(ARGV[3])))
+            end
+            reschedule_host(KEYS[1], KEYS[2], host_key, host)
+        end
+        if taken == 0 then
+            break
+        end
+        remaining = remaining - taken
+    end
+    if #result > 0 and ARGV[10] ~= '' then
+        redis.call('HINCRBY', KEYS[3], ARGV[10] .. ':leased', #result)
+        redis.call('HSET', KEYS[3], ARGV[10] .. ':last_seen', tostring(now))
+    end
+    return result
+    """
+
+    # 回报抓取结果：ARGV = 当前时间, 优先级秒数, 默认/最小/最大重抓间隔, 调整倍数, 主机键前缀, 元数据键前缀,
+    # 然后每条URL三个参数(url, host, 页面签名)；不在frontier中的URL按默认间隔加入。返回签名变化的条数
+    _COMPLETE_SCRIPT = _RESCHEDULE_HOST + _COMPLETE_URL + """
+    local changed_count = 0
+    for i = 9, #ARGV, 3 do
+        local url, host = ARGV[i], ARGV[i + 1]
+        changed_count = changed_count + complete_url(ARGV[7] .. host, ARGV[8] .. url, url, ARGV[i + 2],
+            tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4]), tonumber(ARGV[5]),
+            tonumber(ARGV[6]))
+        reschedule_host(KEYS[1], KEYS[2], ARGV[7] .. host, host)
+    end
+    return changed_count
+    """
+
+    # 确认租约：ARGV同回报抓取结果，之后为worker，然后每条URL四个参数(url, host, 租约ID, 页面签名)
+    # 租约ID不匹配（已过期并被重新分配）的确认被忽略；未带签名且租约期间已提交过QA数据的URL
+    # 已按提交结果安排了下一次抓取，只释放租约。返回 {确认条数, 页面有变化条数, 过期确认条数}
+    _ACK_SCRIPT = _RESCHEDULE_HOST + _COMPLETE_URL + """
+    local acked, changed, stale = 0, 0, 0
+    for i = 10, #ARGV, 4 do
+        local url, host = ARGV[i], ARGV[i + 1]
+        local meta_key = ARGV[8] .. url
+        local meta = redis.call('HMGET', meta_key, 'lease_id', 'leased_at', 'crawled_at')
+        if meta[1] == ARGV[i + 2] then
+            local completed = (tonumber(meta[3]) or 0) >= (tonumber(meta[2]) or 0)
+            if ARGV[i + 3] ~= '' or not completed then
+                changed = changed + complete_url(ARGV[7] .. host, meta_key, url, ARGV[i + 3],
+                    tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4]), tonumber(ARGV[5]),
+                    tonumber(ARGV[6]))
+                reschedule_host(KEYS[1], KEYS[2], ARGV[7] .. host, host)
+            end
+            redis.call('HDEL', meta_key, 'lease_id', 'worker')
+            acked = acked + 1
+        else
+            stale = stale + 1
+        end
+    end
+    redis.call('HINCRBY', KEYS[3], ARGV[9] .. ':acked', acked)
+    redis.call('HINCRBY', KEYS[3], ARGV[9] .. ':stale', stale)
+    redis.call('HSET', KEYS[3], ARGV[9] .. ':last_seen', ARGV[1])
+    return {acked, changed, stale}
+    """
+
+    # 放弃租约：ARGV = 当前时间, 重新到期前的延迟秒数, 主机键前缀, 元数据键前缀, worker,
+    # 然后每条URL三个参数(url, host, 租约ID)。返回 {放回条数, 过期条数}
+    _NACK_SCRIPT = _RESCHEDULE_HOST + """
+    local now = tonumber(ARGV[1])
+    local nacked, stale = 0, 0
+    for i = 6, #ARGV, 3 do
+        local url, host = ARGV[i], ARGV[i + 1]
+        local meta_key = ARGV[4] .. url
+        if redis.call('HGET', meta_key, 'lease_id') == ARGV[i + 2] then
+            redis.call('HDEL', meta_key, 'lease_id', 'worker')
+            redis.call('HINCRBY', meta_key, 'failures', 1)
+            redis.call('ZADD', ARGV[3] .. host, now + tonumber(ARGV[2]), url)
+            reschedule_host(KEYS[1], KEYS[2], ARGV[3] .. host, host)
+            nacked = nacked + 1
+        else
+            stale = stale + 1
+        end
+    end
+    redis.call('HINCRBY', KEYS[3], ARGV[5] .. ':nacked', nacked)
+    redis.call('HINCRBY', KEYS[3], ARGV[5] .. ':stale', stale)
+    redis.call('HSET', KEYS[3], ARGV[5] .. ':last_seen', ARGV[1])
+    return {nacked, stale}
+    """
+
+    # 统计：主机数、到期主机数、URL总数、到期URL数
+    _STATUS_SCRIPT = """
+    local now = tonumber(ARGV[1])
+    local hosts = redis.call('ZRANGE', KEYS[1], 0, -1)
+    local urls, due = 0, 0
+    for _, host in ipairs(hosts) do
+        urls = urls + redis.call('ZCARD', ARGV[2] .. host)
+        due = due + redis.call('ZCOUNT', ARGV[2] .. host, '-inf', now)
+    end
+    return {#hosts, redis.call('ZCOUNT', KEYS[1], '-inf', now), urls, due}
+    """
+
+    def __init__(self):
+        self.priority_seconds = settings.FRONTIER_PRIORITY_SECONDS
+        self.host_delay = settings.FRONTIER_HOST_DELAY
+        self.default_interval = settings.FRONTIER_DEFAULT_INTERVAL
+        self.min_interval = settings.FRONTIER_MIN_INTERVAL
+        self.max_interval = settings.FRONTIER_MAX_INTERVAL
+        self.backoff = settings.FRONTIER_BACKOFF
+        self.visibility_timeout = settings.FRONTIER_VISIBILITY_TIMEOUT
+        self.nack_delay = settings.FRONTIER_NACK_DELAY
+        self._scripts: Dict[str, Any] = {}
+
+    @staticmethod
+    def _host(url: str) -> str:
+        return urlsplit(url).netloc.lower() or "unknown"
+
+    @staticmethod
+    def signature(data: Dict[str, Any]) -> str:
+        """QA数据的页面签名：回答内容校验和 + 评论数"""
+        content = data.get('content') or data.get('answer_content_text') or ''
+        comments = data.get('comments_structured') or []
+        return f"{zlib.crc32(content.encode('utf-8')):08x}:{len(comments)}"
+
+    async def _script(self, name: str):
+        redis_client = await get_async_redis()
+        if not redis_client:
+            return None, None
+        if name not in self._scripts:
+            self._scripts[name] = redis_client.register_script(getattr(self, name))
+        return redis_client, self._scripts[name]
+
+    async def add_async(self, urls: Sequence[str], priority: int = 0) -> Optional[List[bool]]:
+        """添加新URL（已在推荐页URL集合中的跳过），返回每条URL此前是否已存在；Redis不可用时返回None
+
+        本地去重缓存确认已存在的URL不访问Redis。
+        """
+        known = dedup_cache.filter_known(self.REDIS_URL_KEY, urls)
+        unknown = [url for url, flag in zip(urls, known) if not flag]
+        if not unknown:
+            return known
+        redis_client, script = await self._script("_ADD_SCRIPT")
+        if not redis_client:
+            return None
+        args: List[Any] = [time.time(), self.priority_seconds, self.default_interval,
+                           self.REDIS_HOST_PREFIX, self.REDIS_META_PREFIX]
+        for url in unknown:
+            args.extend((url, self._host(url), priority))
+        flags = iter(await script(keys=[self.REDIS_URL_KEY, self.REDIS_HOSTS_KEY, self.REDIS_READY_KEY],
+                                  args=args, client=redis_client))
+        dedup_cache.add(self.REDIS_URL_KEY, unknown)
+        return [True if flag else bool(next(flags)) for flag in known]
+
+    async def _drain_legacy_queue(self, redis_client, count: int):
+        """把旧FIFO队列中剩余的URL迁移到frontier（旧队列只做了判重，URL未写入集合）"""
+        urls = await redis_client.lpop(self.REDIS_LEGACY_QUEUE_KEY, count)
+        if urls:
+            await self.add_async(urls)
+
+    async def lease_async(self, count: int, worker: str = "", lease_id: str = "",
+                          visibility: float = 0) -> Optional[List[str]]:
+        """取出最多count条到期的URL，在到期主机之间平均分配；Redis不可用时返回None
+
+        visibility大于0时URL以lease_id租给worker，超时未确认会重新到期并分配给其他worker；
+        为0时取出即视为完成，按重抓间隔安排下一次抓取。
+        """
+        redis_client, script = await self._script("_LEASE_SCRIPT")
+        if not redis_client:
+            return None
+        await self._drain_legacy_queue(redis_client, max(count, 100))
+        return await script(
+            keys=[self.REDIS_HOSTS_KEY, self.REDIS_READY_KEY, self.REDIS_WORKERS_KEY],
+            args=[time.time(), count, self.host_delay, self.priority_seconds, self.default_interval,
+                  self.REDIS_HOST_PREFIX, self.REDIS_META_PREFIX, visibility, lease_id, worker, self.min_interval],
+            client=redis_client
+        )
+
+    async def ack_async(self, worker: str, items: Sequence[Tuple[str, str, str]]) -> Dict[str, int]:
+        """确认租约 (url, 租约ID, 页面签名)，签名可为空；按抓取结果安排下一次抓取"""
+        redis_client, script = await self._script("_ACK_SCRIPT")
+        if not redis_client or not items:
+            return {"acked": 0, "changed": 0, "stale": 0}
+        args: List[Any] = [time.time(), self.priority_seconds, self.default_interval, self.min_interval,
+                           self.max_interval, self.backoff, self.REDIS_HOST_PREFIX, self.REDIS_META_PREFIX, worker]
+        for url, lease_id, signature in items:
+            args.extend((url, self._host(url), lease_id, signature or ""))
+        acked, changed, stale = await script(
+            keys=[self.REDIS_HOSTS_KEY, self.REDIS_READY_KEY, self.REDIS_WORKERS_KEY], args=args, client=redis_client
+        )
+        return {"acked": acked, "changed": changed, "stale": stale}
+
+    async def nack_async(self, worker: str, items: Sequence[Tuple[str, str]],
+                         delay: Optional[float] = None) -> Dict[str, int]:
+        """放弃租约 (url, 租约ID)，URL在delay秒后重新到期（默认 FRONTIER_NACK_DELAY）"""
+        redis_client, script = await self._script("_NACK_SCRIPT")
+        if not redis_client or not items:
+            return {"nacked": 0, "stale": 0}
+        args: List[Any] = [time.time(), self.nack_delay if delay is None else delay,
+                           self.REDIS_HOST_PREFIX, self.REDIS_META_PREFIX, worker]
+        for url, lease_id in items:
+            args.extend((url, self._host(url), lease_id))
+        nacked, stale = await script(
+            keys=[self.REDIS_HOSTS_KEY, self.REDIS_READY_KEY, self.REDIS_WORKERS_KEY], args=args, client=redis_client
+        )
+        return {"nacked": nacked, "stale": stale}
+
+    async def get_worker_stats_async(self) -> Dict[str, Dict[str, float]]:
+        """各worker的租约统计：leased/acked/nacked/expired/stale 和 last_seen
+
+        in_flight 为未确认也未过期回收的条数（过期的租约在URL被重新分配时才计入expired）
+        """
+        redis_client = await get_async_redis()
+        if not redis_client:
+            return {}
+        workers: Dict[str, Dict[str, float]] = {}
+        for field, value in (await redis_client.hgetall(self.REDIS_WORKERS_KEY)).items():
+            worker, _, name = field.rpartition(':')
+            workers.setdefault(worker, {})[name] = float(value) if name == 'last_seen' else int(value)
+        for stats in workers.values():
+            for name in ('leased', 'acked', 'nacked', 'expired', 'stale'):
+                stats.setdefault(name, 0)
+            stats['in_flight'] = max(stats['leased'] - stats['acked'] - stats['nacked'] - stats['expired'], 0)
+        return workers
+
+    async def complete_async(self, results: Sequence[Tuple[str, str]]) -> int:
+        """回报抓取结果 (url, 页面签名)，按页面是否变化调整重抓间隔，返回页面有变化的条数"""
+        if not results:
+            return 0
+        redis_client, script = await self._script("_COMPLETE_SCRIPT")
+        if not redis_client:
+            return 0
+        args: List[Any] = [time.time(), self.priority_seconds, self.default_interval, self.min_interval,
+                           self.max_interval, self.backoff, self.REDIS_HOST_PREFIX, self.REDIS_META_PREFIX]
+        for url, signature in results:
+            args.extend((url, self._host(url), signature))
+        return await script(keys=[self.REDIS_HOSTS_KEY, self.REDIS_READY_KEY], args=args, client=redis_client)
+
+    async def get_url_info_async(self, url: str) -> Optional[Dict[str, Any]]:
+        """单条URL的调度信息：优先级、重抓间隔、下次抓取时间、检查/变化次数"""
+        redis_client = await get_async_redis()
+        if not redis_client:
+            return None
+        async with redis_client.pipeline(transaction=False) as pipe:
+            meta, score = await pipe.hgetall(self.REDIS_META_PREFIX + url) \
+                .zscore(self.REDIS_HOST_PREFIX + self._host(url), url).execute()
+        if not meta:
+            return None
+        priority = int(meta.get('priority') or 0)
+        return {
+            "url": url,
+            "priority": priority,
+            "interval": float(meta.get('interval') or self.default_interval),
+            "next_due": score + priority * self.priority_seconds if score is not None else None,
+            "checks": int(meta.get('checks') or 0),
+            "changes": int(meta.get('changes') or 0),
+            "crawled_at": float(meta['crawled_at']) if meta.get('crawled_at') else None,
+        }
+
+    async def get_status_async(self) -> Dict[str, int]:
+        """frontier统计"""
+        redis_client = await get_async_redis()
+        if not redis_client:
+            return {"hosts": 0, "due_hosts": 0, "urls": 0, "due_urls": 0, "legacy_queue": 0}
+        if "_STATUS_SCRIPT" not in self._scripts:
+            self._scripts["_STATUS_SCRIPT"] = redis_client.register_script(self._STATUS_SCRIPT)
+        hosts, due_hosts, urls, due_urls = await self._scripts["_STATUS_SCRIPT"](
+            keys=[self.REDIS_HOSTS_KEY], args=[time.time(), self.REDIS_HOST_PREFIX], client=redis_client
+        )
+        legacy = await redis_client.llen(self.REDIS_LEGACY_QUEUE_KEY)
+        return {"hosts": hosts, "due_hosts": due_hosts, "urls": urls, "due_urls": due_urls, "legacy_queue": legacy}
+
+    async def clear_async(self) -> int:
+        """清空frontier（不影响推荐页URL集合），返回删除的键数量"""
+        redis_client = await get_async_redis()
+        if not redis_client:
+            return 0
+        deleted = 0
+        for prefix in (self.REDIS_HOST_PREFIX, self.REDIS_META_PREFIX):
+            keys = []
+            async for key in redis_client.scan_iter(match=f"{prefix}*", count=1000):
+                keys.append(key)
+                if len(keys) >= 1000:
+                    deleted += await redis_client.delete(*keys)
+                    keys = []
+            if keys:
+                deleted += await redis_client.delete(*keys)
+        deleted += await redis_client.delete(self.REDIS_HOSTS_KEY, self.REDIS_READY_KEY, self.REDIS_WORKERS_KEY)
+        return deleted
+
+
+# 创建URL调度实例
+url_frontier = URLFrontier()
@@ -0,0 +1,118 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Tuple
+from sqlalchemy import text
+from app.database import SessionLocal
+from app.utils.redis import get_redis
+from app.services.crawler_runtime import crawler_runtime
+from app.services.task_dispatcher import task_dispatcher
+from app.workers.qa_crawler_consumer import qa_crawler_consumer
+from app.config import settings
+
+
+class HealthService:
+    """进程内存活/就绪检查
+
+    /healthz 只检查本进程内部状态（运行时事件循环、QA消费协程是否存活），不依赖外部服务，
+    外部服务短暂不可用或入库变慢不应导致进程被重启；/readyz 额外检查数据库、Redis和队列消费延迟。
+    每项检查结果缓存 HEALTH_CHECK_TTL 秒，频繁探测不会放大到数据库和Redis。
+    """
+
+    LIVENESS_CHECKS = ("runtime", "consumer_alive")
+    READINESS_CHECKS = ("database", "redis", "consumer", "runtime")
+
+    def __init__(self):
+        self.ttl = settings.HEALTH_CHECK_TTL
+        self._lock = threading.Lock()
+        self._cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._checks: Dict[str, Callable[[], Dict[str, Any]]] = {
+            "database": self._check_database,
+            "redis": self._check_redis,
+            "consumer": self._check_consumer,
+            "consumer_alive": self._check_consumer_alive,
+            "runtime": self._check_runtime,
+        }
+
+    @staticmethod
+    def _check_database() -> Dict[str, Any]:
+        db = SessionLocal()
+        try:
+            db.execute(text("SELECT 1"))
+            return {"ok": True}
+        finally:
+            db.close()
+
+    @staticmethod
+    def _check_redis() -> Dict[str, Any]:
+        redis_client = get_redis()
+        if not redis_client:
+            return {"ok": False, "error": "Redis未连接"}
+        redis_client.ping()
+        return {"ok": True}
+
+    @staticmethod
+    def _check_consumer_alive() -> Dict[str, Any]:
+        """QA消费协程是否存活（存活检查不看消费延迟，长批次或外部服务卡顿不应触发重启）"""
+        alive = qa_crawler_consumer.is_alive()
+        return {"ok": alive, "alive": alive}
+
+    @staticmethod
+    def _check_consumer() -> Dict[str, Any]:
+        """QA消费协程是否存活，以及距上次完成消费循环的时间"""
+        alive = qa_crawler_consumer.is_alive()
+        last_cycle = qa_crawler_consumer.last_cycle
+        lag = round(time.time() - last_cycle, 1) if last_cycle else None
+        result = {"ok": alive, "alive": alive, "seconds_since_cycle": lag}
+        if lag is not None and lag > settings.HEALTH_CONSUMER_MAX_LAG:
+            result.update(ok=False, error=f"消费循环已 {lag} 秒未完成")
+        return result
+
+    @staticmethod
+    def _check_runtime() -> Dict[str, Any]:
+        """爬虫运行时事件循环线程是否存活；redis调度模式下统计心跳超时的worker任务"""
+        result = crawler_runtime.get_status()
+        result["ok"] = result["alive_loops"] == result["loops"]
+        if settings.CRAWLER_DISPATCH_MODE == "redis":
+            deadline = time.time() - settings.CRAWLER_LEASE_TTL
+            result["stale_tasks"] = sum(
+                1 for entry in task_dispatcher.get_registry()
+                if entry.get("status") == "running" and (entry.get("heartbeat") or 0) < deadline
+            )
+        return result
+
+    def _run(self, name: str) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            cached = self._cache.get(name)
+            if cached and cached[0] > now:
+                return cached[1]
+        started = time.perf_counter()
+        try:
+            result = self._checks[name]()
+        except Exception as e:
+            result = {"ok": False, "error": str(e)}
+        result["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        result["checked_at"] = now
+        with self._lock:
+            self._cache[name] = (now + self.ttl, result)
+        return result
+
+    def check(self, names) -> Dict[str, Any]:
+        """执行（或读取缓存的）一组检查"""
+        checks = {name: self._run(name) for name in names}
+        return {"status": "ok" if all(c["ok"] for c in checks.values()) else "fail", "checks": checks}
+
+    def liveness(self) -> Dict[str, Any]:
+        return self.check(self.LIVENESS_CHECKS)
+
+    def readiness(self) -> Dict[str, Any]:
+        return self.check(self.READINESS_CHECKS)
+
+    def invalidate(self):
+        """清空缓存，下次检查重新执行"""
+        with self._lock:
+            self._cache.clear()
+
+
+# 创建健康检查服务实例
+health_service = HealthService()
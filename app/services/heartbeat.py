@@ -1,91 +1,76 @@
 import threading
-import time
 import requests
 import logging
-from fastapi import FastAPI
 from app.config import settings
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
 class HeartbeatService:
-    """心跳服务，用于定期发送心跳请求保活API"""
+    """外部看门狗：定期请求服务的 /healthz，连续失败时告警
 
-    def __init__(self, app=None):
-        self.app = app
+    健康状态由进程内的 /healthz、/readyz 提供，本服务只作为可选的外部探测，
+    默认不随应用启动（HEARTBEAT_ENABLED），也可以作为独立进程运行：
+    python -m app.services.heartbeat
+    """
+
+    def __init__(self):
         self.heartbeat_thread = None
         self.stop_event = threading.Event()
-        self.heartbeat_url = None
-        self.interval = 5  # 默认5秒间隔
-
-    def init_app(self, app: FastAPI):
-        """初始化应用"""
-        self.app = app
-        # 从配置中获取心跳URL和间隔时间
-        self.heartbeat_url = f"http://127.0.0.1:{settings.PORT}/api/utils/heartbeat"
-        self.interval = 5
-        logger.info(f"心跳服务初始化，URL: {self.heartbeat_url}, 间隔: {self.interval}秒")
-
-        # 注册应用关闭时的处理函数
-        @app.on_event("shutdown")
-        async def cleanup():
-            if self.heartbeat_thread and self.heartbeat_thread.is_alive():
-                self.stop()
+        self.heartbeat_url = settings.HEARTBEAT_URL or f"http://127.0.0.1:{settings.PORT}/healthz"
+        self.interval = settings.HEARTBEAT_INTERVAL
+        self.failures = 0
 
     def start(self):
-        """启动心跳服务"""
+        """启动看门狗"""
         if self.heartbeat_thread and self.heartbeat_thread.is_alive():
             logger.warning("心跳服务已在运行中")
             return
 
         self.stop_event.clear()
-        self.heartbeat_thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
+        self.heartbeat_thread = threading.Thread(target=self._heartbeat_loop, name="heartbeat", daemon=True)
         self.heartbeat_thread.start()
-        logger.info(f"心跳服务已启动，间隔: {self.interval}秒")
+        logger.info(f"心跳服务已启动，URL: {self.heartbeat_url}, 间隔: {self.interval}秒")
 
     def stop(self):
-        """停止心跳服务"""
+        """停止看门狗"""
         self.stop_event.set()
         if self.heartbeat_thread and self.heartbeat_thread.is_alive():
             self.heartbeat_thread.join(timeout=1)
         logger.info("心跳服务已停止")
 
     def _heartbeat_loop(self):
-        """心跳循环"""
-        # 等待应用完全启动
-        logger.info("等待应用完全启动...")
-        time.sleep(10)
-        logger.info("应用启动完成，开始发送心跳")
+        """心跳循环：首次探测前等待一个间隔，给应用留出启动时间"""
+        while not self.stop_event.wait(self.interval):
+            self._send_heartbeat()
 
-        while not self.stop_event.is_set():
-            try:
-                self._send_heartbeat()
-                # 使用可中断的等待
-                self.stop_event.wait(self.interval)
-            except Exception as e:
-                logger.error(f"心跳服务异常: {str(e)}")
-                # 出现异常时等待一段时间再重试
-                self.stop_event.wait(min(self.interval, 10))
-
-    def _send_heartbeat(self):
-        """发送心跳请求"""
+    def _send_heartbeat(self) -> bool:
+        """发送一次探测，只在状态变化或失败时记录日志"""
         try:
-            logger.info(f"发送心跳请求到: {self.heartbeat_url}")
-            # 增加超时时间到10秒，并分别设置连接和读取超时
-            response = requests.get(
-                self.heartbeat_url,
-                timeout=(5, 10)  # (连接超时, 读取超时)
-            )
-            if response.status_code == 200:
-                logger.info(f"心跳请求成功，响应: {response.text}")
-            else:
-                logger.warning(f"心跳请求失败，状态码: {response.status_code}, 响应: {response.text}")
-        except requests.exceptions.ConnectTimeout as e:
-            logger.error(f"心跳请求连接超时: {str(e)}, URL: {self.heartbeat_url}")
-        except requests.exceptions.ReadTimeout as e:
-            logger.error(f"心跳请求读取超时: {str(e)}, URL: {self.heartbeat_url}")
+            response = requests.get(self.heartbeat_url, timeout=(5, 10))  # (连接超时, 读取超时)
+            healthy = response.status_code == 200
+            detail = response.text
         except requests.exceptions.RequestException as e:
-            logger.error(f"心跳请求异常: {str(e)}, URL: {self.heartbeat_url}")
+            healthy = False
+            detail = str(e)
+        if healthy:
+            if self.failures:
+                logger.info(f"服务已恢复，此前连续失败 {self.failures} 次")
+            self.failures = 0
+        else:
+            self.failures += 1
+            logger.error(f"健康检查失败（连续 {self.failures} 次）: {detail}, URL: {self.heartbeat_url}")
+        return healthy
 
 # 创建全局心跳服务实例
 heartbeat_service = HeartbeatService()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    heartbeat_service.start()
+    try:
+        while heartbeat_service.heartbeat_thread.is_alive():
+            heartbeat_service.heartbeat_thread.join(timeout=1)
+    except KeyboardInterrupt:
+        heartbeat_service.stop()
@@ -0,0 +1,92 @@
+import asyncio
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+from app.config import settings
+
+try:
+    import httpx
+except ImportError:  # 未安装httpx时只能使用浏览器模式
+    httpx = None
+
+try:
+    import h2  # noqa: F401  httpx的HTTP/2支持依赖h2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+# 页面抓取模式
+FETCH_MODE_BROWSER = "browser"  # 始终使用Playwright
+FETCH_MODE_HTTP = "http"        # 只使用HTTP客户端
+FETCH_MODE_AUTO = "auto"        # 优先HTTP，解析不到内容时回退到Playwright
+FETCH_MODES = [FETCH_MODE_BROWSER, FETCH_MODE_HTTP, FETCH_MODE_AUTO]
+
+
+class HttpFetcher:
+    """轻量HTTP抓取器
+
+    用于不需要执行JS的页面。每个事件循环共享一个带连接池的 httpx.AsyncClient
+    （可用时启用HTTP/2），并按主机限制并发请求数。
+    """
+
+    def __init__(self, max_connections: int = None, per_host_limit: int = None, timeout: int = None):
+        self.max_connections = max_connections or settings.HTTP_FETCH_MAX_CONNECTIONS
+        self.per_host_limit = per_host_limit or settings.HTTP_FETCH_PER_HOST_LIMIT
+        self.timeout = timeout or settings.TIMEOUT
+        # 客户端和信号量都绑定事件循环，按 (事件循环, 代理) / (事件循环, 主机) 分别缓存
+        self._clients: Dict[Tuple[int, Optional[str]], "httpx.AsyncClient"] = {}
+        self._host_limits: Dict[Tuple[int, str], asyncio.Semaphore] = {}
+
+    @staticmethod
+    def is_available() -> bool:
+        """检查HTTP抓取是否可用"""
+        return httpx is not None
+
+    def _get_client(self, proxy: Optional[str] = None):
+        loop_id = id(asyncio.get_running_loop())
+        key = (loop_id, proxy)
+        client = self._clients.get(key)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                proxy=proxy,
+                timeout=self.timeout,
+                follow_redirects=True,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                )
+            )
+            self._clients[key] = client
+        return client
+
+    def _get_host_limit(self, url: str) -> asyncio.Semaphore:
+        key = (id(asyncio.get_running_loop()), urlsplit(url).netloc)
+        semaphore = self._host_limits.get(key)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.per_host_limit)
+            self._host_limits[key] = semaphore
+        return semaphore
+
+    async def fetch(self, url: str, headers: Optional[Dict[str, str]] = None,
+                    cookies: Optional[Dict[str, str]] = None, proxy: Optional[str] = None) -> Tuple[int, str, Dict[str, str]]:
+        """抓取页面，返回 (状态码, HTML, 响应头)"""
+        if httpx is None:
+            raise RuntimeError("未安装httpx，无法使用HTTP抓取模式")
+        client = self._get_client(proxy)
+        async with self._get_host_limit(url):
+            response = await client.get(url, headers=headers, cookies=cookies)
+        return response.status_code, response.text, dict(response.headers)
+
+    async def close(self):
+        """关闭当前事件循环中的所有客户端"""
+        loop_id = id(asyncio.get_running_loop())
+        for key in [k for k in self._clients if k[0] == loop_id]:
+            client = self._clients.pop(key)
+            await client.aclose()
+        for key in [k for k in self._host_limits if k[0] == loop_id]:
+            self._host_limits.pop(key, None)
+
+
+# 创建抓取器实例
+http_fetcher = HttpFetcher()
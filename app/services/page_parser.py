@@ -0,0 +1,256 @@
+import asyncio
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+from app.config import settings
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as SelectolaxHTMLParser
+except ImportError:
+    SelectolaxHTMLParser = None
+
+try:
+    import lxml.html
+    from lxml.cssselect import CSSSelector
+except ImportError:
+    lxml = None
+    CSSSelector = None
+
+
+# 站点抽取规则（声明式）
+# 每个字段: selector-CSS选择器, scope-先定位的父元素, attr-取属性（默认取文本）,
+# regex-对结果做正则提取（取第1组）, prefix-结果前缀, convert-转换函数名, default-缺省值
+ZHIHU_RULES = {
+    "title": {"selector": "h1.QuestionHeader-title"},
+    "content": {"selector": "div.RichContent-inner"},
+    "publish_time": {"selector": "span.ContentItem-time", "regex": r"(\d{4}-\d{2}-\d{2})"},
+    "author": {"scope": "div.AuthorInfo", "selector": "a.UserLink-link"},
+    "author_url": {"scope": "div.AuthorInfo", "selector": "a.UserLink-link", "attr": "href", "prefix": "https://www.zhihu.com"},
+    "author_field": {"scope": "div.AuthorInfo", "selector": "div.AuthorInfo-badgeText"},
+    "author_cert": {"scope": "div.AuthorInfo", "selector": "div.AuthorInfo-headline"},
+    "author_fans": {"scope": "div.AuthorInfo", "selector": "div.NumberBoard-itemValue", "convert": "fans", "default": 0},
+}
+
+# 按主机后缀匹配规则，未匹配时使用默认规则
+SITE_RULES = {
+    "zhihu.com": ZHIHU_RULES,
+}
+DEFAULT_RULES = ZHIHU_RULES
+
+
+def _convert_fans(text: str) -> int:
+    """处理粉丝数中的"万"等单位"""
+    try:
+        if "万" in text:
+            return int(float(text.replace("万", "")) * 10000)
+        return int(text)
+    except (ValueError, TypeError):
+        return 0
+
+
+CONVERTERS = {
+    "fans": _convert_fans,
+}
+
+
+class ParserBackend:
+    """HTML解析后端接口"""
+
+    name = "base"
+
+    def parse(self, html: str):
+        raise NotImplementedError
+
+    def select_one(self, node, selector: str):
+        raise NotImplementedError
+
+    def text(self, node) -> str:
+        raise NotImplementedError
+
+    def attr(self, node, name: str) -> str:
+        raise NotImplementedError
+
+
+class BeautifulSoupBackend(ParserBackend):
+    """BeautifulSoup后端，安装了lxml时使用lxml解析器"""
+
+    name = "bs4"
+
+    def __init__(self):
+        from bs4 import BeautifulSoup
+        self._soup = BeautifulSoup
+        self._features = "lxml" if lxml is not None else "html.parser"
+
+    def parse(self, html: str):
+        return self._soup(html, self._features)
+
+    def select_one(self, node, selector: str):
+        return node.select_one(selector)
+
+    def text(self, node) -> str:
+        return node.text.strip()
+
+    def attr(self, node, name: str) -> str:
+        return node.get(name, "")
+
+
+class LxmlBackend(ParserBackend):
+    """lxml后端，CSS选择器预编译为XPath"""
+
+    name = "lxml"
+
+    def __init__(self):
+        if lxml is None:
+            raise RuntimeError("未安装lxml/cssselect")
+        self._compiled: Dict[str, Any] = {}
+
+    def parse(self, html: str):
+        return lxml.html.fromstring(html)
+
+    def select_one(self, node, selector: str):
+        compiled = self._compiled.get(selector)
+        if compiled is None:
+            compiled = self._compiled[selector] = CSSSelector(selector)
+        result = compiled(node)
+        return result[0] if result else None
+
+    def text(self, node) -> str:
+        return node.text_content().strip()
+
+    def attr(self, node, name: str) -> str:
+        return node.get(name, "")
+
+
+class SelectolaxBackend(ParserBackend):
+    """selectolax后端（基于Lexbor的C解析器）"""
+
+    name = "selectolax"
+
+    def __init__(self):
+        if SelectolaxHTMLParser is None:
+            raise RuntimeError("未安装selectolax")
+
+    def parse(self, html: str):
+        return SelectolaxHTMLParser(html)
+
+    def select_one(self, node, selector: str):
+        return node.css_first(selector)
+
+    def text(self, node) -> str:
+        return node.text(deep=True).strip()
+
+    def attr(self, node, name: str) -> str:
+        return node.attributes.get(name) or ""
+
+
+BACKENDS = {
+    "selectolax": SelectolaxBackend,
+    "lxml": LxmlBackend,
+    "bs4": BeautifulSoupBackend,
+}
+_backend_instances: Dict[str, ParserBackend] = {}
+
+
+def available_backends():
+    """返回当前环境可用的解析后端名称"""
+    names = []
+    for name, backend_cls in BACKENDS.items():
+        try:
+            get_backend(name)
+            names.append(name)
+        except Exception:
+            continue
+    return names
+
+
+def get_backend(name: Optional[str] = None) -> ParserBackend:
+    """获取解析后端，auto按 selectolax > lxml > bs4 的顺序选择可用后端"""
+    name = name or settings.PAGE_PARSER_BACKEND
+    if name == "auto":
+        for candidate in BACKENDS:
+            try:
+                return get_backend(candidate)
+            except Exception:
+                continue
+        raise RuntimeError("没有可用的HTML解析后端")
+    backend = _backend_instances.get(name)
+    if backend is None:
+        if name not in BACKENDS:
+            raise ValueError(f"未知的解析后端: {name}")
+        backend = _backend_instances[name] = BACKENDS[name]()
+    return backend
+
+
+def get_rules(url: str) -> Dict[str, Dict[str, Any]]:
+    """按URL主机匹配站点抽取规则"""
+    host = urlsplit(url).netloc.lower() if url else ""
+    for suffix, rules in SITE_RULES.items():
+        if host == suffix or host.endswith("." + suffix):
+            return rules
+    return DEFAULT_RULES
+
+
+def extract(html: str, url: str, rules: Optional[Dict[str, Dict[str, Any]]] = None,
+            backend: Optional[ParserBackend] = None) -> Dict[str, Any]:
+    """按声明式规则从HTML中抽取字段"""
+    backend = backend or get_backend()
+    rules = rules or get_rules(url)
+    doc = backend.parse(html)
+    scopes = {}
+    result = {}
+    for field, rule in rules.items():
+        value = rule.get("default", "")
+        node = doc
+        scope = rule.get("scope")
+        if scope:
+            if scope not in scopes:
+                scopes[scope] = backend.select_one(doc, scope)
+            node = scopes[scope]
+        elem = backend.select_one(node, rule["selector"]) if node is not None else None
+        if elem is not None:
+            text = backend.attr(elem, rule["attr"]) if rule.get("attr") else backend.text(elem)
+            if rule.get("regex"):
+                match = re.search(rule["regex"], text)
+                text = match.group(1) if match else None
+            if text is not None:
+                if rule.get("prefix"):
+                    text = rule["prefix"] + text
+                value = CONVERTERS[rule["convert"]](text) if rule.get("convert") else text
+        result[field] = value
+    return result
+
+
+def parse_page(html: str, url: str, backend: Optional[str] = None) -> Optional[Dict]:
+    """解析页面内容"""
+    try:
+        return extract(html, url, backend=get_backend(backend))
+    except Exception as e:
+        print(f"解析页面异常: {str(e)}, URL: {url}")
+        return None
+
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=settings.PAGE_PARSER_PROCESSES)
+    return _process_pool
+
+
+async def parse_page_async(html: str, url: str, backend: Optional[str] = None) -> Optional[Dict]:
+    """在进程池中解析页面，避免阻塞爬虫事件循环；未配置进程池时直接解析"""
+    if settings.PAGE_PARSER_PROCESSES <= 0:
+        return parse_page(html, url, backend)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_process_pool(), parse_page, html, url, backend)
+
+
+def shutdown_process_pool():
+    """关闭解析进程池"""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
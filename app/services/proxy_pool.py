@@ -0,0 +1,296 @@
+import itertools
+import random
+import threading
+import time
+from typing import Dict, List, Optional
+import requests
+from app.database import SessionLocal
+from app.models.proxy import Proxy
+from app.utils.redis import get_redis
+from app.config import settings
+
+
+def proxy_url(proxy: Proxy) -> str:
+    """代理模型转换为代理URL"""
+    return f"{proxy.proxy_type}://{proxy.proxy_addr}"
+
+
+class _ProxyState:
+    """单个代理的健康状态"""
+
+    __slots__ = ("proxy_id", "url", "strategy", "success_rate", "latency",
+                 "consecutive_failures", "quarantine_count", "quarantined_until",
+                 "requests", "failures", "last_used")
+
+    def __init__(self, proxy: Proxy):
+        self.proxy_id = proxy.id
+        self.url = proxy_url(proxy)
+        self.strategy = proxy.strategy
+        self.success_rate = 1.0  # 成功率EWMA
+        self.latency = 1.0  # 延迟EWMA(秒)
+        self.consecutive_failures = 0
+        self.quarantine_count = 0
+        self.quarantined_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.last_used = 0.0
+
+    @property
+    def score(self) -> float:
+        """健康分：成功率越高、延迟越低分数越高"""
+        return self.success_rate / (1.0 + self.latency)
+
+    def is_available(self, now: float) -> bool:
+        return now >= self.quarantined_until
+
+    def to_dict(self, now: float) -> Dict:
+        return {
+            "proxy_id": self.proxy_id,
+            "url": self.url,
+            "strategy": self.strategy,
+            "score": round(self.score, 4),
+            "success_rate": round(self.success_rate, 4),
+            "latency": round(self.latency, 3),
+            "consecutive_failures": self.consecutive_failures,
+            "quarantined": not self.is_available(now),
+            "quarantined_for": max(0, int(self.quarantined_until - now)),
+            "requests": self.requests,
+            "failures": self.failures,
+        }
+
+
+class ProxyPool:
+    """代理池服务
+
+    所有爬虫共享：轮询游标（Redis可用时跨进程共享）、按EWMA计算的健康分、
+    连续失败自动隔离并指数退避、后台探活后重新启用，以及按健康分加权选择。
+    """
+
+    REDIS_CURSOR_KEY = settings.REDIS_PROXY_CURSOR_KEY
+
+    def __init__(self):
+        self.alpha = settings.PROXY_EWMA_ALPHA
+        self.failure_threshold = settings.PROXY_FAILURE_THRESHOLD
+        self.quarantine_seconds = settings.PROXY_QUARANTINE_SECONDS
+        self.refresh_interval = settings.PROXY_POOL_REFRESH_INTERVAL
+        self._lock = threading.RLock()
+        self._states: Dict[str, _ProxyState] = {}
+        self._loaded_at = 0.0
+        self._cursor = itertools.count()
+        self._sticky: Optional[str] = None  # 失败切换策略当前使用的代理
+        self._probe_thread = None
+        self._stop_event = threading.Event()
+
+    def invalidate(self):
+        """代理配置变更后强制重新加载"""
+        with self._lock:
+            self._loaded_at = 0.0
+
+    def _refresh(self):
+        """从数据库加载启用的代理，保留已有的健康状态"""
+        now = time.time()
+        if now - self._loaded_at < self.refresh_interval:
+            return
+        db = SessionLocal()
+        try:
+            proxies = db.query(Proxy).filter(Proxy.status == 1).all()
+        except Exception as e:
+            print(f"加载代理失败: {str(e)}")
+            return
+        finally:
+            db.close()
+        with self._lock:
+            states = {}
+            for proxy in proxies:
+                url = proxy_url(proxy)
+                state = self._states.get(url) or _ProxyState(proxy)
+                state.strategy = proxy.strategy
+                states[url] = state
+            self._states = states
+            self._loaded_at = now
+
+    def _next_cursor(self) -> int:
+        redis_client = get_redis()
+        if redis_client:
+            try:
+                return int(redis_client.incr(self.REDIS_CURSOR_KEY))
+            except Exception:
+                pass
+        return next(self._cursor)
+
+    def _choose(self, candidates: List[_ProxyState], strategy: str) -> _ProxyState:
+        """按策略从健康的候选代理中选择"""
+        if strategy == "轮询":
+            ordered = sorted(candidates, key=lambda s: s.proxy_id)
+            return ordered[self._next_cursor() % len(ordered)]
+        if strategy == "失败切换":
+            # 持续使用当前代理，直到其被隔离再切到健康分最高的代理
+            for state in candidates:
+                if state.url == self._sticky:
+                    return state
+            chosen = max(candidates, key=lambda s: s.score)
+            self._sticky = chosen.url
+            return chosen
+        # 随机：按健康分加权
+        return random.choices(candidates, weights=[max(s.score, 0.001) for s in candidates])[0]
+
+    def select(self, strategy: Optional[str] = None) -> Optional[str]:
+        """选择一个代理，返回代理URL；没有可用代理时返回None"""
+        self._refresh()
+        now = time.time()
+        with self._lock:
+            candidates = [s for s in self._states.values() if s.is_available(now)]
+            if not candidates:
+                return None
+            strategy = strategy or candidates[0].strategy
+            chosen = self._choose(candidates, strategy)
+            chosen.last_used = now
+            return chosen.url
+
+    def select_from(self, proxies: List[Proxy]) -> Optional[Proxy]:
+        """从给定的代理列表中按策略和健康分选择"""
+        available = [p for p in proxies if p.status == 1]
+        if not available:
+            return None
+        self._refresh()
+        now = time.time()
+        with self._lock:
+            states = []
+            for proxy in available:
+                state = self._states.get(proxy_url(proxy)) or _ProxyState(proxy)
+                if state.is_available(now):
+                    states.append(state)
+            if not states:
+                return None
+            chosen = self._choose(states, available[0].strategy)
+        return next(p for p in available if p.id == chosen.proxy_id)
+
+    def report(self, url: Optional[str], success: bool, latency: Optional[float] = None):
+        """上报一次请求结果，更新健康分，连续失败达到阈值时隔离"""
+        if not url:
+            return
+        with self._lock:
+            state = self._states.get(url)
+            if state is None:
+                return
+            state.requests += 1
+            state.success_rate = (1 - self.alpha) * state.success_rate + self.alpha * (1.0 if success else 0.0)
+            if latency is not None:
+                state.latency = (1 - self.alpha) * state.latency + self.alpha * latency
+            if success:
+                state.consecutive_failures = 0
+                return
+            state.failures += 1
+            state.consecutive_failures += 1
+            if state.consecutive_failures >= self.failure_threshold:
+                self._quarantine(state)
+
+    def is_quarantined(self, url: Optional[str]) -> bool:
+        """代理是否正在隔离中（不在代理池中的代理视为未隔离）"""
+        if not url:
+            return False
+        with self._lock:
+            state = self._states.get(url)
+            return state is not None and not state.is_available(time.time())
+
+    def _quarantine(self, state: _ProxyState):
+        """隔离代理，隔离时长随隔离次数指数增长"""
+        duration = min(self.quarantine_seconds * (2 ** state.quarantine_count), 3600)
+        state.quarantine_count += 1
+        state.quarantined_until = time.time() + duration
+        state.consecutive_failures = 0
+        if self._sticky == state.url:
+            self._sticky = None
+        print(f"代理 {state.url} 连续失败，隔离 {int(duration)} 秒")
+
+    def _readmit(self, state: _ProxyState):
+        state.quarantined_until = 0.0
+        state.quarantine_count = 0
+        state.success_rate = max(state.success_rate, 0.5)
+        print(f"代理 {state.url} 探活成功，重新启用")
+
+    @staticmethod
+    def _requests_proxy(url: str) -> str:
+        scheme, addr = url.split("://", 1)
+        scheme = scheme.lower()
+        if scheme == "socks":
+            scheme = "socks5"
+        return f"{scheme}://{addr}"
+
+    def probe(self, url: str) -> bool:
+        """通过代理请求探活地址，成功时重新启用被隔离的代理
+
+        探活失败可能是探活地址本身不可达，不计入代理的失败次数，只有探活成功时记录一次延迟样本。
+        """
+        if not settings.PROXY_PROBE_URL:
+            return False
+        proxy = self._requests_proxy(url)
+        started = time.monotonic()
+        try:
+            response = requests.get(
+                settings.PROXY_PROBE_URL,
+                proxies={"http": proxy, "https": proxy},
+                timeout=settings.PROXY_PROBE_TIMEOUT
+            )
+            ok = response.status_code < 500
+        except requests.exceptions.RequestException:
+            ok = False
+        latency = time.monotonic() - started
+        with self._lock:
+            state = self._states.get(url)
+            if state is None:
+                return ok
+            if ok and not state.is_available(time.time()):
+                self._readmit(state)
+        if ok:
+            self.report(url, True, latency)
+        return ok
+
+    def _probe_loop(self):
+        """只探测隔离中的代理，探活成功则提前重新启用；正常代理的健康分只由实际请求结果决定"""
+        while not self._stop_event.wait(settings.PROXY_PROBE_INTERVAL):
+            if not settings.PROXY_PROBE_URL:
+                continue
+            try:
+                self._refresh()
+                now = time.time()
+                with self._lock:
+                    urls = [url for url, state in self._states.items() if not state.is_available(now)]
+                for url in urls:
+                    if self._stop_event.is_set():
+                        break
+                    self.probe(url)
+            except Exception as e:
+                print(f"代理探活异常: {str(e)}")
+
+    def start_health_checks(self):
+        """启动后台探活线程"""
+        if self._probe_thread and self._probe_thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._probe_thread = threading.Thread(target=self._probe_loop, name="proxy-probe", daemon=True)
+        self._probe_thread.start()
+
+    def stop_health_checks(self):
+        """停止后台探活线程"""
+        self._stop_event.set()
+        if self._probe_thread and self._probe_thread.is_alive():
+            self._probe_thread.join(timeout=1)
+
+    def available_count(self) -> int:
+        """当前可用（未隔离）的代理数"""
+        self._refresh()
+        now = time.time()
+        with self._lock:
+            return sum(1 for s in self._states.values() if s.is_available(now))
+
+    def get_stats(self) -> List[Dict]:
+        """获取所有代理的健康状态"""
+        self._refresh()
+        now = time.time()
+        with self._lock:
+            return sorted((s.to_dict(now) for s in self._states.values()), key=lambda d: -d["score"])
+
+
+# 创建代理池实例（所有爬虫共享）
+proxy_pool = ProxyPool()
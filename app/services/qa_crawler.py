@@ -1,12 +1,30 @@
+import asyncio
+import base64
+import time
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from app.utils.redis import get_redis
+from app.utils.redis import get_redis, get_async_redis, get_binary_redis
+from app.utils.queue_codec import queue_codec
+from app.utils.dedup_cache import dedup_cache
+from app.services.spool import local_spool
+from app.utils.metrics import QA_QUEUE_WAIT
 from app.models.raw_data import RawData
 from app.models.comment_data import CommentDataFactory
 from app.config import settings
-from typing import List, Optional, Dict, Any
-import json
+from typing import AsyncIterator, List, Optional, Dict, Any, Tuple
 from datetime import datetime
 
+
+def _parse_lanes(spec: str) -> Dict[str, int]:
+    """解析优先级通道配置，如 "realtime:10,backfill:1" -> {"realtime": 10, "backfill": 1}"""
+    lanes: Dict[str, int] = {}
+    for part in spec.split(','):
+        name, _, weight = part.strip().partition(':')
+        if name:
+            lanes[name] = max(int(weight or 1), 1)
+    return lanes or {"default": 1}
+
+
 class QACrawlerService:
     """问答小鲸鱼服务"""
 
@@ -14,9 +32,31 @@ class QACrawlerService:
     REDIS_URL_KEY = settings.REDIS_QA_CRAWLER_URLS_KEY  # 存储所有URL的集合
     REDIS_QUEUE_KEY = settings.REDIS_QA_CRAWLER_QUEUE_KEY  # 存储待处理数据的队列
     REDIS_RECOMMENDATION_KEY = settings.REDIS_RECOMMENDATION_URLS_KEY  # 推荐页URL集合
+    REDIS_DEAD_KEY = settings.REDIS_QA_CRAWLER_DEAD_KEY  # 入库失败数据的死信队列
+
+    # 队列优先级通道（按优先级从高到低）及出队权重，第一个通道沿用原队列键，其余为 原队列键:通道名
+    LANES = _parse_lanes(settings.QA_QUEUE_LANES)
+    LANE_KEYS = {
+        lane: settings.REDIS_QA_CRAWLER_QUEUE_KEY if index == 0 else f"{settings.REDIS_QA_CRAWLER_QUEUE_KEY}:{lane}"
+        for index, lane in enumerate(LANES)
+    }
+    DEFAULT_LANE = settings.QA_QUEUE_DEFAULT_LANE if settings.QA_QUEUE_DEFAULT_LANE in LANES else next(iter(LANES))
+
+    # 提交数据：URL不存在时写入问答和推荐页URL集合，再把数据推入队列，一次往返完成
+    # 返回URL此前是否已存在
+    _SUBMIT_SCRIPT = """
+    local exists = redis.call('SISMEMBER', KEYS[1], ARGV[1])
+    if exists == 0 then
+        redis.call('SADD', KEYS[1], ARGV[1])
+        redis.call('SADD', KEYS[2], ARGV[1])
+    end
+    redis.call('RPUSH', KEYS[3], ARGV[2])
+    return exists
+    """
 
     def __init__(self):
         self.redis_client = None
+        self._submit_script = None
 
     def _get_redis(self):
         """获取Redis客户端"""
@@ -30,7 +70,9 @@ class QACrawlerService:
             redis_client = self._get_redis()
             if redis_client:
                 redis_client.delete(self.REDIS_URL_KEY)
-                redis_client.delete(self.REDIS_QUEUE_KEY)
+                redis_client.delete(*self.LANE_KEYS.values())
+                dedup_cache.invalidate(self.REDIS_URL_KEY)
+                queue_codec.clear_blobs()
                 return True
             return False
         except Exception as e:
@@ -61,11 +103,16 @@ class QACrawlerService:
             return 0
 
     def url_exists(self, url: str) -> bool:
-        """检查URL是否已存在于缓存中"""
+        """检查URL是否已存在于缓存中（先查本地去重缓存）"""
+        if dedup_cache.contains(self.REDIS_URL_KEY, url):
+            return True
         try:
             redis_client = self._get_redis()
             if redis_client:
-                return redis_client.sismember(self.REDIS_URL_KEY, url)
+                exists = bool(redis_client.sismember(self.REDIS_URL_KEY, url))
+                if exists:
+                    dedup_cache.add(self.REDIS_URL_KEY, [url])
+                return exists
             return False
         except Exception as e:
             print(f"检查URL存在性失败: {str(e)}")
@@ -73,115 +120,396 @@ class QACrawlerService:
 
     def add_url(self, url: str) -> bool:
         """添加URL到缓存"""
+        if dedup_cache.contains(self.REDIS_URL_KEY, url):
+            return True
         try:
             redis_client = self._get_redis()
             if redis_client:
                 redis_client.sadd(self.REDIS_URL_KEY, url)
+                dedup_cache.add(self.REDIS_URL_KEY, [url])
                 return True
             return False
         except Exception as e:
             print(f"添加URL到缓存失败: {str(e)}")
             return False
 
-    def add_to_queue(self, data: Dict[str, Any]) -> bool:
-        """添加数据到生产队列"""
+    def resolve_lane(self, lane: Optional[str] = None) -> str:
+        """校验优先级通道名称，未指定时使用默认通道"""
+        if lane is None or lane == "":
+            return self.DEFAULT_LANE
+        if lane not in self.LANES:
+            raise ValueError(f"未知的队列通道: {lane}，可选: {', '.join(self.LANES)}")
+        return lane
+
+    @staticmethod
+    def _encode(data: Dict[str, Any]) -> bytes:
+        """编码队列数据，附带入队时间用于统计等待时间（spool回放的数据保留原提交时间）"""
+        return queue_codec.encode({"_enqueued_at": time.time(), **data})
+
+    def add_to_queue(self, data: Dict[str, Any], lane: Optional[str] = None) -> bool:
+        """添加数据到生产队列，Redis不可用时写入本地spool"""
+        lane = self.resolve_lane(lane)
         try:
             redis_client = self._get_redis()
             if redis_client:
-                # 将数据序列化为JSON并推入队列
-                redis_client.rpush(self.REDIS_QUEUE_KEY, json.dumps(data, ensure_ascii=False))
+                # 将数据编码后推入对应通道的队列
+                redis_client.rpush(self.LANE_KEYS[lane], self._encode(data))
                 return True
-            return False
         except Exception as e:
-            print(f"添加数据到队列失败: {str(e)}")
+            print(f"添加数据到队列失败，写入本地spool: {str(e)}")
+        try:
+            return local_spool.append([(data.get('url') or '', data)], lane)
+        except Exception as e:
+            print(f"写入本地spool失败: {str(e)}")
             return False
 
-    def get_queue_size(self) -> int:
-        """获取队列大小"""
+    def get_lane_sizes(self) -> Dict[str, int]:
+        """获取各通道队列长度"""
         try:
             redis_client = self._get_redis()
             if redis_client:
-                return redis_client.llen(self.REDIS_QUEUE_KEY)
-            return 0
+                pipe = redis_client.pipeline(transaction=False)
+                for key in self.LANE_KEYS.values():
+                    pipe.llen(key)
+                return dict(zip(self.LANES, pipe.execute()))
         except Exception as e:
             print(f"获取队列大小失败: {str(e)}")
-            return 0
+        return {lane: 0 for lane in self.LANES}
+
+    def get_queue_size(self) -> int:
+        """获取队列大小（所有通道合计）"""
+        return sum(self.get_lane_sizes().values())
+
+    def get_lane_age(self, lane: str) -> float:
+        """通道中最早一条数据已等待的秒数，通道为空时为0"""
+        try:
+            redis_client = get_binary_redis()
+            if redis_client:
+                head = redis_client.lindex(self.LANE_KEYS[lane], 0)
+                if head is not None:
+                    enqueued_at = queue_codec.decode(head, consume=False).get('_enqueued_at')
+                    if enqueued_at:
+                        return max(time.time() - enqueued_at, 0.0)
+        except Exception as e:
+            print(f"获取队列等待时间失败: {str(e)}")
+        return 0.0
+
+    def _allocate(self, sizes: Dict[str, int], count: int) -> Dict[str, int]:
+        """按通道权重分配本次出队条数
+
+        各非空通道按权重分得份额（至少1条，保证低优先级通道不会饿死），
+        某通道数据不足时，剩余份额继续按权重分给其他通道，实时数据少时回填可以用满整批。
+        """
+        allocation = {lane: 0 for lane in sizes}
+        remaining = count
+        active = [lane for lane, size in sizes.items() if size > 0]
+        while remaining > 0 and active:
+            total_weight = sum(self.LANES[lane] for lane in active)
+            granted = 0
+            for lane in active:
+                share = max(1, remaining * self.LANES[lane] // total_weight)
+                share = min(share, sizes[lane] - allocation[lane], remaining - granted)
+                allocation[lane] += share
+                granted += share
+            remaining -= granted
+            active = [lane for lane in active if allocation[lane] < sizes[lane]]
+        return allocation
 
     def get_from_queue(self, count: int = 1) -> List[Dict[str, Any]]:
-        """从队列中获取数据"""
+        """按通道权重从各优先级队列中获取数据"""
         try:
-            redis_client = self._get_redis()
+            # 队列数据是二进制编码，需要不解码响应的客户端
+            redis_client = get_binary_redis()
             if redis_client:
-                # 从队列左侧弹出数据
-                items = redis_client.lrange(self.REDIS_QUEUE_KEY, 0, count - 1)
-                if items:
-                    # 删除已获取的数据
-                    redis_client.ltrim(self.REDIS_QUEUE_KEY, count, -1)
-                    return [json.loads(item) for item in items]
+                allocation = {lane: take for lane, take in self._allocate(self.get_lane_sizes(), count).items() if take}
+                if not allocation:
+                    return []
+                # 从各通道队列左侧取出并删除数据（同一事务中完成）
+                pipe = redis_client.pipeline(transaction=True)
+                for lane, take in allocation.items():
+                    key = self.LANE_KEYS[lane]
+                    pipe.lrange(key, 0, take - 1).ltrim(key, take, -1)
+                replies = pipe.execute()
+                now = time.time()
+                result = []
+                undecodable = []
+                for lane, items in zip(allocation, replies[::2]):
+                    for item in items:
+                        try:
+                            data = queue_codec.decode(item)
+                        except Exception as e:
+                            print(f"解码队列数据失败，原样移入死信队列: {str(e)}")
+                            undecodable.append((item, str(e)[:500]))
+                            continue
+                        enqueued_at = data.pop('_enqueued_at', None)
+                        if enqueued_at:
+                            QA_QUEUE_WAIT.labels(lane).observe(now - enqueued_at)
+                        result.append(data)
+                self.add_raw_to_dead_letter(undecodable)
+                return result
             return []
         except Exception as e:
             print(f"从队列获取数据失败: {str(e)}")
             return []
 
-    def save_to_database(self, data: Dict[str, Any], db: Session) -> Optional[int]:
-        """将数据保存到数据库（raw_data和comment_data子表）"""
+    async def _get_async_redis(self):
+        """获取异步Redis客户端（在async接口中使用）"""
+        return await get_async_redis()
+
+    @staticmethod
+    async def _with_timeout(coro, items: int = 1):
+        """Redis写入超过 SPOOL_REDIS_TIMEOUT 秒（按每1000条放宽）视为失败，由调用方转写本地spool"""
+        if settings.SPOOL_REDIS_TIMEOUT > 0:
+            return await asyncio.wait_for(coro, settings.SPOOL_REDIS_TIMEOUT * max(1.0, items / 1000))
+        return await coro
+
+    async def _submit_redis(self, url: str, data: Dict[str, Any], queue_key: str) -> Optional[bool]:
+        redis_client = await self._get_async_redis()
+        if not redis_client:
+            return None
+        if dedup_cache.contains(self.REDIS_URL_KEY, url):
+            # 本地去重缓存确认URL已存在时只推入队列，不再执行判重脚本
+            await redis_client.rpush(queue_key, self._encode(data))
+            return True
+        if self._submit_script is None:
+            self._submit_script = redis_client.register_script(self._SUBMIT_SCRIPT)
+        exists = await self._submit_script(
+            keys=[self.REDIS_URL_KEY, self.REDIS_RECOMMENDATION_KEY, queue_key],
+            args=[url, self._encode(data)],
+            client=redis_client
+        )
+        dedup_cache.add(self.REDIS_URL_KEY, [url])
+        if not exists:
+            dedup_cache.add(self.REDIS_RECOMMENDATION_KEY, [url])
+        return bool(exists)
+
+    async def submit_async(self, url: str, data: Dict[str, Any], lane: Optional[str] = None) -> Optional[bool]:
+        """提交数据到指定优先级通道（async接口使用），返回URL此前是否已存在
+
+        Redis不可用或超时时写入本地spool（恢复后自动回放）并返回False；spool也写入失败时返回None。
+        """
+        lane = self.resolve_lane(lane)
         try:
-            # 提取年月信息
-            publish_time = data.get('publish_time', '')
-            year = data.get('year', datetime.now().year)
+            exists = await self._with_timeout(self._submit_redis(url, data, self.LANE_KEYS[lane]))
+            if exists is not None:
+                return exists
+        except Exception as e:
+            print(f"提交数据到Redis失败，写入本地spool: {str(e)}")
+        return False if await local_spool.append_async([(url, data)], lane) else None
 
-            # 解析年月
-            if publish_time:
-                try:
-                    dt = datetime.strptime(publish_time, '%Y-%m-%d')
-                    year = dt.year
-                    month = dt.month
-                except:
-                    month = 1
-            else:
+    async def _submit_batch_redis(self, items: List[Tuple[str, Dict[str, Any]]], queue_key: str,
+                                  skip_existing: bool) -> Optional[List[bool]]:
+        redis_client = await self._get_async_redis()
+        if not redis_client:
+            return None
+        unique_urls = list(dict.fromkeys(url for url, _ in items))
+        known = dedup_cache.filter_known(self.REDIS_URL_KEY, unique_urls)
+        seen = {url for url, flag in zip(unique_urls, known) if flag}
+        unknown_urls = [url for url in unique_urls if url not in seen]
+        flags = await redis_client.smismember(self.REDIS_URL_KEY, unknown_urls) if unknown_urls else []
+        seen.update(url for url, flag in zip(unknown_urls, flags) if flag)
+        new_urls = [url for url in unique_urls if url not in seen]
+
+        results = []
+        for url, _ in items:
+            results.append(url in seen)
+            seen.add(url)
+
+        async with redis_client.pipeline(transaction=False) as pipe:
+            if new_urls:
+                pipe.sadd(self.REDIS_URL_KEY, *new_urls)
+                pipe.sadd(self.REDIS_RECOMMENDATION_KEY, *new_urls)
+            queued = [data for (_, data), exists in zip(items, results) if not (skip_existing and exists)]
+            if queued:
+                pipe.rpush(queue_key, *[self._encode(data) for data in queued])
+            await pipe.execute()
+        dedup_cache.add(self.REDIS_URL_KEY, unknown_urls)
+        dedup_cache.add(self.REDIS_RECOMMENDATION_KEY, new_urls)
+        return results
+
+    async def submit_batch_async(self, items: List[Tuple[str, Dict[str, Any]]], lane: Optional[str] = None,
+                                 skip_existing: bool = False, spool: bool = True) -> Optional[List[bool]]:
+        """批量提交数据到指定优先级通道，返回每条数据的URL此前是否已存在
+
+        本地去重缓存之外的URL用一次SMISMEMBER判断，再用一个pipeline写入新URL并把全部数据推入队列，
+        整批最多两次往返。同一批中重复出现的URL，第二次起视为已存在。
+        skip_existing为True时URL已存在的数据不入队。
+        Redis不可用或超时时整批写入本地spool并全部返回False；spool为False（回放spool时）
+        或spool也写入失败时返回None。
+        """
+        lane = self.resolve_lane(lane)
+        queue_key = self.LANE_KEYS[lane]
+        if not spool:
+            return await self._submit_batch_redis(items, queue_key, skip_existing)
+        try:
+            results = await self._with_timeout(self._submit_batch_redis(items, queue_key, skip_existing), len(items))
+            if results is not None:
+                return results
+        except Exception as e:
+            print(f"批量提交数据到Redis失败，写入本地spool: {str(e)}")
+        if await local_spool.append_async(items, lane, skip_existing):
+            return [False] * len(items)
+        return None
+
+    async def url_exists_async(self, url: str) -> bool:
+        """检查URL是否已存在于缓存中（async接口使用，先查本地去重缓存）"""
+        if dedup_cache.contains(self.REDIS_URL_KEY, url):
+            return True
+        try:
+            redis_client = await self._get_async_redis()
+            if redis_client:
+                exists = bool(await redis_client.sismember(self.REDIS_URL_KEY, url))
+                if exists:
+                    dedup_cache.add(self.REDIS_URL_KEY, [url])
+                return exists
+            return False
+        except Exception as e:
+            print(f"检查URL存在性失败: {str(e)}")
+            return False
+
+    async def get_lane_sizes_async(self) -> Dict[str, int]:
+        """一次往返获取各通道队列长度（async接口使用）"""
+        redis_client = await self._get_async_redis()
+        if not redis_client:
+            return {lane: 0 for lane in self.LANES}
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for key in self.LANE_KEYS.values():
+                pipe.llen(key)
+            return dict(zip(self.LANES, await pipe.execute()))
+
+    async def get_status_async(self) -> Dict[str, Any]:
+        """一次往返获取各通道队列长度和URL数量"""
+        try:
+            redis_client = await self._get_async_redis()
+            if redis_client:
+                async with redis_client.pipeline(transaction=False) as pipe:
+                    for key in self.LANE_KEYS.values():
+                        pipe.llen(key)
+                    *sizes, url_count = await pipe.scard(self.REDIS_URL_KEY).execute()
+                lanes = dict(zip(self.LANES, sizes))
+                return {"queue_size": sum(sizes), "url_count": url_count, "lanes": lanes}
+        except Exception as e:
+            print(f"获取队列状态失败: {str(e)}")
+        return {"queue_size": 0, "url_count": 0, "lanes": {lane: 0 for lane in self.LANES}}
+
+    async def get_urls_async(self, count: Optional[int] = None) -> Dict[str, Any]:
+        """获取URL（全部或随机count个）和URL总数
+
+        获取全部URL时用SSCAN分批读取，不会像SMEMBERS那样在大集合上长时间阻塞Redis；
+        集合很大时应使用 scan_urls_async / iter_urls_async 分页或流式读取。
+        """
+        try:
+            redis_client = await self._get_async_redis()
+            if redis_client:
+                if count is None:
+                    urls = [url async for url in self.iter_urls_async()]
+                    return {"urls": urls, "total": await redis_client.scard(self.REDIS_URL_KEY)}
+                async with redis_client.pipeline(transaction=False) as pipe:
+                    urls, total = await pipe.srandmember(self.REDIS_URL_KEY, count).scard(self.REDIS_URL_KEY).execute()
+                return {"urls": list(urls), "total": total}
+        except Exception as e:
+            print(f"获取URL失败: {str(e)}")
+        return {"urls": [], "total": 0}
+
+    async def scan_urls_async(self, cursor: int = 0, page_size: int = 1000) -> Optional[Tuple[int, List[str]]]:
+        """SSCAN读取一页URL，返回 (下一页游标, URL列表)，游标为0表示已读完；Redis不可用时返回None
+
+        page_size只是SSCAN的COUNT提示，实际条数可能略有出入；遍历期间集合发生rehash时个别URL可能重复出现。
+        """
+        redis_client = await self._get_async_redis()
+        if not redis_client:
+            return None
+        next_cursor, urls = await redis_client.sscan(self.REDIS_URL_KEY, cursor=cursor, count=page_size)
+        return int(next_cursor), list(urls)
+
+    async def iter_urls_async(self, cursor: int = 0, page_size: int = 1000) -> AsyncIterator[str]:
+        """从cursor开始逐页SSCAN，逐条产出URL"""
+        while True:
+            page = await self.scan_urls_async(cursor, page_size)
+            if page is None:
+                return
+            cursor, urls = page
+            for url in urls:
+                yield url
+            if cursor == 0:
+                return
+
+    @staticmethod
+    def _build_records(data: Dict[str, Any], raw_data_id: Optional[int] = None) -> Tuple[RawData, List[Any]]:
+        """根据一条队列数据构造raw_data记录和评论分表记录
+
+        评论通过raw_data_id关联raw_data记录的ID（导出、查询都按该ID取评论），
+        新记录的ID在flush后才知道，raw_data_id为None时由 _add_records 写入。
+        """
+        # 提取年月信息
+        publish_time = data.get('publish_time', '')
+        year = data.get('year', datetime.now().year)
+
+        # 解析年月
+        if publish_time:
+            try:
+                dt = datetime.strptime(publish_time, '%Y-%m-%d')
+                year = dt.year
+                month = dt.month
+            except:
                 month = 1
-            print(f"入库year: {year}, month: {month}")
-            
-            # 获取RawData表的长度+1作为task_id
-            raw_data_count = db.query(RawData).count()
-            task_id = raw_data_count + 1
-            print(f"入库task_id: {task_id}")
-            # 创建raw_data记录
-            raw_data = RawData(
-                title=data.get('title'),
-                content=data.get('content'),
-                publish_time=publish_time,
-                answer_url=data.get('url'),
-                author=data.get('author'),
-                author_url=data.get('author_url'),
-                author_field=data.get('author_field'),
-                author_cert=data.get('author_cert'),
-                author_fans=data.get('author_fans'),
+        else:
+            month = 1
+
+        # 创建raw_data记录
+        raw_data = RawData(
+            title=data.get('title'),
+            content=data.get('content'),
+            publish_time=publish_time,
+            answer_url=data.get('url'),
+            author=data.get('author'),
+            author_url=data.get('author_url'),
+            author_field=data.get('author_field'),
+            author_cert=data.get('author_cert'),
+            author_fans=data.get('author_fans'),
+            year=year,
+            task_id=raw_data_id or 0
+        )
+
+        # 获取对应的评论分表模型
+        comment_model = CommentDataFactory.get_model(year, month)
+
+        # 评论数据（提交时未带评论的数据该字段为None）
+        comments = [
+            comment_model(
+                author=comment.get('author'),
+                author_url=comment.get('author_url'),
+                content=comment.get('content'),
+                like_count=comment.get('like_count'),
+                time=comment.get('time'),
+                raw_data_id=raw_data_id or 0,
                 year=year,
-                task_id=task_id
+                month=month
             )
+            for comment in data.get('comments_structured') or []
+        ]
+        return raw_data, comments
 
-            db.add(raw_data)
-            db.flush()  # 获取ID但不提交
-
-            # 获取对应的评论分表模型
-            comment_model = CommentDataFactory.get_model(year, month)
-
-            # 保存评论数据
-            comments = data.get('comments_structured', [])
-            for comment in comments:
-                comment_record = comment_model(
-                    author=comment.get('author'),
-                    author_url=comment.get('author_url'),
-                    content=comment.get('content'),
-                    like_count=comment.get('like_count'),
-                    time=comment.get('time'),
-                    raw_data_id=task_id,
-                    year=year,
-                    month=month
-                )
-                db.add(comment_record)
+    def _add_records(self, data: Dict[str, Any], db: Session) -> RawData:
+        """写入一条raw_data记录及其评论（不提交）
 
+        先flush取得记录ID，task_id和评论的raw_data_id都使用该ID，
+        批量写入中某条数据失败被剔除时，后续数据与评论的关联也不会错位。
+        """
+        raw_data, comments = self._build_records(data)
+        db.add(raw_data)
+        db.flush()  # 获取ID但不提交
+        raw_data.task_id = raw_data.id
+        for comment in comments:
+            comment.raw_data_id = raw_data.id
+        db.add_all(comments)
+        return raw_data
+
+    def save_to_database(self, data: Dict[str, Any], db: Session) -> Optional[int]:
+        """将数据保存到数据库（raw_data和comment_data子表）"""
+        try:
+            raw_data = self._add_records(data, db)
+            print(f"入库task_id: {raw_data.task_id}")
             db.commit()
             return raw_data.id
         except Exception as e:
@@ -189,34 +517,246 @@ class QACrawlerService:
             print(f"保存数据到数据库失败: {str(e)}")
             return None
 
-    def get_urls(self, count: Optional[int] = None) -> List[str]:
-        """从Redis缓存中获取URL
-        
-        Args:
-            count: 要获取的URL数量，如果为None则获取所有URL
-        
-        Returns:
-            URL列表
+    @staticmethod
+    def _existing_urls(urls, db: Session) -> Dict[str, int]:
+        """查询已入库的回答链接，返回 {answer_url: raw_data.id}"""
+        urls = list(urls)
+        existing: Dict[str, int] = {}
+        for start in range(0, len(urls), 500):
+            chunk = urls[start:start + 500]
+            existing.update(db.query(RawData.answer_url, RawData.id).filter(RawData.answer_url.in_(chunk)).all())
+        return existing
+
+    def _insert_batch(self, items: List[Dict[str, Any]],
+                      db: Session) -> Tuple[List[Tuple[Dict[str, Any], str]], List[Dict[str, Any]]]:
+        """整批写入并提交，失败时二分重试以隔离出坏数据
+
+        返回 (写入失败的 (数据, 错误), 因回答链接已被其他进程写入而冲突的数据)。
+        正常数据仍按整批（或尽量大的子批）提交，只有坏数据所在的分支会被逐步拆小。
         """
+        if not items:
+            return [], []
+        try:
+            for data in items:
+                self._add_records(data, db)
+            db.commit()
+            return [], []
+        except Exception as e:
+            db.rollback()
+            if len(items) == 1:
+                # 唯一约束冲突且回答链接已存在：其他进程刚写入同一URL，按重复数据处理
+                if isinstance(e, IntegrityError) and self._existing_urls([items[0].get('url')], db):
+                    return [], items
+                return [(items[0], str(e)[:500])], []
+            middle = len(items) // 2
+            left_failures, left_conflicts = self._insert_batch(items[:middle], db)
+            right_failures, right_conflicts = self._insert_batch(items[middle:], db)
+            return left_failures + right_failures, left_conflicts + right_conflicts
+
+    # 重抓时用新数据覆盖的raw_data字段（新数据中为None的字段保留原值）
+    UPDATABLE_FIELDS = ('title', 'content', 'author', 'author_url', 'author_field', 'author_cert', 'author_fans')
+
+    def _apply_update(self, data: Dict[str, Any], db: Session):
+        """把一条重抓数据合并到已入库的raw_data记录：覆盖内容字段，按(作者, 内容)合并评论"""
+        row = db.query(RawData).filter(RawData.answer_url == data.get('url')).first()
+        if row is None:
+            raise ValueError(f"回答链接不存在: {data.get('url')}")
+        for field in self.UPDATABLE_FIELDS:
+            if data.get(field) is not None:
+                setattr(row, field, data[field])
+        if data.get('comments_structured') is None:
+            return
+        # 评论写入原记录所在的年月分表，与新增数据一样以raw_data记录ID关联
+        _, comments = self._build_records(dict(data, publish_time=row.publish_time, year=row.year), raw_data_id=row.id)
+        if not comments:
+            return
+        comment_model = type(comments[0])
+        existing = {
+            (comment.author, comment.content): comment
+            for comment in db.query(comment_model).filter(comment_model.raw_data_id == row.id).all()
+        }
+        for comment in comments:
+            current = existing.get((comment.author, comment.content))
+            if current is None:
+                db.add(comment)
+                existing[(comment.author, comment.content)] = comment
+            else:
+                current.like_count = comment.like_count
+                current.time = comment.time
+                current.author_url = comment.author_url
+        # 同一批中同一URL可能再次出现，先flush使后续查询能看到新增的评论
+        db.flush()
+
+    def _update_batch(self, items: List[Dict[str, Any]], db: Session) -> List[Tuple[Dict[str, Any], str]]:
+        """整批合并重抓数据并提交，失败时逐条重试，返回合并失败的 (数据, 错误)"""
+        if not items:
+            return []
+        try:
+            for data in items:
+                self._apply_update(data, db)
+            db.commit()
+            return []
+        except Exception:
+            db.rollback()
+        failures = []
+        for data in items:
+            try:
+                self._apply_update(data, db)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                failures.append((data, str(e)[:500]))
+        return failures
+
+    def save_batch(self, items: List[Dict[str, Any]], db: Session) -> Dict[str, int]:
+        """批量入库
+
+        新回答链接的数据插入raw_data；回答链接已入库（或在同一批中重复出现）的数据是重抓结果，
+        合并到已有记录（更新内容、合并评论），不再触发唯一约束冲突。
+        写入失败的数据移入死信队列。
+        """
+        existing = self._existing_urls({data.get('url') for data in items if data.get('url')}, db)
+        seen = set(existing)
+        new_items: List[Dict[str, Any]] = []
+        duplicates: List[Dict[str, Any]] = []
+        for data in items:
+            url = data.get('url')
+            if url in seen:
+                duplicates.append(data)
+                continue
+            if url:
+                seen.add(url)
+            new_items.append(data)
+
+        failures, conflicts = self._insert_batch(new_items, db)
+        duplicates.extend(conflicts)
+        update_failures = self._update_batch(duplicates, db)
+        failures += update_failures
+        for data, error in failures:
+            print(f"保存数据到数据库失败，移入死信队列: {error}")
+        self.add_to_dead_letter(failures)
+        return {
+            "processed": len(new_items) - len(failures) + len(update_failures) - len(conflicts),
+            "updated": len(duplicates) - len(update_failures),
+            "failed": len(failures)
+        }
+
+    def add_to_dead_letter(self, failures: List[Tuple[Dict[str, Any], str]]) -> int:
+        """把入库失败的数据连同错误和尝试次数写入死信队列（超过 QA_DEAD_LETTER_MAX 条时丢弃最早的）"""
+        if not failures:
+            return 0
+        entries = []
+        for data, error in failures:
+            data = dict(data)
+            data.pop('_enqueued_at', None)
+            attempts = data.pop('_attempts', 0) + 1
+            entries.append(queue_codec.encode({
+                "data": data, "error": error, "attempts": attempts, "failed_at": datetime.now().isoformat()
+            }))
+        return self._push_dead_entries(entries)
+
+    def add_raw_to_dead_letter(self, items: List[Tuple[bytes, str]], attempts: int = 1) -> int:
+        """把无法解码的队列数据原样（base64）连同错误写入死信队列
+
+        例如其他节点用msgpack/zstd编码、本节点未安装对应库的数据，安装后重放即可恢复。
+        """
+        if not items:
+            return 0
+        return self._push_dead_entries([
+            queue_codec.encode({
+                "raw": base64.b64encode(raw).decode("ascii"), "error": error,
+                "attempts": attempts, "failed_at": datetime.now().isoformat()
+            })
+            for raw, error in items
+        ])
+
+    def _push_dead_entries(self, entries: List[bytes]) -> int:
+        if not entries:
+            return 0
         try:
             redis_client = self._get_redis()
             if redis_client:
-                if count is None:
-                    # 获取所有URL
-                    return list(redis_client.smembers(self.REDIS_URL_KEY))
-                else:
-                    # 随机获取指定数量的URL
-                    return list(redis_client.srandmember(self.REDIS_URL_KEY, count))
-            return []
+                pipe = redis_client.pipeline(transaction=True)
+                pipe.rpush(self.REDIS_DEAD_KEY, *entries).ltrim(self.REDIS_DEAD_KEY, -settings.QA_DEAD_LETTER_MAX, -1)
+                pipe.execute()
+                return len(entries)
         except Exception as e:
-            print(f"获取URL失败: {str(e)}")
+            print(f"写入死信队列失败: {str(e)}")
+        return 0
+
+    def _pop_dead_letters(self, count: int) -> List[Dict[str, Any]]:
+        redis_client = get_binary_redis()
+        if not redis_client:
             return []
+        pipe = redis_client.pipeline(transaction=True)
+        items, _ = pipe.lrange(self.REDIS_DEAD_KEY, 0, count - 1).ltrim(self.REDIS_DEAD_KEY, count, -1).execute()
+        entries = []
+        undecodable = []
+        for item in items:
+            try:
+                entries.append(queue_codec.decode(item))
+            except Exception as e:
+                print(f"解码死信数据失败，放回死信队列: {str(e)}")
+                undecodable.append(item)
+        if undecodable:
+            redis_client.rpush(self.REDIS_DEAD_KEY, *undecodable)
+        return entries
+
+    def get_dead_letters(self, count: int = 20) -> Dict[str, Any]:
+        """查看死信队列头部的数据（不删除）"""
+        try:
+            redis_client = get_binary_redis()
+            if redis_client:
+                pipe = redis_client.pipeline(transaction=False)
+                items, total = pipe.lrange(self.REDIS_DEAD_KEY, 0, count - 1).llen(self.REDIS_DEAD_KEY).execute()
+                entries = []
+                for item in items:
+                    try:
+                        entries.append(queue_codec.decode(item, consume=False))
+                    except Exception as e:
+                        entries.append({"error": f"解码失败: {str(e)}"})
+                return {"total": total, "items": entries}
+        except Exception as e:
+            print(f"获取死信队列失败: {str(e)}")
+        return {"total": 0, "items": []}
+
+    def replay_dead_letters(self, db: Session, count: int = 100) -> Dict[str, int]:
+        """重新入库死信队列中的数据（修复问题后调用），仍然失败的数据以新的尝试次数放回死信队列"""
+        entries = self._pop_dead_letters(count)
+        items = []
+        for entry in entries:
+            data = entry.get("data") or {}
+            if "raw" in entry:
+                # 无法解码而原样保存的队列数据，重新尝试解码（如已安装对应的编码库）
+                raw = base64.b64decode(entry["raw"])
+                try:
+                    data = queue_codec.decode(raw)
+                    data.pop('_enqueued_at', None)
+                except Exception as e:
+                    self.add_raw_to_dead_letter([(raw, str(e)[:500])], entry.get("attempts", 0) + 1)
+                    continue
+            items.append(dict(data, _attempts=entry.get("attempts", 0)))
+        result = self.save_batch(items, db) if items else {"processed": 0, "updated": 0, "failed": 0}
+        return dict(result, replayed=len(items))
+
+    def clear_dead_letters(self) -> int:
+        """清空死信队列，返回删除的条数"""
+        try:
+            redis_client = self._get_redis()
+            if redis_client:
+                pipe = redis_client.pipeline(transaction=True)
+                total, _ = pipe.llen(self.REDIS_DEAD_KEY).delete(self.REDIS_DEAD_KEY).execute()
+                return total
+        except Exception as e:
+            print(f"清空死信队列失败: {str(e)}")
+        return 0
 
     def process_queue(self, db: Session, batch_size: int = 10) -> Dict[str, int]:
-        """处理队列中的数据，批量保存到数据库"""
+        """处理队列中的数据，批量保存到数据库（坏数据被隔离到死信队列）"""
         try:
             processed = 0
             failed = 0
+            updated = 0
 
             while True:
                 # 从队列获取一批数据
@@ -224,20 +764,21 @@ class QACrawlerService:
                 if not items:
                     break
 
-                for item in items:
-                    if self.save_to_database(item, db):
-                        processed += 1
-                    else:
-                        failed += 1
+                result = self.save_batch(items, db)
+                processed += result["processed"]
+                failed += result["failed"]
+                updated += result["updated"]
 
             return {
                 "processed": processed,
+                "updated": updated,
                 "failed": failed
             }
         except Exception as e:
             print(f"处理队列失败: {str(e)}")
             return {
                 "processed": 0,
+                "updated": 0,
                 "failed": 0
             }
 
@@ -0,0 +1,245 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+from app.utils.redis import get_async_redis
+from app.config import settings
+
+
+class _HostState:
+    """单个主机的本地令牌桶状态"""
+
+    __slots__ = ("tokens", "ts", "rate", "blocked_until")
+
+    def __init__(self, rate: float, capacity: float):
+        self.tokens = capacity
+        self.ts = time.time()
+        self.rate = rate
+        self.blocked_until = 0.0
+
+
+class HostRateLimiter:
+    """按主机的自适应限速器
+
+    每个主机一个令牌桶，节点内所有爬虫共享；Redis可用时令牌桶和速率保存在Redis中，
+    多个节点共享同一预算。速率按AIMD调整：请求成功且延迟正常时线性增加，
+    遇到429/5xx或延迟超标时按比例下降，并遵守Retry-After。
+    Redis使用异步客户端和EVALSHA，不阻塞爬虫所在的事件循环；Redis不可用时
+    RATE_LIMIT_REDIS_BACKOFF 秒内直接使用本地令牌桶，不再反复尝试连接。
+    """
+
+    REDIS_KEY_PREFIX = settings.REDIS_RATE_LIMIT_PREFIX
+
+    # 取令牌：返回需要等待的秒数（0表示已取到）
+    _ACQUIRE_SCRIPT = """
+    local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts', 'rate', 'blocked_until')
+    local now = tonumber(ARGV[3])
+    local capacity = tonumber(ARGV[2])
+    local rate = tonumber(data[3]) or tonumber(ARGV[1])
+    local blocked = tonumber(data[4]) or 0
+    if now < blocked then
+        return tostring(blocked - now)
+    end
+    local tokens = tonumber(data[1]) or capacity
+    local ts = tonumber(data[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    local wait = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        wait = (1 - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now), 'rate', tostring(rate))
+    redis.call('EXPIRE', KEYS[1], 3600)
+    return tostring(wait)
+    """
+
+    # 调整速率（AIMD）：ARGV = 默认速率, 是否成功, 加性增量, 乘性因子, 最小速率, 最大速率, 阻塞截止时间
+    _ADJUST_SCRIPT = """
+    local rate = tonumber(redis.call('HGET', KEYS[1], 'rate')) or tonumber(ARGV[1])
+    if ARGV[2] == '1' then
+        rate = math.min(tonumber(ARGV[6]), rate + tonumber(ARGV[3]))
+    else
+        rate = math.max(tonumber(ARGV[5]), rate * tonumber(ARGV[4]))
+    end
+    redis.call('HSET', KEYS[1], 'rate', tostring(rate))
+    local blocked = tonumber(ARGV[7])
+    if blocked > 0 then
+        local current = tonumber(redis.call('HGET', KEYS[1], 'blocked_until')) or 0
+        if blocked > current then
+            redis.call('HSET', KEYS[1], 'blocked_until', tostring(blocked))
+        end
+    end
+    redis.call('EXPIRE', KEYS[1], 3600)
+    return tostring(rate)
+    """
+
+    def __init__(self):
+        self.default_rate = settings.RATE_LIMIT_DEFAULT_RATE
+        self.capacity = settings.RATE_LIMIT_BURST
+        self.min_rate = settings.RATE_LIMIT_MIN_RATE
+        self.max_rate = settings.RATE_LIMIT_MAX_RATE
+        self.increase = settings.RATE_LIMIT_INCREASE
+        self.decrease = settings.RATE_LIMIT_DECREASE
+        self.latency_target = settings.RATE_LIMIT_LATENCY_TARGET
+        self._lock = threading.Lock()
+        self._local: Dict[str, _HostState] = {}
+        self._scripts = {}
+        self._redis_retry_at = 0.0  # Redis不可用时，在此时间之前不再尝试
+
+    @staticmethod
+    def host_of(url: str) -> str:
+        return urlsplit(url).netloc.lower() or url
+
+    async def _get_redis(self):
+        if not settings.RATE_LIMIT_SHARED or time.monotonic() < self._redis_retry_at:
+            return None
+        redis_client = await get_async_redis()
+        if redis_client is None:
+            self._redis_unavailable()
+        return redis_client
+
+    def _redis_unavailable(self):
+        """Redis不可用，退避一段时间内只使用本地限速"""
+        self._redis_retry_at = time.monotonic() + settings.RATE_LIMIT_REDIS_BACKOFF
+
+    async def _run_script(self, name: str, host: str, *args) -> Optional[float]:
+        """在Redis中执行限速脚本，Redis不可用时返回None"""
+        redis_client = await self._get_redis()
+        if not redis_client:
+            return None
+        try:
+            if name not in self._scripts:
+                self._scripts[name] = redis_client.register_script(getattr(self, name))
+            result = await self._scripts[name](keys=[self.REDIS_KEY_PREFIX + host], args=list(args), client=redis_client)
+            return float(result)
+        except Exception as e:
+            self._redis_unavailable()
+            print(f"Redis限速失败，{settings.RATE_LIMIT_REDIS_BACKOFF}秒内使用本地限速: {str(e)}")
+            return None
+
+    async def _try_acquire(self, host: str) -> float:
+        """尝试取一个令牌，返回需要等待的秒数"""
+        now = time.time()
+        wait = await self._run_script("_ACQUIRE_SCRIPT", host, self.default_rate, self.capacity, now)
+        if wait is not None:
+            return wait
+
+        with self._lock:
+            state = self._local.get(host)
+            if state is None:
+                state = self._local[host] = _HostState(self.default_rate, self.capacity)
+            if now < state.blocked_until:
+                return state.blocked_until - now
+            state.tokens = min(self.capacity, state.tokens + max(0.0, now - state.ts) * state.rate)
+            state.ts = now
+            if state.tokens >= 1:
+                state.tokens -= 1
+                return 0.0
+            return (1 - state.tokens) / state.rate
+
+    async def acquire(self, url: str, stop_event: Optional[asyncio.Event] = None) -> bool:
+        """等待直到该主机允许发出下一个请求；stop_event被设置时提前返回False"""
+        if not settings.RATE_LIMIT_ENABLED:
+            return True
+        host = self.host_of(url)
+        while True:
+            wait = await self._try_acquire(host)
+            if wait <= 0:
+                return True
+            if stop_event is not None:
+                try:
+                    await asyncio.wait_for(stop_event.wait(), timeout=wait)
+                    return False
+                except asyncio.TimeoutError:
+                    continue
+            await asyncio.sleep(wait)
+
+    async def record(self, url: str, status_code: Optional[int] = None, latency: Optional[float] = None,
+                     retry_after: Optional[float] = None) -> float:
+        """记录请求结果并按AIMD调整该主机的速率，返回调整后的速率"""
+        if not settings.RATE_LIMIT_ENABLED:
+            return self.default_rate
+        host = self.host_of(url)
+        throttled = status_code is not None and (status_code == 429 or status_code >= 500)
+        slow = latency is not None and latency > self.latency_target
+        success = status_code is not None and not throttled and not slow
+        blocked_until = time.time() + retry_after if retry_after else 0
+
+        rate = await self._run_script(
+            "_ADJUST_SCRIPT", host, self.default_rate, "1" if success else "0", self.increase, self.decrease,
+            self.min_rate, self.max_rate, blocked_until
+        )
+        if rate is not None:
+            return rate
+
+        with self._lock:
+            state = self._local.get(host)
+            if state is None:
+                state = self._local[host] = _HostState(self.default_rate, self.capacity)
+            if success:
+                state.rate = min(self.max_rate, state.rate + self.increase)
+            else:
+                state.rate = max(self.min_rate, state.rate * self.decrease)
+            state.blocked_until = max(state.blocked_until, blocked_until)
+            return state.rate
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """获取本地各主机的限速状态"""
+        with self._lock:
+            return {
+                host: {"rate": state.rate, "tokens": state.tokens, "blocked_until": state.blocked_until}
+                for host, state in self._local.items()
+            }
+
+
+class WindowScheduler:
+    """运行时间窗口调度
+
+    爬虫只能在 [start, end) 小时内运行（end < start 表示跨午夜）。
+    窗口外直接睡到下一个窗口开始，而不是按间隔反复醒来检查；
+    窗口内按间隔排下一次运行，若会落到窗口外则改排到下一个窗口开始，
+    使抓取集中在允许的时间内。
+    """
+
+    @staticmethod
+    def in_window(time_range: Tuple[int, int], now: Optional[datetime] = None) -> bool:
+        now = now or datetime.now()
+        start, end = time_range
+        if start == end or (start == 0 and end >= 24):
+            return True
+        if start < end:
+            return start <= now.hour < end
+        return now.hour >= start or now.hour < end
+
+    @classmethod
+    def next_window_start(cls, time_range: Tuple[int, int], now: Optional[datetime] = None) -> datetime:
+        """下一个窗口开始时间；已在窗口内时返回now"""
+        now = now or datetime.now()
+        if cls.in_window(time_range, now):
+            return now
+        start = now.replace(hour=time_range[0] % 24, minute=0, second=0, microsecond=0)
+        if start <= now:
+            start += timedelta(days=1)
+        return start
+
+    @classmethod
+    def seconds_until_window(cls, time_range: Tuple[int, int], now: Optional[datetime] = None) -> float:
+        now = now or datetime.now()
+        return max(0.0, (cls.next_window_start(time_range, now) - now).total_seconds())
+
+    @classmethod
+    def next_delay(cls, interval: float, time_range: Tuple[int, int], now: Optional[datetime] = None) -> float:
+        """距离下一次运行的秒数"""
+        now = now or datetime.now()
+        candidate = now + timedelta(seconds=interval)
+        if cls.in_window(time_range, candidate):
+            return interval
+        return (cls.next_window_start(time_range, candidate) - now).total_seconds()
+
+
+# 创建全局限速器实例（节点内所有爬虫共享）
+host_rate_limiter = HostRateLimiter()
+window_scheduler = WindowScheduler()
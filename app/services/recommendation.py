@@ -1,8 +1,9 @@
 from sqlalchemy.orm import Session
-from app.utils.redis import get_redis
+from app.utils.redis import get_redis, get_async_redis
+from app.utils.dedup_cache import dedup_cache
 from app.models.raw_data import RawData
 from app.config import settings
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 class RecommendationService:
     """推荐页URL服务"""
@@ -24,6 +25,7 @@ class RecommendationService:
             redis_client = self._get_redis()
             if redis_client:
                 redis_client.delete(self.REDIS_KEY)
+                dedup_cache.invalidate(self.REDIS_KEY)
                 return True
             return False
         except Exception as e:
@@ -80,11 +82,51 @@ class RecommendationService:
             return []
 
     def add_url(self, url: str) -> bool:
-        """添加URL到推荐页URL缓存"""
+        """添加URL到推荐页URL缓存（本地去重缓存已确认存在时跳过）"""
+        if dedup_cache.contains(self.REDIS_KEY, url):
+            return True
         try:
             redis_client = self._get_redis()
             if redis_client:
                 redis_client.sadd(self.REDIS_KEY, url)
+                dedup_cache.add(self.REDIS_KEY, [url])
+                return True
+            return False
+        except Exception as e:
+            print(f"添加URL到缓存失败: {str(e)}")
+            return False
+
+    async def get_url_count_async(self) -> int:
+        """获取Redis中缓存的URL数量（async接口使用）"""
+        try:
+            redis_client = await get_async_redis()
+            if redis_client:
+                return await redis_client.scard(self.REDIS_KEY)
+            return 0
+        except Exception as e:
+            print(f"获取URL数量失败: {str(e)}")
+            return 0
+
+    async def get_random_urls_async(self, count: int = 10) -> List[str]:
+        """从Redis缓存中随机获取指定数量的URL（async接口使用）"""
+        try:
+            redis_client = await get_async_redis()
+            if redis_client:
+                return await redis_client.srandmember(self.REDIS_KEY, count)
+            return []
+        except Exception as e:
+            print(f"获取随机URL失败: {str(e)}")
+            return []
+
+    async def add_url_async(self, url: str) -> bool:
+        """添加URL到推荐页URL缓存（async接口使用，本地去重缓存已确认存在时跳过）"""
+        if dedup_cache.contains(self.REDIS_KEY, url):
+            return True
+        try:
+            redis_client = await get_async_redis()
+            if redis_client:
+                await redis_client.sadd(self.REDIS_KEY, url)
+                dedup_cache.add(self.REDIS_KEY, [url])
                 return True
             return False
         except Exception as e:
@@ -0,0 +1,211 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from starlette.concurrency import run_in_threadpool
+from app.utils.metrics import QA_SPOOL_DEPTH, QA_SPOOL_ITEMS
+from app.config import settings
+
+_SPOOLED = QA_SPOOL_ITEMS.labels("spooled")
+_REPLAYED = QA_SPOOL_ITEMS.labels("replayed")
+
+
+class LocalSpool:
+    """QA数据提交的本地写前日志（SQLite）
+
+    Redis不可用或写入超过 SPOOL_REDIS_TIMEOUT 秒时，提交的数据先追加到本地SQLite文件
+    （WAL模式，进程崩溃不丢数据），接口照常返回成功；后台回放协程每 SPOOL_REPLAY_INTERVAL 秒
+    检查一次，Redis恢复后按提交顺序分批写回Redis（判重、写URL集合、推入原优先级通道），
+    写入成功的批次才从spool删除。Redis写入超时但实际已执行时数据可能重复入队（至少一次）。
+    """
+
+    def __init__(self):
+        self.path = settings.SPOOL_PATH
+        self.max_items = settings.SPOOL_MAX_ITEMS
+        self.batch_size = settings.SPOOL_REPLAY_BATCH
+        self.interval = settings.SPOOL_REPLAY_INTERVAL
+        self.running = False
+        self.task = None
+        self.last_replay = None  # 最近一次成功回放的时间
+        self.last_error = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS spool ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT NOT NULL, lane TEXT NOT NULL, "
+                "skip_existing INTEGER NOT NULL DEFAULT 0, payload BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._count = conn.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _encode(data: Dict[str, Any]) -> bytes:
+        return zlib.compress(json.dumps(data, ensure_ascii=False, default=str).encode("utf-8"))
+
+    @staticmethod
+    def _decode(payload: bytes) -> Dict[str, Any]:
+        return json.loads(zlib.decompress(payload))
+
+    def append(self, items: Sequence[Tuple[str, Dict[str, Any]]], lane: str, skip_existing: bool = False) -> bool:
+        """追加一批数据，spool已满时返回False"""
+        if not items:
+            return True
+        now = time.time()
+        rows = [
+            (url, lane, int(skip_existing), self._encode(dict(data, _enqueued_at=data.get('_enqueued_at', now))), now)
+            for url, data in items
+        ]
+        with self._lock:
+            conn = self._connect()
+            if self._count + len(rows) > self.max_items:
+                print(f"本地spool已满（{self._count} 条），丢弃 {len(rows)} 条数据")
+                return False
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT INTO spool (url, lane, skip_existing, payload, created_at) VALUES (?, ?, ?, ?, ?)", rows
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            self._count += len(rows)
+        _SPOOLED.inc(len(rows))
+        return True
+
+    async def append_async(self, items: Sequence[Tuple[str, Dict[str, Any]]], lane: str,
+                           skip_existing: bool = False) -> bool:
+        """在线程池中追加（async接口使用），写入失败时返回False"""
+        try:
+            return await run_in_threadpool(self.append, items, lane, skip_existing)
+        except Exception as e:
+            print(f"写入本地spool失败: {str(e)}")
+            return False
+
+    def size(self) -> int:
+        """spool中待回放的条数"""
+        with self._lock:
+            self._connect()
+            return self._count
+
+    def _read_batch(self, limit: int) -> List[Tuple[int, str, str, int, bytes]]:
+        with self._lock:
+            return self._connect().execute(
+                "SELECT id, url, lane, skip_existing, payload FROM spool ORDER BY id LIMIT ?", (limit,)
+            ).fetchall()
+
+    def _delete(self, ids: List[int]):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                conn.execute(f"DELETE FROM spool WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+            conn.execute("COMMIT")
+            self._count = max(self._count - len(ids), 0)
+
+    async def replay_once(self) -> int:
+        """回放一批数据到Redis，返回回放的条数；Redis仍不可用时抛出异常"""
+        from app.services.qa_crawler import qa_crawler_service
+
+        rows = await run_in_threadpool(self._read_batch, self.batch_size)
+        if not rows:
+            return 0
+        # 按连续的 (通道, 是否跳过已存在) 分组，保持提交顺序
+        groups: List[Tuple[Tuple[str, int], List[int], List[Tuple[str, Dict[str, Any]]]]] = []
+        for row_id, url, lane, skip_existing, payload in rows:
+            if not groups or groups[-1][0] != (lane, skip_existing):
+                groups.append(((lane, skip_existing), [], []))
+            try:
+                data = self._decode(payload)
+            except Exception as e:
+                print(f"解码spool数据失败，已丢弃: {str(e)}")
+                groups[-1][1].append(row_id)
+                continue
+            groups[-1][1].append(row_id)
+            groups[-1][2].append((url, data))
+
+        replayed_ids: List[int] = []
+        try:
+            for (lane, skip_existing), ids, items in groups:
+                if items:
+                    lane = lane if lane in qa_crawler_service.LANES else None
+                    result = await qa_crawler_service.submit_batch_async(
+                        items, lane, skip_existing=bool(skip_existing), spool=False
+                    )
+                    if result is None:
+                        raise ConnectionError("Redis不可用")
+                replayed_ids.extend(ids)
+        finally:
+            if replayed_ids:
+                await run_in_threadpool(self._delete, replayed_ids)
+                _REPLAYED.inc(len(replayed_ids))
+        return len(replayed_ids)
+
+    async def start(self):
+        """启动后台回放"""
+        if self.running:
+            return
+        self.running = True
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止后台回放"""
+        self.running = False
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while self.running:
+            try:
+                if self.size() > 0:
+                    replayed = 0
+                    while self.running:
+                        count = await self.replay_once()
+                        if not count:
+                            break
+                        replayed += count
+                    if replayed:
+                        print(f"本地spool回放完成: {replayed} 条")
+                    self.last_replay = time.time()
+                    self.last_error = None
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"本地spool回放失败，稍后重试: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    def get_status(self) -> Dict[str, Any]:
+        """spool状态"""
+        return {
+            "pending": self.size(),
+            "max_items": self.max_items,
+            "replayer_running": self.running and self.task is not None and not self.task.done(),
+            "last_replay": self.last_replay,
+            "last_error": self.last_error,
+        }
+
+
+# 创建本地spool实例
+local_spool = LocalSpool()
+QA_SPOOL_DEPTH.set_function(local_spool.size)
@@ -0,0 +1,228 @@
+import json
+import os
+import socket
+import time
+from typing import Any, Dict, List, Optional
+from app.utils.redis import get_redis
+from app.config import settings
+
+
+class TaskDispatcher:
+    """爬虫任务调度服务
+
+    API 将任务投递到 Redis 队列，独立的 crawler-worker 进程领取任务，
+    通过带过期时间的租约和心跳声明所有权，并把进度写回 Redis 注册表。
+    租约过期（worker 崩溃）的任务会被重新投递。
+    """
+
+    # Redis键定义（从config.py统一管理）
+    REDIS_JOBS_KEY = settings.REDIS_CRAWLER_JOBS_KEY  # 待领取任务队列
+    REDIS_REGISTRY_KEY = settings.REDIS_CRAWLER_REGISTRY_KEY  # 任务注册表
+    REDIS_LEASE_PREFIX = settings.REDIS_CRAWLER_LEASE_PREFIX  # 租约键前缀
+    REDIS_STOP_PREFIX = settings.REDIS_CRAWLER_STOP_PREFIX  # 停止请求键前缀
+
+    # 只有持有者才能续约/释放租约
+    _RENEW_SCRIPT = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('EXPIRE', KEYS[1], ARGV[2])
+    end
+    return 0
+    """
+    _RELEASE_SCRIPT = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('DEL', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self):
+        self.redis_client = None
+        self.lease_ttl = settings.CRAWLER_LEASE_TTL
+
+    def _get_redis(self):
+        """获取Redis客户端"""
+        if self.redis_client is None:
+            self.redis_client = get_redis()
+        return self.redis_client
+
+    @staticmethod
+    def _task_key(kind: str, task_id: int) -> str:
+        return f"{kind}:{task_id}"
+
+    def _lease_key(self, kind: str, task_id: int) -> str:
+        return f"{self.REDIS_LEASE_PREFIX}{self._task_key(kind, task_id)}"
+
+    def _stop_key(self, kind: str, task_id: int) -> str:
+        return f"{self.REDIS_STOP_PREFIX}{self._task_key(kind, task_id)}"
+
+    @staticmethod
+    def make_worker_id() -> str:
+        """生成worker标识：主机名:进程号"""
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def _update_entry(self, kind: str, task_id: int, **fields) -> Dict[str, Any]:
+        """更新注册表条目"""
+        redis_client = self._get_redis()
+        key = self._task_key(kind, task_id)
+        raw = redis_client.hget(self.REDIS_REGISTRY_KEY, key)
+        entry = json.loads(raw) if raw else {"kind": kind, "task_id": task_id}
+        entry.update(fields)
+        entry["updated_at"] = time.time()
+        redis_client.hset(self.REDIS_REGISTRY_KEY, key, json.dumps(entry, ensure_ascii=False))
+        return entry
+
+    def enqueue(self, kind: str, task_id: int, params: Optional[Dict[str, Any]] = None) -> bool:
+        """投递任务到调度队列"""
+        try:
+            redis_client = self._get_redis()
+            if not redis_client:
+                return False
+            job = {"kind": kind, "task_id": task_id, "params": params or {}, "enqueued_at": time.time()}
+            redis_client.delete(self._stop_key(kind, task_id))
+            self._update_entry(kind, task_id, status="queued", worker=None, job=job)
+            redis_client.rpush(self.REDIS_JOBS_KEY, json.dumps(job, ensure_ascii=False))
+            return True
+        except Exception as e:
+            print(f"投递任务失败: {str(e)}")
+            return False
+
+    def claim(self, worker_id: str, timeout: int = 5) -> Optional[Dict[str, Any]]:
+        """领取一个任务并获取租约，队列为空时阻塞最多timeout秒"""
+        try:
+            redis_client = self._get_redis()
+            if not redis_client:
+                time.sleep(timeout)
+                return None
+            item = redis_client.blpop(self.REDIS_JOBS_KEY, timeout=timeout)
+            if not item:
+                return None
+            job = json.loads(item[1])
+            kind, task_id = job["kind"], job["task_id"]
+            # 已有其他worker持有租约（重复投递），丢弃
+            if not redis_client.set(self._lease_key(kind, task_id), worker_id, nx=True, ex=self.lease_ttl):
+                print(f"任务 {task_id} 已被其他worker持有，跳过")
+                return None
+            # 领取前已被请求停止
+            if redis_client.exists(self._stop_key(kind, task_id)):
+                self.release(worker_id, kind, task_id, status="stopped")
+                return None
+            self._update_entry(kind, task_id, status="running", worker=worker_id, heartbeat=time.time())
+            return job
+        except Exception as e:
+            print(f"领取任务失败: {str(e)}")
+            return None
+
+    def renew(self, worker_id: str, kind: str, task_id: int, **progress) -> bool:
+        """续约并上报进度（心跳）"""
+        try:
+            redis_client = self._get_redis()
+            renewed = redis_client.eval(self._RENEW_SCRIPT, 1, self._lease_key(kind, task_id), worker_id, self.lease_ttl)
+            if renewed:
+                self._update_entry(kind, task_id, heartbeat=time.time(), **progress)
+            return bool(renewed)
+        except Exception as e:
+            print(f"任务 {task_id} 续约失败: {str(e)}")
+            return False
+
+    def release(self, worker_id: str, kind: str, task_id: int, status: str = "finished") -> None:
+        """释放租约并记录最终状态"""
+        try:
+            redis_client = self._get_redis()
+            redis_client.eval(self._RELEASE_SCRIPT, 1, self._lease_key(kind, task_id), worker_id)
+            redis_client.delete(self._stop_key(kind, task_id))
+            self._update_entry(kind, task_id, status=status, worker=None)
+        except Exception as e:
+            print(f"任务 {task_id} 释放租约失败: {str(e)}")
+
+    def request_stop(self, kind: str, task_id: int) -> bool:
+        """请求停止任务，持有租约的worker会在下次心跳时执行"""
+        try:
+            redis_client = self._get_redis()
+            if not redis_client:
+                return False
+            redis_client.set(self._stop_key(kind, task_id), 1, ex=self.lease_ttl * 10)
+            return True
+        except Exception as e:
+            print(f"请求停止任务失败: {str(e)}")
+            return False
+
+    def stop_requested(self, kind: str, task_id: int) -> bool:
+        """检查任务是否被请求停止"""
+        try:
+            return bool(self._get_redis().exists(self._stop_key(kind, task_id)))
+        except Exception:
+            return False
+
+    def requeue_expired(self) -> int:
+        """重新投递租约已过期的运行中任务（worker崩溃）"""
+        try:
+            redis_client = self._get_redis()
+            if not redis_client:
+                return 0
+            requeued = 0
+            for entry in self.get_registry():
+                if entry.get("status") != "running":
+                    continue
+                kind, task_id = entry["kind"], entry["task_id"]
+                if redis_client.exists(self._lease_key(kind, task_id)):
+                    continue
+                if redis_client.exists(self._stop_key(kind, task_id)):
+                    self._update_entry(kind, task_id, status="stopped", worker=None)
+                    continue
+                job = entry.get("job") or {"kind": kind, "task_id": task_id, "params": {}}
+                print(f"任务 {task_id} 租约过期（worker: {entry.get('worker')}），重新投递")
+                self._update_entry(kind, task_id, status="queued", worker=None)
+                redis_client.rpush(self.REDIS_JOBS_KEY, json.dumps(job, ensure_ascii=False))
+                requeued += 1
+            return requeued
+        except Exception as e:
+            print(f"重新投递过期任务失败: {str(e)}")
+            return 0
+
+    def get_registry(self) -> List[Dict[str, Any]]:
+        """获取注册表中的全部任务"""
+        try:
+            redis_client = self._get_redis()
+            if not redis_client:
+                return []
+            return [json.loads(v) for v in redis_client.hvals(self.REDIS_REGISTRY_KEY)]
+        except Exception as e:
+            print(f"获取任务注册表失败: {str(e)}")
+            return []
+
+    def get_entry(self, kind: str, task_id: int) -> Optional[Dict[str, Any]]:
+        """获取单个任务的注册表条目"""
+        try:
+            redis_client = self._get_redis()
+            if not redis_client:
+                return None
+            raw = redis_client.hget(self.REDIS_REGISTRY_KEY, self._task_key(kind, task_id))
+            return json.loads(raw) if raw else None
+        except Exception as e:
+            print(f"获取任务注册表条目失败: {str(e)}")
+            return None
+
+    def is_running(self, kind: str, task_id: int) -> bool:
+        """检查任务是否在某个worker上运行（排队中，或运行中且租约仍在/心跳未超过租约时长）
+
+        worker崩溃后注册表条目仍停留在running，只凭状态判断会让恢复任务误以为实例还在而不重新投递。
+        """
+        entry = self.get_entry(kind, task_id)
+        if not entry:
+            return False
+        if entry.get("status") == "queued":
+            return True
+        if entry.get("status") != "running":
+            return False
+        if time.time() - float(entry.get("heartbeat") or 0) < self.lease_ttl:
+            return True
+        try:
+            redis_client = self._get_redis()
+            return bool(redis_client and redis_client.exists(self._lease_key(kind, task_id)))
+        except Exception as e:
+            print(f"检查任务租约失败: {str(e)}")
+            return False
+
+
+# 创建服务实例
+task_dispatcher = TaskDispatcher()
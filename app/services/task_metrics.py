@@ -0,0 +1,220 @@
+import json
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+from app.database import SessionLocal
+from app.models.task import Task
+from app.utils.redis import get_redis
+from app.config import settings
+
+
+class _TaskCounters:
+    """单个任务的运行计数器"""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.pages = 0
+        self.items = 0
+        self.bytes = 0
+        self.errors: Dict[str, int] = {}
+        self.latencies = deque(maxlen=settings.TASK_METRICS_LATENCY_SAMPLES)
+        self.recent_pages = deque()  # 最近一个速率窗口内的抓取时间
+        self.started_at = time.time()
+        self.updated_at = self.started_at
+
+    @staticmethod
+    def _percentile(ordered, q: float) -> Optional[float]:
+        if not ordered:
+            return None
+        index = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+        return round(ordered[index], 3)
+
+    def _trim(self, now: float):
+        window = settings.TASK_METRICS_RATE_WINDOW
+        while self.recent_pages and now - self.recent_pages[0] > window:
+            self.recent_pages.popleft()
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.time()
+        self._trim(now)
+        ordered = sorted(self.latencies)
+        window = min(settings.TASK_METRICS_RATE_WINDOW, max(now - self.started_at, 1))
+        return {
+            "kind": self.kind,
+            "pages": self.pages,
+            "items": self.items,
+            "bytes": self.bytes,
+            "errors": dict(self.errors),
+            "error_count": sum(self.errors.values()),
+            "latency_p50": self._percentile(ordered, 0.5),
+            "latency_p95": self._percentile(ordered, 0.95),
+            "rate_per_min": round(len(self.recent_pages) * 60 / window, 3),
+            "started_at": self.started_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class TaskMetricsService:
+    """任务运行指标服务
+
+    在内存中累计每个任务的抓取页数、提交条数、字节数、按类型的错误数、
+    页面延迟p50/p95和当前速率；后台线程定期（而不是每个事件）把快照写入
+    task.metrics 字段，并同步到Redis供其他进程（API/worker）实时读取。
+    """
+
+    REDIS_KEY_PREFIX = settings.REDIS_TASK_METRICS_PREFIX
+
+    def __init__(self):
+        self.flush_interval = settings.TASK_METRICS_FLUSH_INTERVAL
+        self._lock = threading.Lock()
+        self._tasks: Dict[int, _TaskCounters] = {}
+        self._dirty = set()
+        self._flush_thread = None
+        self._stop_event = threading.Event()
+
+    def _counters(self, task_id: int, kind: str = "crawler") -> _TaskCounters:
+        counters = self._tasks.get(task_id)
+        if counters is None:
+            counters = self._tasks[task_id] = _TaskCounters(kind)
+            self._ensure_flusher()
+        return counters
+
+    def start_task(self, task_id: int, kind: str):
+        """任务开始运行时重置计数器"""
+        with self._lock:
+            self._tasks[task_id] = _TaskCounters(kind)
+            self._dirty.add(task_id)
+        self._ensure_flusher()
+
+    def record_page(self, task_id: Optional[int], latency: Optional[float] = None,
+                    size: int = 0, kind: str = "crawler"):
+        """记录一次页面抓取"""
+        if task_id is None:
+            return
+        now = time.time()
+        with self._lock:
+            counters = self._counters(task_id, kind)
+            counters.pages += 1
+            counters.bytes += size or 0
+            if latency is not None:
+                counters.latencies.append(latency)
+            counters.recent_pages.append(now)
+            counters._trim(now)
+            counters.updated_at = now
+            self._dirty.add(task_id)
+
+    def record_items(self, task_id: Optional[int], count: int = 1, kind: str = "crawler"):
+        """记录提交的数据条数"""
+        if task_id is None or count <= 0:
+            return
+        with self._lock:
+            counters = self._counters(task_id, kind)
+            counters.items += count
+            counters.updated_at = time.time()
+            self._dirty.add(task_id)
+
+    def record_error(self, task_id: Optional[int], error_type: str, kind: str = "crawler"):
+        """按类型记录错误"""
+        if task_id is None:
+            return
+        with self._lock:
+            counters = self._counters(task_id, kind)
+            counters.errors[error_type] = counters.errors.get(error_type, 0) + 1
+            counters.updated_at = time.time()
+            self._dirty.add(task_id)
+
+    def snapshot(self, task_id: int) -> Optional[Dict[str, Any]]:
+        """本进程中任务的实时指标"""
+        with self._lock:
+            counters = self._tasks.get(task_id)
+            return counters.snapshot() if counters else None
+
+    def get_metrics(self, task_id: int) -> Optional[Dict[str, Any]]:
+        """读取任务指标：本进程内存 > Redis（其他进程）> 数据库（最近一次落库）"""
+        metrics = self.snapshot(task_id)
+        if metrics:
+            return dict(metrics, source="local")
+        redis_client = get_redis()
+        if redis_client:
+            try:
+                data = redis_client.get(f"{self.REDIS_KEY_PREFIX}{task_id}")
+                if data:
+                    return dict(json.loads(data), source="redis")
+            except Exception:
+                pass
+        db = SessionLocal()
+        try:
+            task = db.query(Task).filter(Task.id == task_id).first()
+            if task and task.metrics:
+                try:
+                    return dict(json.loads(task.metrics), source="database")
+                except ValueError:
+                    return None
+        finally:
+            db.close()
+        return None
+
+    def flush(self, task_ids=None):
+        """把有变化的任务指标写入数据库和Redis"""
+        with self._lock:
+            ids = set(task_ids) if task_ids is not None else set(self._dirty)
+            snapshots = {task_id: self._tasks[task_id].snapshot() for task_id in ids if task_id in self._tasks}
+            self._dirty -= ids
+        if not snapshots:
+            return
+        db = SessionLocal()
+        try:
+            for task in db.query(Task).filter(Task.id.in_(list(snapshots))).all():
+                task.metrics = json.dumps(snapshots[task.id], ensure_ascii=False)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"写入任务指标失败: {str(e)}")
+        finally:
+            db.close()
+        redis_client = get_redis()
+        if redis_client:
+            try:
+                pipe = redis_client.pipeline(transaction=False)
+                for task_id, metrics in snapshots.items():
+                    pipe.set(f"{self.REDIS_KEY_PREFIX}{task_id}", json.dumps(metrics, ensure_ascii=False),
+                             ex=self.flush_interval * 4)
+                pipe.execute()
+            except Exception as e:
+                print(f"同步任务指标到Redis失败: {str(e)}")
+
+    def finish_task(self, task_id: int):
+        """任务结束：最后落库一次并释放内存"""
+        self.flush([task_id])
+        with self._lock:
+            self._tasks.pop(task_id, None)
+            self._dirty.discard(task_id)
+
+    def _flush_loop(self):
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"任务指标落库异常: {str(e)}")
+
+    def _ensure_flusher(self):
+        if self._flush_thread and self._flush_thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._flush_thread = threading.Thread(target=self._flush_loop, name="task-metrics", daemon=True)
+        self._flush_thread.start()
+
+    def shutdown(self):
+        """停止后台线程并落库剩余指标"""
+        self._stop_event.set()
+        self.flush()
+
+    def list_running(self) -> Dict[int, Dict[str, Any]]:
+        """本进程中所有任务的实时指标"""
+        with self._lock:
+            return {task_id: counters.snapshot() for task_id, counters in self._tasks.items()}
+
+
+# 创建任务指标服务实例
+task_metrics = TaskMetricsService()
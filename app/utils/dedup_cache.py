@@ -0,0 +1,90 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Sequence
+from app.config import settings
+from app.utils.metrics import DEDUP_CACHE_REQUESTS, DEDUP_CACHE_SIZE
+
+
+class DedupCache:
+    """进程内URL去重缓存（Redis URL集合前的一级缓存）
+
+    只缓存"URL已在集合中"的结论：URL集合只增不减（清空除外），命中时可以直接判定为重复，
+    不必访问Redis；未命中时仍以Redis为准。条目保存URL的8字节指纹，按LRU淘汰，
+    超过 DEDUP_CACHE_TTL 秒过期，其他进程清空集合后本进程最多在TTL内沿用旧结论。
+    不同集合用命名空间（集合的Redis键）区分，清空集合时使该命名空间的条目整体失效。
+    """
+
+    def __init__(self):
+        self.max_size = settings.DEDUP_CACHE_SIZE
+        self.ttl = settings.DEDUP_CACHE_TTL
+        self._entries: "OrderedDict[bytes, float]" = OrderedDict()  # 指纹 -> 过期时间
+        self._generations: Dict[str, int] = {}  # 命名空间 -> 代数，清空时递增
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def _fingerprint(self, namespace: str, url: str) -> bytes:
+        generation = self._generations.get(namespace, 0)
+        return hashlib.blake2b(f"{namespace}\0{generation}\0{url}".encode("utf-8"), digest_size=8).digest()
+
+    def contains(self, namespace: str, url: str) -> bool:
+        """URL是否已知在集合中"""
+        return self.filter_known(namespace, [url])[0]
+
+    def filter_known(self, namespace: str, urls: Sequence[str]) -> List[bool]:
+        """批量判断URL是否已知在集合中"""
+        if not self.enabled:
+            return [False] * len(urls)
+        now = time.monotonic()
+        result = []
+        with self._lock:
+            for url in urls:
+                fingerprint = self._fingerprint(namespace, url)
+                expires = self._entries.get(fingerprint)
+                if expires is not None and expires > now:
+                    self._entries.move_to_end(fingerprint)
+                    result.append(True)
+                else:
+                    if expires is not None:
+                        del self._entries[fingerprint]
+                    result.append(False)
+        hits = sum(result)
+        if hits:
+            DEDUP_CACHE_REQUESTS.labels(namespace, "hit").inc(hits)
+        if len(result) > hits:
+            DEDUP_CACHE_REQUESTS.labels(namespace, "miss").inc(len(result) - hits)
+        return result
+
+    def add(self, namespace: str, urls: Iterable[str]):
+        """记录已确认在集合中的URL"""
+        if not self.enabled:
+            return
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            for url in urls:
+                fingerprint = self._fingerprint(namespace, url)
+                self._entries[fingerprint] = expires
+                self._entries.move_to_end(fingerprint)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, namespace: str):
+        """集合被清空时调用，使该命名空间的所有条目失效（旧条目随LRU淘汰）"""
+        with self._lock:
+            self._generations[namespace] = self._generations.get(namespace, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# 创建去重缓存实例
+dedup_cache = DedupCache()
+DEDUP_CACHE_SIZE.set_function(lambda: len(dedup_cache))
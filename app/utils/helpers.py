@@ -1,4 +1,5 @@
 
+import json
 import re
 from datetime import datetime
 from typing import Optional
@@ -67,3 +68,7 @@ def get_status_class(status: int) -> str:
         4: "status-completed"
     }
     return status_map.get(status, "")
+
+def format_sse(event: str, data: dict) -> str:
+    """格式化一条SSE消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
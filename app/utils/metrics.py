@@ -0,0 +1,277 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _CounterChild:
+    __slots__ = ("_value", "_lock")
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ("_callback",)
+
+    def __init__(self):
+        super().__init__()
+        self._callback: Optional[Callable[[], float]] = None
+
+    def set(self, value: float):
+        with self._lock:
+            self._value = value
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+    def set_function(self, callback: Callable[[], float]):
+        """抓取时调用回调取值（用于队列长度、运行中实例数等）"""
+        self._callback = callback
+
+    @property
+    def value(self) -> float:
+        if self._callback is not None:
+            try:
+                return float(self._callback())
+            except Exception:
+                return float("nan")
+        return self._value
+
+
+class _HistogramChild:
+    __slots__ = ("_buckets", "_counts", "_sum", "_count", "_lock")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self._buckets = buckets
+        self._counts = [0] * len(buckets)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self._sum += value
+            self._count += 1
+            for index, bound in enumerate(self._buckets):
+                if value <= bound:
+                    self._counts[index] += 1
+                    break
+
+    @contextmanager
+    def time(self):
+        """统计代码块耗时"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self._counts), self._sum, self._count
+
+
+class _Metric:
+    """指标基类：按标签值缓存子指标，热点路径应预先绑定标签（labels()）后复用"""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values) -> object:
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}")
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._children[key] = self._new_child()
+        return child
+
+    def _default(self):
+        return self.labels()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for key, child in list(self._children.items()):
+            lines.extend(self._render_child(key, child))
+        return lines
+
+    def _render_child(self, key, child) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self._default().set(value)
+
+    def set_function(self, callback: Callable[[], float]):
+        self._default().set_function(callback)
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        buckets = tuple(sorted(buckets))
+        if buckets[-1] != float("inf"):
+            buckets += (float("inf"),)
+        self.buckets = buckets
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+    def _render_child(self, key, child) -> List[str]:
+        counts, total, count = child.snapshot()
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """轻量指标注册表，按Prometheus文本格式输出"""
+
+    CONTENT_TYPE = "text/plain; version=0.0.4"
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = Histogram.DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# 全局指标注册表
+registry = MetricsRegistry()
+
+# HTTP接口
+HTTP_REQUEST_DURATION = registry.histogram(
+    "http_request_duration_seconds", "HTTP请求处理耗时", ("method", "route", "status")
+)
+
+# Redis命令
+REDIS_COMMAND_DURATION = registry.histogram(
+    "redis_command_duration_seconds", "Redis命令耗时", ("command",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+)
+REDIS_COMMAND_ERRORS = registry.counter("redis_command_errors_total", "Redis命令失败次数", ("command",))
+
+# 数据库
+DB_QUERY_DURATION = registry.histogram(
+    "db_query_duration_seconds", "SQL语句执行耗时", ("statement",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0, 5.0)
+)
+
+# QA小鲸鱼队列
+QA_QUEUE_DEPTH = registry.gauge("qa_queue_depth", "QA小鲸鱼数据队列长度")
+QA_QUEUE_LANE_DEPTH = registry.gauge("qa_queue_lane_depth", "QA小鲸鱼各优先级通道队列长度", ("lane",))
+QA_QUEUE_LANE_AGE = registry.gauge("qa_queue_lane_age_seconds", "QA小鲸鱼各优先级通道最早数据的等待时间", ("lane",))
+QA_QUEUE_WAIT = registry.histogram(
+    "qa_queue_wait_seconds", "QA小鲸鱼数据从入队到出队的等待时间", ("lane",),
+    buckets=(1, 5, 15, 30, 60, 300, 900, 3600, 6 * 3600, 24 * 3600)
+)
+QA_QUEUE_ITEMS = registry.counter("qa_queue_items_total", "QA小鲸鱼队列消费条数", ("result",))
+QA_SPOOL_DEPTH = registry.gauge("qa_spool_depth", "QA小鲸鱼本地spool待回放条数")
+QA_SPOOL_ITEMS = registry.counter("qa_spool_items_total", "QA小鲸鱼本地spool写入/回放条数", ("result",))
+QA_BACKPRESSURE = registry.gauge("qa_backpressure", "QA小鲸鱼队列背压(0~1)")
+DEDUP_CACHE_REQUESTS = registry.counter("dedup_cache_requests_total", "URL去重本地缓存查询次数", ("namespace", "result"))
+DEDUP_CACHE_SIZE = registry.gauge("dedup_cache_entries", "URL去重本地缓存条目数")
+ADMISSION_REJECTED = registry.counter("qa_admission_rejected_total", "被准入控制拒绝的提交次数", ("reason",))
+
+# 导出与爬虫
+EXPORT_JOB_DURATION = registry.histogram(
+    "export_job_duration_seconds", "导出任务耗时", ("job",),
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+)
+ACTIVE_INSTANCES = registry.gauge("crawler_active_instances", "运行时中托管的实例数", ("kind",))
@@ -0,0 +1,191 @@
+import json
+import os
+import shutil
+import uuid
+import zlib
+from typing import Any, Dict, Union
+from app.config import settings
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+
+# 编码格式：[版本字节][序列化方式][压缩方式] + 数据
+# 旧数据是JSON文本（以 { 或 [ 开头），版本字节 0x01 不会与之冲突
+FORMAT_VERSION = 1
+
+SERIALIZER_JSON = 0
+SERIALIZER_MSGPACK = 1
+SERIALIZER_BLOB = 2  # 数据存放在本地blob目录，队列中只保存键
+
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_ZSTD = 2
+COMPRESSION_LZ4 = 3
+
+_SERIALIZERS = {"json": SERIALIZER_JSON, "msgpack": SERIALIZER_MSGPACK}
+_COMPRESSIONS = {"none": COMPRESSION_NONE, "zlib": COMPRESSION_ZLIB, "zstd": COMPRESSION_ZSTD, "lz4": COMPRESSION_LZ4}
+
+
+def _available_serializer(name: str) -> int:
+    serializer = _SERIALIZERS.get(name, SERIALIZER_MSGPACK)
+    if serializer == SERIALIZER_MSGPACK and msgpack is None:
+        print("msgpack未安装，队列数据使用JSON序列化")
+        return SERIALIZER_JSON
+    return serializer
+
+
+def _available_compression(name: str) -> int:
+    compression = _COMPRESSIONS.get(name, COMPRESSION_ZSTD)
+    if (compression == COMPRESSION_ZSTD and zstandard is None) or (compression == COMPRESSION_LZ4 and lz4_frame is None):
+        print(f"{name}压缩库未安装，队列数据使用zlib压缩")
+        return COMPRESSION_ZLIB
+    return compression
+
+
+class QueueCodec:
+    """队列数据编解码
+
+    按配置使用 msgpack/JSON 序列化，超过 QUEUE_COMPRESS_MIN_BYTES 的数据再用 zstd/lz4/zlib 压缩；
+    超过 QUEUE_BLOB_THRESHOLD 的数据写入本地blob目录，队列中只保存引用（要求生产者和消费者
+    在同一台机器上）。解码时兼容旧的JSON文本数据，可在队列中新旧数据混存的情况下平滑切换。
+    """
+
+    def __init__(self):
+        self.serializer = _available_serializer(settings.QUEUE_CODEC)
+        self.compression = _available_compression(settings.QUEUE_COMPRESSION)
+        self.compress_min_bytes = settings.QUEUE_COMPRESS_MIN_BYTES
+        self.blob_threshold = settings.QUEUE_BLOB_THRESHOLD
+        self.blob_dir = settings.QUEUE_BLOB_DIR
+        self._zstd_compressor = zstandard.ZstdCompressor(level=3) if zstandard else None
+        self._zstd_decompressor = zstandard.ZstdDecompressor() if zstandard else None
+
+    # 序列化
+    def _serialize(self, data: Any) -> bytes:
+        if self.serializer == SERIALIZER_MSGPACK:
+            return msgpack.packb(data, use_bin_type=True, default=str)
+        return json.dumps(data, ensure_ascii=False, default=str).encode("utf-8")
+
+    @staticmethod
+    def _deserialize(serializer: int, payload: bytes) -> Any:
+        if serializer == SERIALIZER_MSGPACK:
+            if msgpack is None:
+                raise ValueError("队列数据使用msgpack编码，但msgpack未安装")
+            return msgpack.unpackb(payload, raw=False)
+        if serializer == SERIALIZER_JSON:
+            return json.loads(payload)
+        raise ValueError(f"未知的序列化方式: {serializer}")
+
+    # 压缩
+    def _compress(self, compression: int, payload: bytes) -> bytes:
+        if compression == COMPRESSION_ZSTD:
+            return self._zstd_compressor.compress(payload)
+        if compression == COMPRESSION_LZ4:
+            return lz4_frame.compress(payload)
+        if compression == COMPRESSION_ZLIB:
+            return zlib.compress(payload, 6)
+        return payload
+
+    def _decompress(self, compression: int, payload: bytes) -> bytes:
+        if compression == COMPRESSION_NONE:
+            return payload
+        if compression == COMPRESSION_ZLIB:
+            return zlib.decompress(payload)
+        if compression == COMPRESSION_ZSTD:
+            if self._zstd_decompressor is None:
+                raise ValueError("队列数据使用zstd压缩，但zstandard未安装")
+            return self._zstd_decompressor.decompress(payload)
+        if compression == COMPRESSION_LZ4:
+            if lz4_frame is None:
+                raise ValueError("队列数据使用lz4压缩，但lz4未安装")
+            return lz4_frame.decompress(payload)
+        raise ValueError(f"未知的压缩方式: {compression}")
+
+    # blob存储
+    def _blob_path(self, key: str) -> str:
+        return os.path.join(self.blob_dir, key[:2], key)
+
+    def _put_blob(self, encoded: bytes) -> bytes:
+        key = uuid.uuid4().hex
+        path = self._blob_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(encoded)
+        os.replace(tmp_path, path)
+        return bytes((FORMAT_VERSION, SERIALIZER_BLOB, COMPRESSION_NONE)) + key.encode("ascii")
+
+    def _read_blob(self, key: str) -> bytes:
+        with open(self._blob_path(key), "rb") as f:
+            return f.read()
+
+    def _remove_blob(self, key: str):
+        try:
+            os.remove(self._blob_path(key))
+        except OSError:
+            pass
+
+    def clear_blobs(self):
+        """删除所有blob（清空队列时调用）"""
+        if os.path.isdir(self.blob_dir):
+            shutil.rmtree(self.blob_dir, ignore_errors=True)
+
+    # 编解码
+    def encode(self, data: Any) -> bytes:
+        """编码一条队列数据"""
+        payload = self._serialize(data)
+        compression = self.compression if len(payload) >= self.compress_min_bytes else COMPRESSION_NONE
+        if compression != COMPRESSION_NONE:
+            payload = self._compress(compression, payload)
+        encoded = bytes((FORMAT_VERSION, self.serializer, compression)) + payload
+        if self.blob_threshold and len(encoded) > self.blob_threshold:
+            return self._put_blob(encoded)
+        return encoded
+
+    def decode(self, raw: Union[bytes, str], consume: bool = True) -> Any:
+        """解码一条队列数据（兼容旧的JSON文本）
+
+        Args:
+            raw: 队列中的原始数据
+            consume: 数据存放在blob中时，读取后是否删除blob文件
+        """
+        if isinstance(raw, str):
+            return json.loads(raw)
+        if not raw or raw[0] != FORMAT_VERSION:
+            return json.loads(raw)
+        serializer, compression = raw[1], raw[2]
+        payload = raw[3:]
+        if serializer == SERIALIZER_BLOB:
+            # 解码成功后才删除blob，解码失败时引用连同blob一起保留（可移入死信队列后重放）
+            key = payload.decode("ascii")
+            data = self.decode(self._read_blob(key), consume)
+            if consume:
+                self._remove_blob(key)
+            return data
+        return self._deserialize(serializer, self._decompress(compression, payload))
+
+    def describe(self) -> Dict[str, Any]:
+        """当前编码配置"""
+        names = {v: k for k, v in _COMPRESSIONS.items()}
+        return {
+            "serializer": "msgpack" if self.serializer == SERIALIZER_MSGPACK else "json",
+            "compression": names[self.compression],
+            "compress_min_bytes": self.compress_min_bytes,
+            "blob_threshold": self.blob_threshold,
+        }
+
+
+# 创建队列编解码实例
+queue_codec = QueueCodec()
@@ -1,13 +1,112 @@
 
+import asyncio
+import time
+import weakref
 import redis
+import redis.asyncio as aioredis
 from app.config import settings
 from app.database import SessionLocal
 from app.models.redis_config import RedisConfig
 from app.models.raw_data import RawData
+from app.utils.metrics import REDIS_COMMAND_DURATION, REDIS_COMMAND_ERRORS
+from app.utils.queue_codec import queue_codec
+from app.utils.dedup_cache import dedup_cache
+
+_command_metrics = {}  # 命令名 -> (耗时子指标, 失败次数子指标)，每条命令不必再调用labels()
+
+def _bind_command_metrics(name):
+    """获取命令对应的指标子项（按原始命令名缓存）"""
+    metrics = _command_metrics.get(name)
+    if metrics is None:
+        command = str(name).upper()
+        metrics = _command_metrics[name] = (REDIS_COMMAND_DURATION.labels(command), REDIS_COMMAND_ERRORS.labels(command))
+    return metrics
+
+class InstrumentedPipeline(redis.client.Pipeline):
+    """按整次执行记录耗时的管道（管道中的命令不经过 execute_command），命令名记为PIPELINE"""
+
+    def execute(self, raise_on_error=True):
+        duration, errors = _bind_command_metrics("PIPELINE")
+        started = time.perf_counter()
+        try:
+            return super().execute(raise_on_error)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            duration.observe(time.perf_counter() - started)
+
+class InstrumentedRedis(redis.Redis):
+    """记录每条命令耗时的Redis客户端"""
+
+    def execute_command(self, *args, **options):
+        duration, errors = _bind_command_metrics(args[0] if args else "UNKNOWN")
+        started = time.perf_counter()
+        try:
+            return super().execute_command(*args, **options)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            duration.observe(time.perf_counter() - started)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+class InstrumentedAsyncPipeline(aioredis.client.Pipeline):
+    """按整次执行记录耗时的异步管道，命令名记为PIPELINE"""
+
+    async def execute(self, raise_on_error=True):
+        duration, errors = _bind_command_metrics("PIPELINE")
+        started = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            duration.observe(time.perf_counter() - started)
+
+class InstrumentedAsyncRedis(aioredis.Redis):
+    """记录每条命令耗时的异步Redis客户端"""
+
+    async def execute_command(self, *args, **options):
+        duration, errors = _bind_command_metrics(args[0] if args else "UNKNOWN")
+        started = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            duration.observe(time.perf_counter() - started)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return InstrumentedAsyncPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
 
 # 全局Redis连接池
 _redis_pool = None
 _redis_client = None
+_binary_redis_client = None
+_async_redis_clients = weakref.WeakKeyDictionary()  # 事件循环 -> {decode_responses: 异步客户端}
+
+def _load_redis_config(db):
+    """读取默认Redis配置，没有时使用默认配置并保存到数据库"""
+    redis_config = db.query(RedisConfig).filter(RedisConfig.is_default == True).first()
+    if not redis_config:
+        redis_config = RedisConfig(
+            name="默认配置",
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            password=settings.REDIS_PASSWORD,
+            is_default=True
+        )
+        db.add(redis_config)
+        db.commit()
+        db.refresh(redis_config)
+        print("已创建默认Redis配置")
+    return redis_config
 
 def get_redis():
     """获取Redis客户端"""
@@ -17,22 +116,7 @@ def get_redis():
         # 从数据库获取Redis配置
         db = SessionLocal()
         try:
-            redis_config = db.query(RedisConfig).filter(RedisConfig.is_default == True).first()
-
-            # 如果没有配置，使用默认配置并保存到数据库
-            if not redis_config:
-                redis_config = RedisConfig(
-                    name="默认配置",
-                    host=settings.REDIS_HOST,
-                    port=settings.REDIS_PORT,
-                    db=settings.REDIS_DB,
-                    password=settings.REDIS_PASSWORD,
-                    is_default=True
-                )
-                db.add(redis_config)
-                db.commit()
-                db.refresh(redis_config)
-                print("已创建默认Redis配置")
+            redis_config = _load_redis_config(db)
 
             # 创建连接池
             _redis_pool = redis.ConnectionPool(
@@ -44,7 +128,7 @@ def get_redis():
             )
 
             # 创建客户端
-            _redis_client = redis.Redis(connection_pool=_redis_pool)
+            _redis_client = InstrumentedRedis(connection_pool=_redis_pool)
 
             # 测试连接
             try:
@@ -58,6 +142,57 @@ def get_redis():
 
     return _redis_client
 
+def get_binary_redis():
+    """获取不解码响应的Redis客户端（读取编码后的二进制队列数据）
+
+    与 get_redis() 使用同一份连接配置，Redis不可用时返回None。
+    """
+    global _binary_redis_client
+
+    if _binary_redis_client is None:
+        if get_redis() is None:
+            return None
+        kwargs = dict(_redis_pool.connection_kwargs, decode_responses=False)
+        _binary_redis_client = InstrumentedRedis(connection_pool=redis.ConnectionPool(**kwargs))
+
+    return _binary_redis_client
+
+async def get_async_redis(decode_responses: bool = True):
+    """获取异步Redis客户端（供async接口使用，避免阻塞事件循环）
+
+    与同步客户端读取同一份配置。异步连接绑定创建它的事件循环，
+    因此每个事件循环共享一个连接池（API进程中即主事件循环一个）。
+    decode_responses=False 时返回不解码响应的客户端，用于读取二进制队列数据。
+    """
+    loop = asyncio.get_running_loop()
+    clients = _async_redis_clients.setdefault(loop, {})
+    client = clients.get(decode_responses)
+
+    if client is None:
+        db = SessionLocal()
+        try:
+            redis_config = _load_redis_config(db)
+        finally:
+            db.close()
+
+        pool = aioredis.ConnectionPool(
+            host=redis_config.host,
+            port=redis_config.port,
+            db=redis_config.db,
+            password=redis_config.password,
+            decode_responses=decode_responses
+        )
+        client = InstrumentedAsyncRedis(connection_pool=pool)
+        try:
+            await client.ping()
+        except Exception as e:
+            print(f"异步Redis连接失败: {str(e)}")
+            await pool.disconnect()
+            return None
+        clients[decode_responses] = client
+
+    return client
+
 def init_redis():
     """初始化Redis连接"""
     global _redis_pool, _redis_client
@@ -66,22 +201,7 @@ def init_redis():
         # 从数据库获取Redis配置
         db = SessionLocal()
         try:
-            redis_config = db.query(RedisConfig).filter(RedisConfig.is_default == True).first()
-
-            # 如果没有配置，使用默认配置并保存到数据库
-            if not redis_config:
-                redis_config = RedisConfig(
-                    name="默认配置",
-                    host=settings.REDIS_HOST,
-                    port=settings.REDIS_PORT,
-                    db=settings.REDIS_DB,
-                    password=settings.REDIS_PASSWORD,
-                    is_default=True
-                )
-                db.add(redis_config)
-                db.commit()
-                db.refresh(redis_config)
-                print("已创建默认Redis配置")
+            redis_config = _load_redis_config(db)
 
             # 创建连接池
             _redis_pool = redis.ConnectionPool(
@@ -93,7 +213,7 @@ def init_redis():
             )
 
             # 创建客户端
-            _redis_client = redis.Redis(connection_pool=_redis_pool)
+            _redis_client = InstrumentedRedis(connection_pool=_redis_pool)
 
             # 测试连接
             _redis_client.ping()
@@ -110,7 +230,12 @@ def init_redis():
 
 def close_redis():
     """关闭Redis连接"""
-    global _redis_pool, _redis_client
+    global _redis_pool, _redis_client, _binary_redis_client
+
+    if _binary_redis_client:
+        _binary_redis_client.close()
+        _binary_redis_client.connection_pool.disconnect()
+        _binary_redis_client = None
 
     if _redis_client:
         _redis_client.close()
@@ -120,6 +245,15 @@ def close_redis():
         _redis_pool.disconnect()
         _redis_pool = None
 
+    # 异步连接池需要在各自的事件循环中关闭，这里只丢弃引用，下次使用时按新配置重建
+    _async_redis_clients.clear()
+
+async def close_async_redis():
+    """关闭当前事件循环的异步Redis连接池（应用关闭时调用）"""
+    clients = _async_redis_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.connection_pool.disconnect()
+
 def reload_redis():
     """重新加载Redis配置"""
     global _redis_pool, _redis_client
@@ -139,8 +273,12 @@ def clear_recommendation_and_qa_crawler_cache():
             redis_client.delete(settings.REDIS_RECOMMENDATION_URLS_KEY)
             # 清空问答小鲸鱼URL缓存
             redis_client.delete(settings.REDIS_QA_CRAWLER_URLS_KEY)
-            # 清空问答小鲸鱼数据队列
-            redis_client.delete(settings.REDIS_QA_CRAWLER_QUEUE_KEY)
+            # 清空问答小鲸鱼数据队列（所有优先级通道）
+            from app.services.qa_crawler import qa_crawler_service
+            redis_client.delete(*qa_crawler_service.LANE_KEYS.values())
+            dedup_cache.invalidate(settings.REDIS_RECOMMENDATION_URLS_KEY)
+            dedup_cache.invalidate(settings.REDIS_QA_CRAWLER_URLS_KEY)
+            queue_codec.clear_blobs()
             print("已清空推荐页URL和问答小鲸鱼缓存")
             return True
         return False
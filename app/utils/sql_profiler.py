@@ -0,0 +1,140 @@
+import re
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+from sqlalchemy import event
+from app.config import settings
+
+
+class RequestProfile:
+    """单个请求内的SQL统计"""
+
+    __slots__ = ("queries", "duration", "started")
+
+    def __init__(self):
+        self.queries = 0
+        self.duration = 0.0
+        self.started = time.perf_counter()
+
+    def server_timing(self) -> str:
+        """生成Server-Timing响应头"""
+        total_ms = (time.perf_counter() - self.started) * 1000
+        db_ms = self.duration * 1000
+        return (f'db;dur={db_ms:.2f};desc="{self.queries} queries", '
+                f'app;dur={max(total_ms - db_ms, 0):.2f}, total;dur={total_ms:.2f}')
+
+
+_current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("sql_profile", default=None)
+_WHITESPACE = re.compile(r"\s+")
+
+
+class SQLProfiler:
+    """SQL性能分析（按需开启）
+
+    通过SQLAlchemy的 before/after_cursor_execute 事件统计每个请求的查询次数和耗时，
+    按语句聚合调用次数/总耗时/最大耗时，超过阈值的慢查询连同 EXPLAIN QUERY PLAN 一起输出。
+    用于发现接口中隐藏的N+1查询。
+    """
+
+    def __init__(self):
+        self.enabled = settings.SQL_PROFILING_ENABLED
+        self.slow_threshold = settings.SQL_SLOW_QUERY_MS / 1000
+        self.max_statements = settings.SQL_PROFILING_MAX_STATEMENTS
+        self._lock = threading.Lock()
+        self._stats: Dict[str, List[float]] = {}  # 语句 -> [次数, 总耗时, 最大耗时]
+        self._attached = set()
+
+    def attach(self, engine):
+        """为数据库引擎挂载事件监听"""
+        if id(engine) in self._attached:
+            return
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        self._attached.add(id(engine))
+
+    @staticmethod
+    def start_request() -> RequestProfile:
+        """开始统计当前请求"""
+        profile = RequestProfile()
+        _current_profile.set(profile)
+        return profile
+
+    @staticmethod
+    def end_request():
+        _current_profile.set(None)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self.enabled:
+            conn.info.setdefault("profile_start", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("profile_start")
+        if not starts:
+            return
+        duration = time.perf_counter() - starts.pop()
+
+        profile = _current_profile.get()
+        if profile is not None:
+            profile.queries += 1
+            profile.duration += duration
+
+        key = _WHITESPACE.sub(" ", statement).strip()
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                if len(self._stats) >= self.max_statements:
+                    key = "<其他语句>"
+                    stats = self._stats.setdefault(key, [0, 0.0, 0.0])
+                else:
+                    stats = self._stats[key] = [0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += duration
+            stats[2] = max(stats[2], duration)
+
+        if duration >= self.slow_threshold:
+            self._log_slow_query(cursor, statement, parameters, duration, executemany)
+
+    @staticmethod
+    def _log_slow_query(cursor, statement, parameters, duration, executemany):
+        """输出慢查询和执行计划"""
+        print(f"慢查询 {duration * 1000:.1f}ms: {_WHITESPACE.sub(' ', statement).strip()[:500]}")
+        if executemany or not statement.lstrip().upper().startswith("SELECT"):
+            return
+        if "sqlite" not in settings.DATABASE_URL:
+            return
+        try:
+            # 直接使用DBAPI游标，避免再次触发SQLAlchemy事件
+            plan_cursor = cursor.connection.cursor()
+            try:
+                plan_cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters or ())
+                for row in plan_cursor.fetchall():
+                    print(f"  执行计划: {row[-1]}")
+            finally:
+                plan_cursor.close()
+        except Exception as e:
+            print(f"  获取执行计划失败: {str(e)}")
+
+    def top_statements(self, limit: int = 20, order_by: str = "total") -> List[Dict[str, Any]]:
+        """按总耗时/次数/最大耗时排序的语句统计"""
+        index = {"count": 0, "total": 1, "max": 2}.get(order_by, 1)
+        with self._lock:
+            items = sorted(self._stats.items(), key=lambda item: item[1][index], reverse=True)[:limit]
+        return [
+            {
+                "statement": statement,
+                "count": int(stats[0]),
+                "total_ms": round(stats[1] * 1000, 3),
+                "avg_ms": round(stats[1] * 1000 / stats[0], 3) if stats[0] else 0,
+                "max_ms": round(stats[2] * 1000, 3),
+            }
+            for statement, stats in items
+        ]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+# 创建SQL性能分析实例
+sql_profiler = SQLProfiler()
@@ -0,0 +1,111 @@
+import signal
+import threading
+import time
+from app.config import settings
+from app.database import init_db
+from app.utils.redis import init_redis
+from app.services.task_dispatcher import task_dispatcher
+from app.services.crawler_runtime import crawler_runtime
+from app.services.crawler import run_crawler_task, stop_crawler_task
+from app.services.exporter import run_export_task, stop_export_task
+
+
+class CrawlerWorker:
+    """独立的爬虫worker进程
+
+    从Redis调度队列领取任务，在本进程的爬虫运行时中执行，
+    定期续约租约、上报进度并响应停止请求。可在多台机器上同时运行。
+
+    启动方式: python -m app.workers.crawler_worker
+    """
+
+    RUNNERS = {"crawler": run_crawler_task, "export": run_export_task}
+    STOPPERS = {"crawler": stop_crawler_task, "export": stop_export_task}
+
+    def __init__(self, concurrency: int = None):
+        self.worker_id = task_dispatcher.make_worker_id()
+        self.concurrency = concurrency or settings.CRAWLER_WORKER_CONCURRENCY
+        self.held = {}  # (kind, task_id) -> 领取时间
+        self.stop_event = threading.Event()
+        self.heartbeat_thread = None
+
+    def start(self):
+        """启动worker主循环"""
+        print(f"crawler-worker {self.worker_id} 已启动，并发数: {self.concurrency}")
+        self.heartbeat_thread = threading.Thread(target=self._heartbeat_loop, daemon=True)
+        self.heartbeat_thread.start()
+        try:
+            while not self.stop_event.is_set():
+                if len(self.held) >= self.concurrency:
+                    self.stop_event.wait(1)
+                    continue
+                job = task_dispatcher.claim(self.worker_id, timeout=5)
+                if job:
+                    self._run_job(job)
+        finally:
+            self.shutdown()
+
+    def _run_job(self, job):
+        """在本地运行时中启动任务"""
+        kind, task_id = job["kind"], job["task_id"]
+        runner = self.RUNNERS.get(kind)
+        if not runner:
+            print(f"未知的任务类型: {kind}")
+            task_dispatcher.release(self.worker_id, kind, task_id, status="failed")
+            return
+        params = dict(job.get("params") or {})
+        if params.get("time_range") is not None:
+            params["time_range"] = tuple(params["time_range"])
+        self.held[(kind, task_id)] = time.time()
+        print(f"crawler-worker {self.worker_id} 领取任务 {task_id} ({kind})")
+        try:
+            runner(task_id, **params)
+        except Exception as e:
+            print(f"任务 {task_id} 启动失败: {str(e)}")
+            self.held.pop((kind, task_id), None)
+            task_dispatcher.release(self.worker_id, kind, task_id, status="failed")
+
+    def _heartbeat_loop(self):
+        """心跳：续约、上报进度、处理停止请求和过期租约"""
+        while not self.stop_event.wait(settings.CRAWLER_HEARTBEAT_INTERVAL):
+            for (kind, task_id), claimed_at in list(self.held.items()):
+                if not crawler_runtime.is_running(kind, task_id):
+                    self.held.pop((kind, task_id), None)
+                    status = "stopped" if task_dispatcher.stop_requested(kind, task_id) else "finished"
+                    task_dispatcher.release(self.worker_id, kind, task_id, status=status)
+                    continue
+                if task_dispatcher.stop_requested(kind, task_id):
+                    self.STOPPERS[kind](task_id)
+                    continue
+                task_dispatcher.renew(self.worker_id, kind, task_id, uptime=int(time.time() - claimed_at))
+            task_dispatcher.requeue_expired()
+
+    def shutdown(self):
+        """停止worker，释放持有的所有租约"""
+        self.stop_event.set()
+        crawler_runtime.shutdown()
+        for kind, task_id in list(self.held.keys()):
+            task_dispatcher.release(self.worker_id, kind, task_id, status="stopped")
+        self.held.clear()
+        print(f"crawler-worker {self.worker_id} 已停止")
+
+
+def main():
+    init_db()
+    if not init_redis():
+        print("Redis不可用，crawler-worker无法启动")
+        return
+
+    worker = CrawlerWorker()
+
+    def handle_shutdown(signum, frame):
+        print("\n正在关闭crawler-worker...")
+        worker.stop_event.set()
+
+    signal.signal(signal.SIGINT, handle_shutdown)
+    signal.signal(signal.SIGTERM, handle_shutdown)
+    worker.start()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,28 @@
 import asyncio
 import time
+from starlette.concurrency import run_in_threadpool
 from app.database import SessionLocal
 from app.services.qa_crawler import qa_crawler_service
+from app.services.admission import admission_controller
+from app.utils.metrics import QA_QUEUE_DEPTH, QA_QUEUE_ITEMS, QA_QUEUE_LANE_DEPTH, QA_QUEUE_LANE_AGE
+from app.config import settings
+
+_PROCESSED = QA_QUEUE_ITEMS.labels("processed")
+_FAILED = QA_QUEUE_ITEMS.labels("failed")
+_UPDATED = QA_QUEUE_ITEMS.labels("updated")
+
+
+def _register_lane_metrics():
+    """抓取指标时读取各通道队列长度和最早数据的等待时间"""
+    for lane in qa_crawler_service.LANES:
+        QA_QUEUE_LANE_DEPTH.labels(lane).set_function(lambda lane=lane: qa_crawler_service.get_lane_sizes()[lane])
+        QA_QUEUE_LANE_AGE.labels(lane).set_function(lambda lane=lane: qa_crawler_service.get_lane_age(lane))
 
 class QACrawlerConsumer:
     def __init__(self):
         self.running = False
         self.task = None
+        self.last_cycle = None  # 最近一次完成消费循环的时间
     
     async def start(self):
         """启动消费者"""
@@ -25,24 +41,42 @@ class QACrawlerConsumer:
             except asyncio.CancelledError:
                 pass
     
+    def is_alive(self) -> bool:
+        """消费协程是否仍在运行"""
+        return self.running and self.task is not None and not self.task.done()
+
+    @staticmethod
+    def _process_batch():
+        """消费一批队列数据（在线程池中执行，Redis读取和入库不阻塞事件循环），会话归该线程所有"""
+        db = SessionLocal()
+        try:
+            return qa_crawler_service.process_queue(db, settings.QA_CONSUMER_BATCH_SIZE)
+        finally:
+            db.close()
+
     async def _consume(self):
         """消费队列"""
-        db = SessionLocal()
         try:
             while self.running:
                 try:
-                    result = qa_crawler_service.process_queue(db, 10)
-                    print(f"处理队列结果: 已处理 {result['processed']} 条, 失败 {result['failed']} 条")
+                    result = await run_in_threadpool(self._process_batch)
+                    _PROCESSED.inc(result['processed'])
+                    _FAILED.inc(result['failed'])
+                    _UPDATED.inc(result['updated'])
+                    print(f"处理队列结果: 已处理 {result['processed']} 条, 更新 {result['updated']} 条, 失败 {result['failed']} 条")
                 except asyncio.CancelledError:
                     print("消费者任务被取消，正在关闭...")
                     break
                 except Exception as e:
                     print(f"处理队列时发生错误: {str(e)}")
+                self.last_cycle = time.time()
+                # 按消费后的队列长度更新背压信号
+                await run_in_threadpool(admission_controller.refresh_sync)
                 await asyncio.sleep(3)
         except asyncio.CancelledError:
             print("消费者任务被取消，正在关闭...")
-        finally:
-            db.close()
 
 # 创建消费者实例
 qa_crawler_consumer = QACrawlerConsumer()
+QA_QUEUE_DEPTH.set_function(qa_crawler_service.get_queue_size)
+_register_lane_metrics()
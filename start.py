@@ -7,7 +7,7 @@ if __name__ == "__main__":
     uvicorn.run(
         app,
         host="0.0.0.0",
-        port=8000,
+        port=settings.PORT,
         reload=settings.DEBUG,
         workers=1  # 设置为单进程避免多进程问题
     )
@@ -9,6 +9,9 @@ let currentPage = {
     crawler_params: 1
 };
 
+// 本页面发起、等待完成通知的后台作业（导出、抽样）
+const pendingJobs = new Set();
+
 let totalPages = {
     accounts: 1,
     tasks: 1,
@@ -47,8 +50,51 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // 初始化数据管理
     initData();
+
+    // 订阅任务和后台作业事件流
+    initEvents();
 });
 
+// 页面是否正在显示
+function isPageActive(pageId) {
+    const page = document.getElementById(pageId);
+    return page !== null && page.classList.contains('active');
+}
+
+// 事件流：任务和后台作业状态变化由服务端推送，替代轮询（断线后EventSource自动重连）
+function initEvents() {
+    const source = new EventSource('/api/events');
+
+    source.addEventListener('task', () => {
+        if (isPageActive('tasks')) {
+            loadTasksData();
+        } else if (isPageActive('dashboard')) {
+            loadDashboardData();
+        }
+    });
+
+    source.addEventListener('job', event => {
+        const job = JSON.parse(event.data);
+        if (job.state === 'running') {
+            return;
+        }
+        const notify = pendingJobs.delete(job.job_id);
+        const label = job.kind === 'sampling' ? '抽样' : '导出';
+        if (job.state === 'completed') {
+            if (notify) {
+                showNotification(`${label}完成`, 'success');
+            }
+            if (job.kind === 'sampling') {
+                loadSampleData();
+            } else {
+                loadExports();
+            }
+        } else if (job.state === 'failed' && notify) {
+            showNotification(`${label}失败: ${job.error || ''}`, 'error');
+        }
+    });
+}
+
 // 导航功能
 function initNavigation() {
     const navLinks = document.querySelectorAll('.nav-link');
@@ -209,19 +255,10 @@ async function exportSampleData() {
         });
 
         if (response.ok) {
+            const result = await response.json();
+            // 导出完成后由事件流通知
+            pendingJobs.add(result.job_id);
             showNotification('导出任务已启动', 'success');
-            // 定期检查导出状态
-            const checkInterval = setInterval(async () => {
-                const exportsResponse = await fetch('/api/exports/');
-                const exports = await exportsResponse.json();
-
-                // 检查是否有新的导出文件
-                if (exports.length > 0) {
-                    clearInterval(checkInterval);
-                    showNotification('导出完成', 'success');
-                    loadExports();
-                }
-            }, 5000);
         } else {
             const error = await response.json();
             showNotification(error.detail || '导出失败', 'error');
@@ -240,19 +277,10 @@ async function exportRawData() {
         });
 
         if (response.ok) {
+            const result = await response.json();
+            // 导出完成后由事件流通知
+            pendingJobs.add(result.job_id);
             showNotification('导出任务已启动', 'success');
-            // 定期检查导出状态
-            const checkInterval = setInterval(async () => {
-                const exportsResponse = await fetch('/api/exports/');
-                const exports = await exportsResponse.json();
-
-                // 检查是否有新的导出文件
-                if (exports.length > 0) {
-                    clearInterval(checkInterval);
-                    showNotification('导出完成', 'success');
-                    loadExports();
-                }
-            }, 5000);
         } else {
             const error = await response.json();
             showNotification(error.detail || '导出失败', 'error');
@@ -728,19 +756,10 @@ async function sampleData() {
         });
 
         if (response.ok) {
+            const result = await response.json();
+            // 抽样完成后由事件流通知
+            pendingJobs.add(result.job_id);
             showNotification('抽样任务已启动', 'success');
-            // 定期检查抽样状态
-            const checkInterval = setInterval(async () => {
-                const statsResponse = await fetch('/api/sample-data/stats/by-year');
-                const stats = await statsResponse.json();
-                const total = Object.values(stats).reduce((sum, count) => sum + count, 0);
-
-                if (total > 0) {
-                    clearInterval(checkInterval);
-                    showNotification('抽样完成', 'success');
-                    loadSampleData();
-                }
-            }, 5000);
         } else {
             const error = await response.json();
             showNotification(error.detail || '抽样失败', 'error');
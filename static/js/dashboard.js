@@ -8,39 +8,67 @@ function initDashboard() {
 // 加载仪表盘数据
 async function loadDashboardData() {
     try {
-        // 加载统计数据
-        const accountsResponse = await fetch('/api/accounts/');
-        const accounts = await accountsResponse.json();
-        document.getElementById('total-accounts').textContent = accounts.length;
-
-        const tasksResponse = await fetch('/api/tasks/');
-        const tasks = await tasksResponse.json();
-        const runningTasks = tasks.filter(task => task.status === 1);
-        document.getElementById('running-tasks').textContent = runningTasks.length;
-
-        const proxiesResponse = await fetch('/api/proxies/');
-        const proxies = await proxiesResponse.json();
-        const availableProxies = proxies.filter(proxy => proxy.status === 1);
-        document.getElementById('available-proxies').textContent = availableProxies.length;
-
-        const rawDataResponse = await fetch('/api/raw-data/stats/by-year');
-        const rawDataStats = await rawDataResponse.json();
-        const totalRawData = Object.values(rawDataStats).reduce((sum, count) => sum + count, 0);
-        document.getElementById('total-raw-data').textContent = totalRawData;
-
-        const sampleDataResponse = await fetch('/api/sample-data/stats/by-year');
-        const sampleDataStats = await sampleDataResponse.json();
-        const totalSampleData = Object.values(sampleDataStats).reduce((sum, count) => sum + count, 0);
-        document.getElementById('total-sample-data').textContent = totalSampleData;
+        // 加载汇总数据（服务端快照，一次请求）
+        const response = await fetch('/api/dashboard/summary');
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
+        }
+        const summary = await response.json();
+        const counts = summary.counts;
+        document.getElementById('total-accounts').textContent = counts.accounts.total;
+        document.getElementById('running-tasks').textContent = summary.spiders.running_tasks;
+        document.getElementById('available-proxies').textContent = counts.proxies.available;
+        document.getElementById('total-raw-data').textContent = counts.raw_data.total;
+        document.getElementById('total-sample-data').textContent = counts.sample_data.total;
 
         // 绘制任务状态图表
-        drawTaskStatusChart(tasks);
+        drawTaskStatusChart(counts.tasks.by_status);
 
         // 绘制数据年份分布图表
-        drawDataYearChart(rawDataStats, sampleDataStats);
+        drawDataYearChart(counts.raw_data.by_year, counts.sample_data.by_year);
+
+        // 加载运行中任务指标
+        await loadTaskMetrics();
 
     } catch (error) {
         console.error('加载仪表盘数据失败:', error);
         showNotification('加载仪表盘数据失败', 'error');
     }
 }
+
+// 加载运行中任务指标
+async function loadTaskMetrics() {
+    const response = await fetch('/api/tasks/metrics');
+    const items = await response.json();
+    const tbody = document.querySelector('#task-metrics-table tbody');
+    tbody.innerHTML = '';
+
+    if (items.length === 0) {
+        tbody.innerHTML = '<tr><td colspan="8">暂无运行中的任务</td></tr>';
+        return;
+    }
+
+    items.forEach(item => {
+        const m = item.metrics || {};
+        const errors = Object.entries(m.errors || {}).map(([type, count]) => `${type}: ${count}`).join(', ');
+        const row = document.createElement('tr');
+        row.innerHTML = `
+            <td>${item.task_id}</td>
+            <td>${item.task_name}</td>
+            <td>${m.pages ?? '-'}</td>
+            <td>${m.items ?? '-'}</td>
+            <td>${m.bytes !== undefined ? formatBytes(m.bytes) : '-'}</td>
+            <td title="${errors}">${m.error_count ?? '-'}</td>
+            <td>${m.latency_p50 ?? '-'} / ${m.latency_p95 ?? '-'}</td>
+            <td>${m.rate_per_min ?? '-'}</td>
+        `;
+        tbody.appendChild(row);
+    });
+}
+
+// 格式化字节数
+function formatBytes(bytes) {
+    if (bytes < 1024) return `${bytes} B`;
+    if (bytes < 1024 * 1024) return `${(bytes / 1024).toFixed(1)} KB`;
+    return `${(bytes / 1024 / 1024).toFixed(1)} MB`;
+}
@@ -63,21 +63,14 @@ function formatFileSize(sizeBytes) {
     return `${size.toFixed(2)} ${sizeNames[i]}`;
 }
 
-// 绘制任务状态图表
-function drawTaskStatusChart(tasks) {
+// 绘制任务状态图表（byStatus: 状态 -> 任务数量）
+function drawTaskStatusChart(byStatus) {
     const ctx = document.getElementById('task-status-chart').getContext('2d');
 
-    // 统计各状态任务数量
-    const statusCounts = {
-        0: 0,  // 等待
-        1: 0,  // 运行
-        2: 0,  // 暂停
-        3: 0,  // 失败
-        4: 0   // 完成
-    };
-
-    tasks.forEach(task => {
-        statusCounts[task.status]++;
+    // 各状态任务数量：0-等待 1-运行 2-暂停 3-失败 4-完成
+    const statusCounts = {};
+    [0, 1, 2, 3, 4].forEach(status => {
+        statusCounts[status] = byStatus[status] || 0;
     });
 
     // 销毁现有图表
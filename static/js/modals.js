@@ -816,6 +816,14 @@ async function showCrawlerParamModal(paramId = null) {
                 <label for="restart_browser_time">重启浏览器时间(小时)</label>
                 <input type="number" id="restart_browser_time" name="restart_browser_time" class="form-control" value="${paramData ? paramData.restart_browser_time : 24}" min="1" required>
             </div>
+            <div class="form-group">
+                <label for="fetch_mode">抓取模式</label>
+                <select id="fetch_mode" name="fetch_mode" class="form-control" required>
+                    <option value="browser" ${!paramData || paramData.fetch_mode === 'browser' ? 'selected' : ''}>浏览器</option>
+                    <option value="http" ${paramData && paramData.fetch_mode === 'http' ? 'selected' : ''}>HTTP（无需JS渲染）</option>
+                    <option value="auto" ${paramData && paramData.fetch_mode === 'auto' ? 'selected' : ''}>自动（优先HTTP，失败回退浏览器）</option>
+                </select>
+            </div>
         </form>
     `;
 
@@ -853,7 +861,8 @@ async function saveCrawlerParam(paramId) {
         end_time: parseInt(document.getElementById('end_time').value),
         interval_time: parseInt(document.getElementById('interval_time').value),
         error_count: parseInt(document.getElementById('error_count').value),
-        restart_browser_time: parseInt(document.getElementById('restart_browser_time').value)
+        restart_browser_time: parseInt(document.getElementById('restart_browser_time').value),
+        fetch_mode: document.getElementById('fetch_mode').value
     };
 
     try {